@@ -0,0 +1,119 @@
+# action_log.py
+"""
+Compact per-trial action log.
+
+log_action used to append one dict per action to a list. Slider drags fire
+update_slider on every change, so most of those dicts were near-identical.
+ActionLog stores the log in columns instead:
+
+    codes    array('H')  index into the log's string table (action names)
+    ts_wall  array('d')  wall clock time of the action (or of the first in a run)
+    ts_end   array('d')  wall clock time of the last action in a coalesced run, NaN otherwise
+    ts_lsl   array('d')  LSL time, NaN when LSL is not available
+    counts   array('I')  number of raw actions a row stands for
+
+The remaining kwargs are kept only for the rows that have them. Their string
+values are interned, so repeated slider keys and ids are stored once.
+Consecutive update_slider actions on the same slider, less than
+ACTION_LOG_COALESCE_S apart, are folded into one row that records when the run
+started and ended and how many events it had.
+
+to_records() returns the JSON export format used so far: one dict per row with
+"action", "ts_wall", the kwargs and "ts_lsl" if known. Coalesced rows
+additionally carry "ts_wall_end" and "count".
+"""
+import sys, math
+from array import array
+
+COALESCED_ACTIONS = {"update_slider"}
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class ActionLog:
+    def __init__(self, coalesce_s=None):
+        if coalesce_s is None:
+            from config import ACTION_LOG_COALESCE_S
+            coalesce_s = ACTION_LOG_COALESCE_S
+        self.coalesce_s = coalesce_s
+        self.strings, self._string_ids = [], {}
+        self.codes = array("H")
+        self.ts_wall, self.ts_end, self.ts_lsl = array("d"), array("d"), array("d")
+        self.counts = array("I")
+        self.extras = {}  # row -> kwargs
+
+    def _code(self, name):
+        code = self._string_ids.get(name)
+        if code is None:
+            code = self._string_ids[name] = len(self.strings)
+            self.strings.append(sys.intern(name))
+        return code
+
+    def append(self, action, ts_wall, ts_lsl=None, **kwargs):
+        code = self._code(action)
+        last = len(self.codes) - 1
+        if (action in COALESCED_ACTIONS and last >= 0 and self.codes[last] == code
+                and self.extras.get(last, {}) == kwargs):
+            last_ts = self.ts_end[last] if not math.isnan(self.ts_end[last]) else self.ts_wall[last]
+            if 0 <= ts_wall - last_ts <= self.coalesce_s:
+                self.ts_end[last] = ts_wall
+                self.counts[last] += 1
+                return
+        self.codes.append(code)
+        self.ts_wall.append(ts_wall)
+        self.ts_end.append(math.nan)
+        self.ts_lsl.append(math.nan if ts_lsl is None else ts_lsl)
+        self.counts.append(1)
+        if kwargs:
+            self.extras[len(self.codes) - 1] = {_intern(k): _intern(v) for k, v in kwargs.items()}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def record(self, row):
+        """
+        One row in the JSON export format.
+        """
+        entry = {"action": self.strings[self.codes[row]], "ts_wall": self.ts_wall[row], **self.extras.get(row, {})}
+        if not math.isnan(self.ts_lsl[row]):
+            entry["ts_lsl"] = self.ts_lsl[row]
+        if self.counts[row] > 1:
+            entry["ts_wall_end"] = self.ts_end[row]
+            entry["count"] = self.counts[row]
+        return entry
+
+    def __iter__(self):
+        return (self.record(row) for row in range(len(self.codes)))
+
+    def to_records(self):
+        return list(self)
+
+    @classmethod
+    def from_records(cls, records, coalesce_s=None):
+        """
+        Rebuilds a log from exported (or pre-ActionLog) records; coalesced rows keep their runs.
+        """
+        log = cls(coalesce_s)
+        for record in records:
+            record = dict(record)
+            action, ts_wall = record.pop("action"), float(record.pop("ts_wall"))
+            ts_end, count = record.pop("ts_wall_end", None), int(record.pop("count", 1))
+            log.append(action, ts_wall, record.pop("ts_lsl", None), **record)
+            row = len(log) - 1
+            if count > 1 and log.counts[row] == 1:
+                log.ts_end[row], log.counts[row] = float(ts_end), count
+        return log
+
+    def first_ts(self, actions):
+        """
+        Earliest ts_wall among the given action names, or None.
+        """
+        codes = {self._string_ids[a] for a in actions if a in self._string_ids}
+        times = [t for c, t in zip(self.codes, self.ts_wall) if c in codes]
+        return min(times) if times else None
+
+def as_records(action_log):
+    """
+    Export format of a trial's log, whether it is an ActionLog or a plain list of dicts.
+    """
+    return action_log.to_records() if isinstance(action_log, ActionLog) else list(action_log or [])
@@ -0,0 +1,175 @@
+# admin.py
+"""
+Live progress dashboard for a running study, opened with ?admin=<token> where
+the token is st.secrets["admin"]["token"].
+
+Everything shown comes from the progress index that participant sessions update
+when they start, save a trial, upload, exit or complete (Storage.update_progress),
+so a refresh reads one small index instead of every session and trial file.
+Sessions that predate the index can be added once with
+
+    python admin.py --rebuild [--results-dir results]
+"""
+import os, glob, time, hmac, datetime
+import streamlit as st
+from config import ADMIN_ABANDONED_AFTER_S, ADMIN_REFRESH_S
+from backend import get_backend
+from admission import get_controller
+
+def is_admin_request():
+    """
+    True for a request carrying a valid admin token; an invalid token stops the script.
+    """
+    token = st.query_params.get("admin")
+    if not token:
+        return False
+    try:
+        expected = st.secrets["admin"]["token"]
+    except (KeyError, FileNotFoundError):
+        st.error("The admin dashboard is not configured (missing admin.token secret).")
+        st.stop()
+    if not hmac.compare_digest(str(token), str(expected)):
+        st.error("Invalid admin token.")
+        st.stop()
+    return True
+
+def classify(entry, now, abandoned_after=ADMIN_ABANDONED_AFTER_S):
+    """
+    Dashboard status of an index entry: active sessions without updates for abandoned_after seconds are abandoned.
+    """
+    status = entry.get("status", "active")
+    if status == "active" and now - float(entry.get("updated_at") or 0) > abandoned_after:
+        return "abandoned"
+    return status
+
+def summarize(index, now=None):
+    """
+    Folds the progress index into status counts, condition cells, the upload backlog and one row per participant.
+    """
+    now = now or time.time()
+    counts = {"active": 0, "completed": 0, "abandoned": 0, "emergency_exit": 0}
+    cells, rows, waits = {}, [], []
+    backlog = 0
+    for participant_id, entry in index.items():
+        status = classify(entry, now)
+        counts[status] = counts.get(status, 0) + 1
+        if status == "bounced":
+            continue  # removed by the janitor before any trial was saved
+        cell = cells.setdefault((entry.get("valence_condition"), entry.get("instruction_version")),
+                                {"started": 0, "completed": 0, "active": 0})
+        cell["started"] += 1
+        if status in ("completed", "active"):
+            cell[status] += 1
+        if entry.get("queue_wait_s") is not None:
+            waits.append(float(entry["queue_wait_s"]))
+        pending = entry.get("pending_uploads") or []
+        backlog += len(pending)
+        rows.append({
+            "participant_id": participant_id,
+            "status": status,
+            "trial": f"{entry.get('trial_index', 0)}/{entry.get('n_trials', '?')}",
+            "condition": f"{entry.get('valence_condition')} / {entry.get('instruction_version')}",
+            "pending_uploads": len(pending),
+            "idle_min": round((now - float(entry.get("updated_at") or now)) / 60, 1),
+            "started_at": entry.get("started_at"),
+            "prolific_id": entry.get("prolific_id"),
+        })
+    rows.sort(key=lambda r: r["idle_min"])
+    cell_rows = [{"valence_condition": v, "instruction_version": i, **c} for (v, i), c in sorted(cells.items(), key=str)]
+    waits.sort()
+    queue_wait = {"p50_s": waits[len(waits) // 2] if waits else 0.0,
+                  "p95_s": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0}
+    return {"counts": counts, "cells": cell_rows, "upload_backlog": backlog, "queue_wait": queue_wait,
+            "participants": rows}
+
+def show_admin():
+    st.markdown("## Study progress")
+
+    @st.fragment(run_every=ADMIN_REFRESH_S)
+    def live():
+        summary = summarize(get_backend().load_progress())
+        counts = summary["counts"]
+        cols = st.columns(6)
+        cols[0].metric("Active", counts["active"])
+        cols[1].metric("Completed", counts["completed"])
+        cols[2].metric("Abandoned", counts["abandoned"])
+        cols[3].metric("Emergency exits", counts["emergency_exit"])
+        cols[4].metric("Upload backlog", summary["upload_backlog"])
+        cols[5].metric("Queue wait p50 / p95", f"{summary['queue_wait']['p50_s']:.0f}s / {summary['queue_wait']['p95_s']:.0f}s")
+
+        st.markdown("##### Condition cells")
+        st.dataframe(summary["cells"], hide_index=True, width="stretch")
+        st.markdown("##### Participants")
+        st.dataframe(summary["participants"], hide_index=True, width="stretch")
+        replica = get_controller().stats()
+        st.caption(f"This replica: {replica['active']}/{replica['max_active'] or '∞'} active sessions, "
+                   f"{replica['waiting']} waiting, wait p50 {replica['wait_p50_s']}s / p95 {replica['wait_p95_s']}s / "
+                   f"max {replica['wait_max_s']}s over {replica['admitted']} admissions")
+        st.caption(f"Updated {datetime.datetime.now():%H:%M:%S} · refreshes every {ADMIN_REFRESH_S}s · "
+                   f"active sessions idle for {ADMIN_ABANDONED_AFTER_S // 60} min count as abandoned")
+
+    live()
+
+def rebuild_index(results_dir, backend=None):
+    """
+    Adds the sessions stored as participant files or bundles in results_dir that are not indexed yet.
+    Returns the number of participants added.
+    """
+    from archive import read_bundle, BUNDLE_SUFFIX
+    from config import PROJECT_DIR, INSTRUCTIONS
+    from loader import Loader
+    from plan import session_plan
+    from journal import TrialJournal
+
+    backend = backend or get_backend()
+    indexed = backend.load_progress()
+    catalog = Loader(PROJECT_DIR).catalog
+    sessions = {}
+    for path in glob.glob(os.path.join(results_dir, "participant_*_session.json")):
+        participant_id = os.path.basename(path)[len("participant_"):-len("_session.json")]
+        sessions[participant_id] = (backend.load_session(participant_id), os.path.getmtime(path), None)
+    for path in glob.glob(os.path.join(results_dir, f"participant_*{BUNDLE_SUFFIX}")):
+        participant_id = os.path.basename(path)[len("participant_"):-len(BUNDLE_SUFFIX)]
+        bundle = read_bundle(path)
+        sessions[participant_id] = (bundle["session"] or {}, os.path.getmtime(path), bundle)
+
+    added = 0
+    for participant_id, (session, mtime, bundle) in sorted(sessions.items()):
+        if session is None or participant_id in indexed:
+            continue
+        plan, _ = session_plan(session, catalog, INSTRUCTIONS)
+        if bundle is not None:
+            trial_index = len(bundle["trials"])
+            aggregate = bundle["aggregate"] or {}
+        else:
+            trial_index = max(session.get("trial_index", 0), TrialJournal(backend, participant_id).state["trial_index"])
+            aggregate_file = os.path.join(results_dir, f"participant_{participant_id}_aggregate.json")
+            aggregate = {"completed_at": datetime.datetime.fromtimestamp(mtime).isoformat()} \
+                if os.path.exists(aggregate_file) else {}
+        backend.update_progress(participant_id, {
+            "status": "completed" if aggregate else "active",
+            "started_at": session.get("created_at"),
+            "trial_index": trial_index,
+            "n_trials": plan.get("n_trials", len(plan["stimulus_ids"])),
+            "valence_condition": plan["valence_condition"],
+            "instruction_version": plan["instruction_version"],
+            "prolific_id": session.get("prolific_id"),
+            "updated_at": mtime,
+            **({"completed_at": aggregate.get("completed_at")} if aggregate else {}),
+        })
+        added += 1
+    return added
+
+if __name__ == "__main__":
+    import argparse
+    from config import RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="Maintain the progress index behind the admin dashboard.")
+    parser.add_argument("--rebuild", action="store_true", help="index the sessions stored in --results-dir")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Indexed {rebuild_index(args.results_dir)} participants")
+    summary = summarize(get_backend().load_progress())
+    print(", ".join(f"{k}: {v}" for k, v in summary["counts"].items()), f"| upload backlog: {summary['upload_backlog']}")
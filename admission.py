@@ -0,0 +1,157 @@
+# admission.py
+"""
+Admission control for the app entry point.
+
+Each replica admits at most ADMISSION_MAX_ACTIVE browser sessions at a time.
+When that many are active, new arrivals get a lightweight waiting room: it does
+not allocate a participant id or build a trial list, and it polls until a slot
+frees up. Slots are taken in arrival order. Participants who are already in
+progress always get in, without waiting and regardless of the limit: those
+whose browser session was admitted earlier, or whose ?participant_id= the
+state backend knows.
+
+A slot is freed when its session reaches the debrief, disconnects, or sends no
+rerun for ADMISSION_IDLE_S seconds. Queue wait times are kept per replica
+(stats()) and stored with each participant's progress entry for the admin
+dashboard.
+"""
+import time, threading
+from collections import deque
+import streamlit as st
+
+class AdmissionController:
+    """
+    Per-process bookkeeping of admitted and waiting browser sessions.
+    """
+    def __init__(self, max_active, idle_s):
+        self.max_active = max_active
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self.active = {}    # session id -> last seen
+        self.waiting = {}   # session id -> [enqueued at, last poll], in arrival order
+        self.waits = deque(maxlen=1000)
+        self.admitted_total = 0
+
+    def _alive(self, session_id):
+        try:
+            from streamlit.runtime import Runtime
+            return not Runtime.exists() or Runtime.instance().is_active_session(session_id)
+        except Exception:
+            return True
+
+    def _expire(self, now):
+        for session_id, last_seen in list(self.active.items()):
+            if now - last_seen > self.idle_s or not self._alive(session_id):
+                del self.active[session_id]
+        # Waiting sessions poll every few seconds; one that stopped polling has left
+        for session_id, (_, last_poll) in list(self.waiting.items()):
+            if now - last_poll > max(self.idle_s / 10, 60):
+                del self.waiting[session_id]
+
+    def admit(self, session_id, priority=False):
+        """
+        Returns (admitted, queue position starting at 1 or 0 when admitted, seconds waited).
+        """
+        now = time.time()
+        with self._lock:
+            if session_id in self.active:
+                self.active[session_id] = now
+                return True, 0, 0.0
+            self._expire(now)
+            entry = self.waiting.setdefault(session_id, [now, now])
+            entry[1] = now
+            position = list(self.waiting).index(session_id) + 1
+            free = self.max_active - len(self.active) if self.max_active else position
+            if not (priority or position <= free):
+                return False, position, now - entry[0]
+            del self.waiting[session_id]
+            self.active[session_id] = now
+            waited = now - entry[0]
+            self.waits.append(waited)
+            self.admitted_total += 1
+            return True, 0, waited
+
+    def release(self, session_id):
+        with self._lock:
+            self.active.pop(session_id, None)
+            self.waiting.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self.waits)
+            pct = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 1) if waits else 0.0
+            return {
+                "active": len(self.active),
+                "waiting": len(self.waiting),
+                "max_active": self.max_active,
+                "admitted": self.admitted_total,
+                "wait_p50_s": pct(0.5),
+                "wait_p95_s": pct(0.95),
+                "wait_max_s": round(waits[-1], 1) if waits else 0.0,
+            }
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            from config import ADMISSION_MAX_ACTIVE, ADMISSION_IDLE_S
+            _controller = AdmissionController(ADMISSION_MAX_ACTIVE, ADMISSION_IDLE_S)
+        return _controller
+
+def _session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def _in_progress():
+    """
+    True for participants who already started: admitted in this browser session or resuming a known id.
+    """
+    if st.session_state.get("participant_id"):
+        return True
+    participant_id = st.query_params.get("participant_id")
+    if not participant_id:
+        return False
+    from backend import get_backend
+    return get_backend().load_session(participant_id) is not None
+
+def release_current():
+    """
+    Frees the current session's slot for good, e.g. once the participant reaches the debrief.
+    """
+    if not st.session_state.get("admission_released"):
+        get_controller().release(_session_id())
+        st.session_state.admission_released = True
+
+def admit_or_wait():
+    """
+    Admits the current session or renders the waiting room. Returns True if the app may continue.
+    """
+    from config import ADMISSION_MAX_ACTIVE, ADMISSION_POLL_S
+
+    if not ADMISSION_MAX_ACTIVE or st.session_state.get("admission_released"):
+        return True
+    controller, session_id = get_controller(), _session_id()
+    admitted, position, waited = controller.admit(session_id, priority=_in_progress())
+    if admitted:
+        st.session_state.setdefault("queue_wait_s", round(waited, 1))
+        return True
+
+    st.markdown("## Please wait a moment")
+    st.markdown("The study is busy right now. You will be let in automatically as soon as a place "
+                "becomes free. Please keep this tab open and do not reload the page.")
+
+    @st.fragment(run_every=ADMISSION_POLL_S)
+    def waiting_room():
+        ok, pos, waited_s = controller.admit(session_id)
+        if ok:
+            st.session_state.queue_wait_s = round(waited_s, 1)
+            print(f"Admitted session after {waited_s:.1f}s in the waiting room")
+            st.rerun(scope="app")
+        st.info(f"Your place in the queue: {pos} · waiting for {int(waited_s)} s")
+
+    waiting_room()
+    return False
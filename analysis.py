@@ -0,0 +1,227 @@
+# analysis.py
+"""
+Signal-detection analytics over all stored trial records.
+
+A trial counts as signal when its GT label is not bonafide, and as a "yes"
+response when the participant marked at least one segment or flag. Rates use
+the log-linear correction (+0.5 / +1) so d' stays finite at 0 and 1.
+Confidence intervals come from a participant-level (cluster) bootstrap: each
+replicate reweights whole participants, which is a single matrix product over
+per-participant count tables, split across a process pool.
+
+    python analysis.py --by valence_condition instruction_version trust_cue quadrant generator
+"""
+import os, json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+FACTORS = ["valence_condition", "instruction_version", "trust_cue", "quadrant", "generator"]
+# Stimulus properties that only vary over signal trials (bonafide clips have no TTS generator):
+# their levels are scored against each participant's pooled false alarms
+SIGNAL_FACTORS = {"generator"}
+CONFIDENCE_QUESTION = "I am confident in my evaluation."
+CONFIDENCE_LEVELS = ["Completely \n Disagree", "Disagree", "Unsure", "Agree", "Completely \n Agree"]
+
+# Columns of the per-participant count tables
+HITS, SIGNAL, FALSE_ALARMS, NOISE = range(4)
+
+def norm_ppf(p):
+    """
+    Vectorized inverse standard normal CDF (Acklam's rational approximation, |error| < 1.2e-9).
+    """
+    a = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+    b = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+    d = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+
+    p = np.asarray(p, dtype=float)
+    out = np.empty_like(p)
+    low, high = p < 0.02425, p > 1 - 0.02425
+    mid = ~(low | high)
+
+    q = np.sqrt(-2 * np.log(p[low]))
+    out[low] = (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    q = np.sqrt(-2 * np.log(1 - p[high]))
+    out[high] = -(((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    q = p[mid] - 0.5
+    r = q * q
+    out[mid] = (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5])*q / (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+    return out
+
+def sdt_from_counts(counts):
+    """
+    d', criterion and corrected rates from counts[..., (hits, signal, false_alarms, noise)].
+    """
+    counts = np.asarray(counts, dtype=float)
+    hit_rate = (counts[..., HITS] + 0.5) / (counts[..., SIGNAL] + 1)
+    fa_rate = (counts[..., FALSE_ALARMS] + 0.5) / (counts[..., NOISE] + 1)
+    z_h, z_f = norm_ppf(hit_rate), norm_ppf(fa_rate)
+    return {"hit_rate": hit_rate, "fa_rate": fa_rate, "d_prime": z_h - z_f, "criterion": -(z_h + z_f) / 2}
+
+def _generator_lookup():
+    from catalog import load_catalog
+    catalog = load_catalog() or {"stimuli": []}
+    return {os.path.basename(s["video"]): s["generator"] for s in catalog["stimuli"]}
+
+def load_table(results_dir):
+    """
+    Flattens every stored trial record into column arrays.
+    """
+    from archive import iter_result_records
+
+    generators = _generator_lookup()
+    rows = {k: [] for k in ["participant_id", "signal", "response", "confidence", *FACTORS]}
+    for rec in iter_result_records(results_dir):
+        if not rec.get("gt_label"):
+            continue
+        answer = (rec.get("responses") or {}).get(CONFIDENCE_QUESTION)
+        rows["participant_id"].append(str(rec.get("participant_id")))
+        rows["signal"].append(rec["gt_label"].lower() != "bonafide")
+        rows["response"].append(bool(rec.get("segments")) or bool(rec.get("flags")))
+        rows["confidence"].append(CONFIDENCE_LEVELS.index(answer) + 1 if answer in CONFIDENCE_LEVELS else 3)
+        rows["valence_condition"].append(str(rec.get("valence_condition")))
+        rows["instruction_version"].append(str(rec.get("instruction_version")))
+        rows["trust_cue"].append(str(rec.get("trust_cue")))
+        rows["quadrant"].append(str(rec.get("quadrant")))
+        rows["generator"].append(str(rec.get("generator") or generators.get(rec.get("audio"))))
+    return {
+        k: np.asarray(v, dtype=bool if k in ("signal", "response") else (int if k == "confidence" else object))
+        for k, v in rows.items()
+    }
+
+def count_tables(table, factor):
+    """
+    Per-participant, per-level counts: array (participants, levels, 4) plus the level names.
+    """
+    participants, p_idx = np.unique(table["participant_id"], return_inverse=True)
+    signal, response = table["signal"], table["response"]
+    if factor is None:
+        levels, l_idx = np.array(["all"], dtype=object), np.zeros(len(p_idx), dtype=int)
+    elif factor in SIGNAL_FACTORS:
+        levels = np.unique(table[factor][signal])
+        l_idx = np.minimum(np.searchsorted(levels, table[factor]), max(len(levels) - 1, 0))
+        l_idx[~signal] = 0
+    else:
+        levels, l_idx = np.unique(table[factor], return_inverse=True)
+    cell = p_idx * len(levels) + l_idx
+    size = len(participants) * len(levels)
+    columns = [signal & response, signal, ~signal & response, ~signal]
+    counts = np.stack([np.bincount(cell, weights=col, minlength=size) for col in columns], axis=-1)
+    counts = counts.reshape(len(participants), len(levels), 4)
+    if factor in SIGNAL_FACTORS:
+        noise = counts[:, :, [FALSE_ALARMS, NOISE]].sum(axis=1, keepdims=True)
+        counts[:, :, [FALSE_ALARMS, NOISE]] = noise
+    return counts, levels
+
+def _bootstrap_chunk(args):
+    counts, n_replicates, seed = args
+    rng = np.random.default_rng(seed)
+    n_participants = counts.shape[0]
+    # Multinomial weights = how often each participant is drawn in a replicate
+    weights = rng.multinomial(n_participants, np.full(n_participants, 1 / n_participants), size=n_replicates)
+    resampled = (weights @ counts.reshape(n_participants, -1)).reshape(n_replicates, *counts.shape[1:])
+    stats = sdt_from_counts(resampled)
+    return np.stack([stats["d_prime"], stats["criterion"], stats["hit_rate"], stats["fa_rate"]], axis=-1)
+
+def bootstrap_ci(counts, n_replicates=2000, alpha=0.05, workers=None, seed=0, chunk=250):
+    """
+    Percentile CIs for (d', criterion, hit rate, FA rate) per level, shape (levels, 4, 2).
+    """
+    n_chunks = max(1, -(-n_replicates // chunk))
+    sizes = [chunk] * (n_chunks - 1) + [n_replicates - chunk * (n_chunks - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    jobs = [(counts, size, s) for size, s in zip(sizes, seeds)]
+    if workers == 1 or n_chunks == 1:
+        parts = [_bootstrap_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bootstrap_chunk, jobs))
+    replicates = np.concatenate(parts, axis=0)
+    lo, hi = np.percentile(replicates, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return np.stack([lo, hi], axis=-1)
+
+def roc_points(table, mask):
+    """
+    Rating ROC from yes/no x confidence: a 10-point scale from confident "no" to confident "yes".
+    Returns cumulative (fa_rate, hit_rate) points from the strictest criterion and the trapezoid AUC.
+    """
+    rating = np.where(table["response"], 5 + table["confidence"], 6 - table["confidence"])[mask]
+    signal = table["signal"][mask]
+    hits = np.bincount(rating[signal], minlength=11)[1:][::-1].cumsum()
+    fas = np.bincount(rating[~signal], minlength=11)[1:][::-1].cumsum()
+    h = hits / max(signal.sum(), 1)
+    f = fas / max((~signal).sum(), 1)
+    h, f = np.concatenate([[0.0], h]), np.concatenate([[0.0], f])
+    auc = float(np.sum((f[1:] - f[:-1]) * (h[1:] + h[:-1]) / 2))
+    return list(zip(f.round(4).tolist(), h.round(4).tolist())), auc
+
+def summarize(table, factors=FACTORS, n_replicates=2000, workers=None, seed=0):
+    """
+    SDT summary per level of each factor (and overall), with bootstrap CIs and rating ROCs.
+    """
+    results = {}
+    for factor in [None, *factors]:
+        counts, levels = count_tables(table, factor)
+        if not counts.size:
+            results[factor or "all"] = []
+            continue
+        point = sdt_from_counts(counts.sum(axis=0))
+        ci = bootstrap_ci(counts, n_replicates, workers=workers, seed=seed) if n_replicates else None
+        rows = []
+        for i, level in enumerate(levels):
+            if factor is None:
+                mask = np.ones(len(table["signal"]), bool)
+            elif factor in SIGNAL_FACTORS:
+                mask = (table[factor] == level) | ~table["signal"]
+            else:
+                mask = table[factor] == level
+            roc, auc = roc_points(table, mask)
+            row = {
+                "level": str(level),
+                "participants": int((counts[:, i, SIGNAL] + counts[:, i, NOISE] > 0).sum()),
+                "trials": int(mask.sum()),
+                "roc": roc,
+                "auc": auc,
+            }
+            for j, name in enumerate(["d_prime", "criterion", "hit_rate", "fa_rate"]):
+                row[name] = float(point[name][i])
+                if ci is not None:
+                    row[f"{name}_ci"] = [float(ci[i, j, 0]), float(ci[i, j, 1])]
+            rows.append(row)
+        results[factor or "all"] = rows
+    return results
+
+if __name__ == "__main__":
+    import argparse, time
+    from config import RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="Signal-detection summary across all participants.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--by", nargs="*", default=FACTORS, choices=FACTORS)
+    parser.add_argument("--bootstrap", type=int, default=2000, help="replicates, 0 to skip CIs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the full summary (including ROC points) here")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = load_table(args.results_dir)
+    loaded = time.perf_counter()
+    results = summarize(table, args.by, args.bootstrap, args.workers, args.seed)
+    done = time.perf_counter()
+
+    for factor, rows in results.items():
+        print(f"\n== {factor}")
+        for r in rows:
+            ci = lambda name: f"[{r[name + '_ci'][0]:.2f}, {r[name + '_ci'][1]:.2f}]" if name + "_ci" in r else ""
+            print(f"{r['level']:<16} n={r['participants']:<5} trials={r['trials']:<6} "
+                  f"d'={r['d_prime']:.2f} {ci('d_prime'):<16} c={r['criterion']:.2f} {ci('criterion'):<16} "
+                  f"H={r['hit_rate']:.2f} FA={r['fa_rate']:.2f} AUC={r['auc']:.2f}")
+    print(f"\n{len(table['signal'])} trials from {len(np.unique(table['participant_id']))} participants; "
+          f"load {loaded - start:.2f}s, analysis {done - loaded:.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
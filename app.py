@@ -6,6 +6,10 @@ from trial_ui import show_trial
 from debrief import show_debrief  
 from config import apply_styling
 from helpers import init_lsl
+from profiler import profile_rerun
+from admin import is_admin_request, show_admin
+from janitor import start_janitor
+from admission import admit_or_wait, release_current
 
 if "storage" in st.session_state:
     print("Storage.path:", getattr(st.session_state.storage, "session_file", "no path"))
@@ -29,12 +33,28 @@ except:
 st.set_page_config(page_title="Moderator Task", layout="wide")
 apply_styling()
 
+start_janitor()
+
+# Study staff monitor the run here; no participant is allocated for the admin page
+if is_admin_request():
+    show_admin()
+    st.stop()
+
+# New arrivals wait here while the replica is full; nothing is allocated or loaded for them yet
+if not admit_or_wait():
+    st.stop()
+
 test_subsample = 20
 init_session_state(test_subsample)
 if 'trial_index' not in st.session_state:
     st.session_state.trial_index = st.session_state.storage.session_data.get("trial_index", 0)
 
-if st.session_state.trial_index >= len(st.session_state.trial_order):
-    show_debrief()
+# Participants who already submitted (e.g. reloading the thank-you page) go straight back to the debrief
+if (st.session_state.trial_index >= len(st.session_state.trial_order)
+        or st.session_state.storage.session_data.get("completion_status")):
+    release_current()
+    with profile_rerun("show_debrief"):
+        show_debrief()
 else:
-    show_trial()
\ No newline at end of file
+    with profile_rerun("show_trial"):
+        show_trial()
\ No newline at end of file
@@ -0,0 +1,219 @@
+# archive.py
+"""
+Compressed, checksummed per-participant bundles.
+
+A bundle is a gzip'd JSON Lines file: a header record, the session record,
+one record per trial, the aggregate (if any) and a footer holding the record
+count and the SHA-256 of every preceding line. It replaces the loose indent-2
+session/trial/aggregate files once a participant reaches the debrief.
+
+    python archive.py <participant_id> [...]   # bundle specific participants
+    python archive.py --completed              # bundle every finished participant
+    python archive.py --read <bundle>          # verify and summarize a bundle
+"""
+import os, json, gzip, hashlib, datetime, glob
+
+BUNDLE_FORMAT = "spoof-bundle"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_SUFFIX = "_bundle.jsonl.gz"
+
+class BundleError(ValueError):
+    pass
+
+def bundle_path(results_dir, participant_id):
+    return os.path.join(results_dir, f"participant_{participant_id}{BUNDLE_SUFFIX}")
+
+def participant_files(results_dir, participant_id):
+    """
+    Returns the loose result files of a participant: session, trials (by index) and aggregate.
+    """
+    prefix = os.path.join(results_dir, f"participant_{participant_id}")
+    trial_files = sorted(
+        glob.glob(f"{prefix}_trial_*.json"),
+        key=lambda x: int(x.split("_")[-1].split(".")[0])
+    )
+    return {
+        "session": f"{prefix}_session.json",
+        "trials": trial_files,
+        "aggregate": f"{prefix}_aggregate.json",
+        "journal": [f"{prefix}_journal.jsonl", f"{prefix}_snapshot.json"],
+    }
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def write_bundle(results_dir, participant_id, aggregate=None, remove_sources=False, session=None, trials=None,
+                 keep_session=False):
+    """
+    Merges a participant's session, trial and aggregate files into one bundle.
+    session and trials can be passed in when they come from a non-file state backend.
+    The bundle is read back and verified before any source file is removed; keep_session
+    leaves the session record in place as a tombstone of the finished participant.
+    """
+    files = participant_files(results_dir, participant_id)
+    if session is None:
+        session = _read_json(files["session"])
+    if session is None:
+        raise FileNotFoundError(files["session"])
+    if trials is None:
+        trials = [_read_json(f) for f in files["trials"]]
+    if aggregate is None:
+        aggregate = _read_json(files["aggregate"])
+
+    records = [{
+        "kind": "header",
+        "format": BUNDLE_FORMAT,
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "participant_id": participant_id,
+        "created_at": datetime.datetime.now().isoformat(),
+    }, {"kind": "session", "data": session}]
+    for trial in trials:
+        records.append({"kind": "trial", "data": trial})
+    if aggregate is not None:
+        records.append({"kind": "aggregate", "data": aggregate})
+
+    digest = hashlib.sha256()
+    out = bundle_path(results_dir, participant_id)
+    tmp = f"{out}.tmp"
+    with gzip.open(tmp, "wb", compresslevel=9) as gz:
+        for record in records:
+            line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode()
+            digest.update(line)
+            gz.write(line)
+        footer = {"kind": "footer", "records": len(records), "sha256": digest.hexdigest()}
+        gz.write((json.dumps(footer, separators=(",", ":")) + "\n").encode())
+    os.replace(tmp, out)
+
+    read_bundle(out)  # raises if the written bundle does not verify
+
+    if remove_sources:
+        sources = [files["aggregate"], *files["trials"], *files["journal"]]
+        for f in sources if keep_session else [files["session"], *sources]:
+            if os.path.exists(f):
+                os.remove(f)
+    return out
+
+def iter_bundle(path, verify=True):
+    """
+    Yields the records of a bundle (without the footer).
+    With verify=True the checksum is checked once the footer is reached.
+    """
+    digest = hashlib.sha256()
+    count = 0
+    with gzip.open(path, "rb") as gz:
+        for line in gz:
+            record = json.loads(line)
+            if record.get("kind") == "footer":
+                if verify and (record["records"] != count or record["sha256"] != digest.hexdigest()):
+                    raise BundleError(f"Checksum mismatch in {path}")
+                return
+            digest.update(line)
+            count += 1
+            yield record
+    if verify:
+        raise BundleError(f"Missing footer in {path}, bundle is truncated")
+
+def read_bundle(path, verify=True):
+    """
+    Reads a whole bundle into {"header", "session", "trials", "aggregate"}.
+    """
+    bundle = {"header": None, "session": None, "trials": [], "aggregate": None}
+    for record in iter_bundle(path, verify=verify):
+        kind = record["kind"]
+        if kind == "trial":
+            bundle["trials"].append(record["data"])
+        elif kind == "header":
+            if record.get("format") != BUNDLE_FORMAT or record.get("format_version") != BUNDLE_FORMAT_VERSION:
+                raise BundleError(f"Unsupported bundle format in {path}: {record}")
+            bundle["header"] = record
+        else:
+            bundle[kind] = record["data"]
+    return bundle
+
+def iter_result_records(results_dir, verify=True, skip_keys=None, skip_bundles=None):
+    """
+    Yields every saved trial record in results_dir, from bundles and loose trial files.
+    A trial present in both is yielded once, preferring the bundle.
+    For incremental jobs, loose files whose "participant_id:trial_index" is in
+    skip_keys and bundles whose file name is in skip_bundles are not opened.
+    """
+    seen = set()
+    skip_keys = skip_keys or set()
+    skip_bundles = skip_bundles or set()
+    for path in sorted(glob.glob(os.path.join(results_dir, f"participant_*{BUNDLE_SUFFIX}"))):
+        if os.path.basename(path) in skip_bundles:
+            continue
+        for record in iter_bundle(path, verify=verify):
+            if record["kind"] == "trial":
+                data = record["data"]
+                seen.add((data.get("participant_id"), data.get("trial_index")))
+                yield data
+    for path in sorted(glob.glob(os.path.join(results_dir, "participant_*_trial_*.json"))):
+        name = os.path.basename(path)[len("participant_"):-len(".json")]
+        participant_id, _, trial_index = name.rpartition("_trial_")
+        if f"{participant_id}:{trial_index}" in skip_keys:
+            continue
+        data = _read_json(path)
+        key = (data.get("participant_id"), data.get("trial_index"))
+        if key not in seen:
+            seen.add(key)
+            yield data
+
+def session_finished(session, trial_index=None):
+    """
+    Whether a session record has answered all of its trials (trial_index overrides the record's,
+    e.g. when the journal is ahead of it).
+    """
+    # Adaptive sessions only list the stimuli picked so far
+    n_trials = session.get("n_trials") if session.get("adaptive") else \
+        len(session.get("stimulus_ids") or session.get("trial_order") or [])
+    answered = session.get("trial_index", 0) if trial_index is None else trial_index
+    return bool(n_trials) and answered >= n_trials
+
+def completed_participants(results_dir):
+    """
+    Participant ids whose session reached the end of their trial order and are not yet bundled.
+    Sessions marked with a completion_status were bundled already.
+    """
+    completed = []
+    for path in glob.glob(os.path.join(results_dir, "participant_*_session.json")):
+        participant_id = os.path.basename(path)[len("participant_"):-len("_session.json")]
+        session = _read_json(path) or {}
+        if session.get("completion_status"):
+            continue  # tombstone of a participant bundled at the debrief
+        if session_finished(session):
+            completed.append(participant_id)
+        elif os.path.exists(participant_files(results_dir, participant_id)["aggregate"]):
+            completed.append(participant_id)
+    return sorted(completed)
+
+if __name__ == "__main__":
+    import argparse
+    from config import RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="Bundle finished participants' result files.")
+    parser.add_argument("participant_ids", nargs="*")
+    parser.add_argument("--completed", action="store_true", help="bundle every finished participant")
+    parser.add_argument("--keep-sources", action="store_true", help="do not delete the loose files")
+    parser.add_argument("--read", metavar="BUNDLE", help="verify and summarize a bundle")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    if args.read:
+        bundle = read_bundle(args.read)
+        print(f"{bundle['header']['participant_id']}: {len(bundle['trials'])} trials, "
+              f"aggregate={'yes' if bundle['aggregate'] else 'no'}, checksum OK")
+    else:
+        ids = args.participant_ids or []
+        if args.completed:
+            ids += completed_participants(args.results_dir)
+        for participant_id in ids:
+            before = sum(
+                os.path.getsize(f) for f in glob.glob(os.path.join(args.results_dir, f"participant_{participant_id}_*"))
+                if not f.endswith(BUNDLE_SUFFIX)
+            )
+            out = write_bundle(args.results_dir, participant_id, remove_sources=not args.keep_sources)
+            print(f"{participant_id}: {before} bytes -> {os.path.getsize(out)} bytes ({os.path.basename(out)})")
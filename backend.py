@@ -0,0 +1,493 @@
+# backend.py
+"""
+Shared participant state: session records, the trial journal, saved trials,
+participant id reservations, the progress index behind the admin dashboard and
+the per-stimulus results index read by the adaptive scheduler. Every replica of
+the app talks to the same backend, so a participant can resume (via ?participant_id=...) on whichever instance the
+load balancer sends them to.
+
+    file    participant_* files in RESULTS_DIR (the original layout; share the
+            directory between replicas)
+    sqlite  one SQLite database, e.g. on a shared volume
+    redis   any Redis-compatible server (needs the `redis` package)
+
+Selected with SPOOF_STATE_BACKEND / SPOOF_STATE_URL, see config.py.
+"""
+import os, json, time, secrets, sqlite3, threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends and compaction are only serialized within one process
+    fcntl = None
+
+PARTICIPANT_ID_BYTES = 5  # 10 hex characters, as the old timestamp hash
+STIMULUS_COUNTS = ("assigned", "trials", "correct")
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), default=str)
+
+class StateBackend:
+    """
+    Interface shared by all backends. Sessions and trials are JSON dicts,
+    journal records are the dicts written by journal.TrialJournal.
+    """
+    def reserve_participant_id(self, participant_id, session):
+        """
+        Stores session under participant_id unless the id exists. Returns True if reserved.
+        """
+        raise NotImplementedError
+
+    def new_participant_id(self, session=None, attempts=10):
+        """
+        Allocates a random participant id that no replica has handed out before.
+        """
+        for _ in range(attempts):
+            participant_id = secrets.token_hex(PARTICIPANT_ID_BYTES)
+            if self.reserve_participant_id(participant_id, session or {}):
+                return participant_id
+        raise RuntimeError(f"Could not allocate a participant id after {attempts} attempts")
+
+    def load_session(self, participant_id):
+        raise NotImplementedError
+
+    def save_session(self, participant_id, session):
+        raise NotImplementedError
+
+    def save_trial(self, participant_id, trial_idx, trial_data):
+        raise NotImplementedError
+
+    def load_trials(self, participant_id):
+        """
+        Returns {trial_index: trial data}.
+        """
+        raise NotImplementedError
+
+    def append_journal(self, participant_id, record):
+        raise NotImplementedError
+
+    def load_journal(self, participant_id):
+        """
+        Returns (snapshot or None, journal records in append order).
+        """
+        raise NotImplementedError
+
+    def write_snapshot(self, participant_id, snapshot):
+        """
+        Replaces the snapshot and drops the journal records it covers.
+        """
+        raise NotImplementedError
+
+    def update_progress(self, participant_id, fields):
+        """
+        Merges fields into the participant's entry of the progress index read by the admin dashboard.
+        """
+        raise NotImplementedError
+
+    def load_progress(self):
+        """
+        Returns the progress index, {participant_id: entry}.
+        """
+        raise NotImplementedError
+
+    def update_stimulus_stats(self, stimulus_id, counts):
+        """
+        Adds counts ({name in STIMULUS_COUNTS: n}) to the stimulus's entry of the results index.
+        """
+        raise NotImplementedError
+
+    def load_stimulus_stats(self):
+        """
+        Returns the results index, {stimulus_id: {"assigned": n, "trials": n, "correct": n}}.
+        """
+        raise NotImplementedError
+
+class _AppendIndex:
+    """
+    An append-only JSONL file folded into a dict. Replicas sharing the directory append to the
+    same file; load() reads only the lines appended since its last call. Appends and compaction
+    hold an exclusive lock on <path>.lock, so no append can land in a file that is being replaced.
+    """
+    def __init__(self, path, fold):
+        self.path = path
+        self.fold = fold  # fold(state, record) applies one line
+        # Folded state and how far the file (identified by inode) has been read
+        self.state, self.offset, self.inode = {}, 0, None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
+
+    def append(self, record):
+        with self._file_lock(), open(self.path, "a") as f:
+            f.write(_dumps(record) + "\n")
+
+    def load(self):
+        with self.lock:
+            return self._read()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self.inode:
+                self.state, self.offset, self.inode = {}, 0, inode  # compacted or new
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written, picked up next time
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[WARN] Skipping corrupt record in {self.path}")
+                    continue
+                self.fold(self.state, record)
+        return {key: dict(entry) for key, entry in self.state.items()}
+
+    def compact(self, records, min_lines_per_entry=10):
+        """
+        Rewrites the file as records(state) once it holds min_lines_per_entry lines per entry.
+        Appends from other threads and processes wait until the new file is in place.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with self.lock, self._file_lock():
+            state = self._read()
+            lines = 0
+            with open(self.path, "rb") as f:
+                for lines, _ in enumerate(f, start=1):
+                    pass
+            if lines < min_lines_per_entry * max(len(state), 1):
+                return False
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as out:
+                for record in records(state):
+                    out.write((_dumps(record) + "\n").encode())
+            os.replace(tmp, self.path)
+        return True
+
+def _fold_progress(state, record):
+    state.setdefault(record.pop("participant_id"), {}).update(record)
+
+def _fold_stimulus_stats(state, record):
+    entry = state.setdefault(record.pop("stimulus_id"), dict.fromkeys(STIMULUS_COUNTS, 0))
+    for name, n in record.items():
+        entry[name] = entry.get(name, 0) + n
+
+class FileBackend(StateBackend):
+    """
+    The participant_<id>_* JSON files in one directory, as read by archive.py and the analysis scripts.
+    """
+    PROGRESS_FILE = "progress_index.jsonl"
+    STIMULUS_STATS_FILE = "stimulus_index.jsonl"
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+        self.progress_file = os.path.join(results_dir, self.PROGRESS_FILE)
+        self._progress = _AppendIndex(self.progress_file, _fold_progress)
+        self._stimulus_stats = _AppendIndex(os.path.join(results_dir, self.STIMULUS_STATS_FILE), _fold_stimulus_stats)
+
+    def _path(self, participant_id, suffix):
+        return os.path.join(self.results_dir, f"participant_{participant_id}_{suffix}")
+
+    def reserve_participant_id(self, participant_id, session):
+        try:
+            # O_EXCL makes the check-and-create atomic, also across replicas on a shared volume
+            fd = os.open(self._path(participant_id, "session.json"), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump(session, f, indent=2)
+        return True
+
+    def load_session(self, participant_id):
+        path = self._path(participant_id, "session.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def save_session(self, participant_id, session):
+        path = self._path(participant_id, "session.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(session, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def save_trial(self, participant_id, trial_idx, trial_data):
+        with open(self._path(participant_id, f"trial_{trial_idx}.json"), "w") as f:
+            json.dump(trial_data, f, separators=(",", ":"))
+
+    def load_trials(self, participant_id):
+        from archive import bundle_path, read_bundle
+
+        bundle_file = bundle_path(self.results_dir, participant_id)
+        if os.path.exists(bundle_file):
+            return {data["trial_index"]: data for data in read_bundle(bundle_file)["trials"]}
+
+        prefix = f"participant_{participant_id}_trial_"
+        all_trials = {}
+        for f in os.listdir(self.results_dir):
+            if f.startswith(prefix) and f.endswith(".json"):
+                with open(os.path.join(self.results_dir, f), "r") as tf:
+                    data = json.load(tf)
+                all_trials[data["trial_index"]] = data
+        return dict(sorted(all_trials.items()))
+
+    def append_journal(self, participant_id, record):
+        with open(self._path(participant_id, "journal.jsonl"), "a") as f:
+            f.write(_dumps(record) + "\n")
+
+    def load_journal(self, participant_id):
+        snapshot, records = None, []
+        snapshot_file = self._path(participant_id, "snapshot.json")
+        journal_file = self._path(participant_id, "journal.jsonl")
+        if os.path.exists(snapshot_file):
+            with open(snapshot_file, "r") as f:
+                snapshot = json.load(f)
+        if os.path.exists(journal_file):
+            with open(journal_file, "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        print(f"[WARN] Truncated journal record in {journal_file}, stopping replay")
+                        break
+        return snapshot, records
+
+    def write_snapshot(self, participant_id, snapshot):
+        snapshot_file = self._path(participant_id, "snapshot.json")
+        with open(f"{snapshot_file}.tmp", "w") as f:
+            f.write(_dumps(snapshot))
+        os.replace(f"{snapshot_file}.tmp", snapshot_file)
+        open(self._path(participant_id, "journal.jsonl"), "w").close()
+
+    def update_progress(self, participant_id, fields):
+        # One short appended line per update
+        self._progress.append({"participant_id": participant_id, **fields})
+
+    def load_progress(self):
+        return self._progress.load()
+
+    def compact_progress(self, drop_statuses=(), min_lines_per_entry=10):
+        """
+        Rewrites the progress index with one line per participant, see _AppendIndex.compact.
+        """
+        return self._progress.compact(
+            lambda progress: ({"participant_id": pid, **entry} for pid, entry in progress.items()
+                              if entry.get("status") not in drop_statuses),
+            min_lines_per_entry)
+
+    def update_stimulus_stats(self, stimulus_id, counts):
+        self._stimulus_stats.append({"stimulus_id": stimulus_id, **counts})
+
+    def load_stimulus_stats(self):
+        return self._stimulus_stats.load()
+
+    def compact_stimulus_stats(self, min_lines_per_entry=10):
+        return self._stimulus_stats.compact(
+            lambda stats: ({"stimulus_id": sid, **counts} for sid, counts in stats.items()), min_lines_per_entry)
+
+class SQLiteBackend(StateBackend):
+    """
+    All state in one SQLite database (WAL mode). Suitable for a volume shared by
+    replicas on one host or a network filesystem with working locks, and as a
+    drop-in for the Redis backend in tests.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (participant_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL);
+    CREATE TABLE IF NOT EXISTS trials (participant_id TEXT, trial_index INTEGER, data TEXT NOT NULL,
+                                       PRIMARY KEY (participant_id, trial_index));
+    CREATE TABLE IF NOT EXISTS journal (participant_id TEXT, seq INTEGER, record TEXT NOT NULL,
+                                        PRIMARY KEY (participant_id, seq));
+    CREATE TABLE IF NOT EXISTS snapshots (participant_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS progress (participant_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS stimulus_stats (stimulus_id TEXT PRIMARY KEY, assigned INTEGER NOT NULL DEFAULT 0,
+                                               trials INTEGER NOT NULL DEFAULT 0, correct INTEGER NOT NULL DEFAULT 0);
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        # Streamlit runs each session in its own thread; sqlite3 connections are per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def reserve_participant_id(self, participant_id, session):
+        try:
+            with self._conn() as conn:
+                conn.execute("INSERT INTO sessions VALUES (?, ?, ?)", (participant_id, _dumps(session), time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def load_session(self, participant_id):
+        row = self._conn().execute("SELECT data FROM sessions WHERE participant_id = ?", (participant_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_session(self, participant_id, session):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                         (participant_id, _dumps(session), time.time()))
+
+    def save_trial(self, participant_id, trial_idx, trial_data):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO trials VALUES (?, ?, ?)",
+                         (participant_id, trial_idx, _dumps(trial_data)))
+
+    def load_trials(self, participant_id):
+        rows = self._conn().execute(
+            "SELECT trial_index, data FROM trials WHERE participant_id = ? ORDER BY trial_index", (participant_id,)
+        ).fetchall()
+        return {idx: json.loads(data) for idx, data in rows}
+
+    def append_journal(self, participant_id, record):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO journal VALUES (?, ?, ?)",
+                         (participant_id, record["seq"], _dumps(record)))
+
+    def load_journal(self, participant_id):
+        conn = self._conn()
+        row = conn.execute("SELECT data FROM snapshots WHERE participant_id = ?", (participant_id,)).fetchone()
+        rows = conn.execute("SELECT record FROM journal WHERE participant_id = ? ORDER BY seq",
+                            (participant_id,)).fetchall()
+        return (json.loads(row[0]) if row else None), [json.loads(r[0]) for r in rows]
+
+    def write_snapshot(self, participant_id, snapshot):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?)", (participant_id, _dumps(snapshot)))
+            conn.execute("DELETE FROM journal WHERE participant_id = ? AND seq <= ?", (participant_id, snapshot["seq"]))
+
+    def update_progress(self, participant_id, fields):
+        with self._conn() as conn:
+            conn.execute("INSERT INTO progress VALUES (?, ?) ON CONFLICT (participant_id) "
+                         "DO UPDATE SET data = json_patch(data, excluded.data)", (participant_id, _dumps(fields)))
+
+    def load_progress(self):
+        rows = self._conn().execute("SELECT participant_id, data FROM progress").fetchall()
+        return {pid: json.loads(data) for pid, data in rows}
+
+    def update_stimulus_stats(self, stimulus_id, counts):
+        values = [int(counts.get(name, 0)) for name in STIMULUS_COUNTS]
+        with self._conn() as conn:
+            conn.execute("INSERT INTO stimulus_stats VALUES (?, ?, ?, ?) ON CONFLICT (stimulus_id) DO UPDATE SET "
+                         "assigned = assigned + excluded.assigned, trials = trials + excluded.trials, "
+                         "correct = correct + excluded.correct", (stimulus_id, *values))
+
+    def load_stimulus_stats(self):
+        rows = self._conn().execute("SELECT stimulus_id, assigned, trials, correct FROM stimulus_stats").fetchall()
+        return {row[0]: dict(zip(STIMULUS_COUNTS, row[1:])) for row in rows}
+
+class RedisBackend(StateBackend):
+    """
+    State in a Redis-compatible server. Keys are prefixed so one server can host several studies.
+    """
+    def __init__(self, url, prefix="spoof"):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, kind, participant_id):
+        return f"{self.prefix}:{kind}:{participant_id}"
+
+    def reserve_participant_id(self, participant_id, session):
+        return bool(self.client.set(self._key("session", participant_id), _dumps(session), nx=True))
+
+    def load_session(self, participant_id):
+        data = self.client.get(self._key("session", participant_id))
+        return json.loads(data) if data else None
+
+    def save_session(self, participant_id, session):
+        self.client.set(self._key("session", participant_id), _dumps(session))
+
+    def save_trial(self, participant_id, trial_idx, trial_data):
+        self.client.hset(self._key("trials", participant_id), str(trial_idx), _dumps(trial_data))
+
+    def load_trials(self, participant_id):
+        rows = self.client.hgetall(self._key("trials", participant_id))
+        return dict(sorted((int(idx), json.loads(data)) for idx, data in rows.items()))
+
+    def append_journal(self, participant_id, record):
+        self.client.rpush(self._key("journal", participant_id), _dumps(record))
+
+    def load_journal(self, participant_id):
+        snapshot = self.client.get(self._key("snapshot", participant_id))
+        records = self.client.lrange(self._key("journal", participant_id), 0, -1)
+        return (json.loads(snapshot) if snapshot else None), [json.loads(r) for r in records]
+
+    def write_snapshot(self, participant_id, snapshot):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self._key("snapshot", participant_id), _dumps(snapshot))
+        pipe.delete(self._key("journal", participant_id))
+        pipe.execute()
+
+    def update_progress(self, participant_id, fields):
+        # WATCH/MULTI retries the merge if another writer (e.g. the old and new browser session of a
+        # participant who reloaded) changed the entry in between, so neither overwrites the other's fields
+        key = f"{self.prefix}:progress"
+
+        def merge(pipe):
+            entry = pipe.hget(key, participant_id)
+            entry = {**(json.loads(entry) if entry else {}), **fields}
+            pipe.multi()
+            pipe.hset(key, participant_id, _dumps(entry))
+
+        self.client.transaction(merge, key)
+
+    def load_progress(self):
+        rows = self.client.hgetall(f"{self.prefix}:progress")
+        return {pid.decode() if isinstance(pid, bytes) else pid: json.loads(data) for pid, data in rows.items()}
+
+    def update_stimulus_stats(self, stimulus_id, counts):
+        # One hash per count, incremented atomically by every replica
+        pipe = self.client.pipeline(transaction=False)
+        for name, n in counts.items():
+            pipe.hincrby(f"{self.prefix}:stimulus_stats:{name}", stimulus_id, int(n))
+        pipe.execute()
+
+    def load_stimulus_stats(self):
+        stats = {}
+        for name in STIMULUS_COUNTS:
+            for sid, n in self.client.hgetall(f"{self.prefix}:stimulus_stats:{name}").items():
+                sid = sid.decode() if isinstance(sid, bytes) else sid
+                stats.setdefault(sid, dict.fromkeys(STIMULUS_COUNTS, 0))[name] = int(n)
+        return stats
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    The process-wide backend configured in config.py (created on first use).
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            from config import STATE_BACKEND, STATE_BACKEND_URL, RESULTS_DIR
+            if STATE_BACKEND == "file":
+                _backend = FileBackend(STATE_BACKEND_URL or RESULTS_DIR)
+            elif STATE_BACKEND == "sqlite":
+                _backend = SQLiteBackend(STATE_BACKEND_URL or os.path.join(RESULTS_DIR, "state.sqlite3"))
+            elif STATE_BACKEND == "redis":
+                _backend = RedisBackend(STATE_BACKEND_URL or "redis://localhost:6379/0")
+            else:
+                raise ValueError(f"Unknown state backend: {STATE_BACKEND}")
+            print(f"State backend: {type(_backend).__name__}")
+        return _backend
@@ -0,0 +1,85 @@
+# benchmarks/adaptive.py
+"""
+Participants needed until every stimulus is measured to a target precision,
+with random stimulus subsets versus adaptive scheduling (scheduler.py).
+
+Simulated participants answer a synthetic catalog. Each stimulus has a true
+accuracy drawn from Beta(--alpha, --beta), and every trial's correctness is a
+coin flip with that probability. --concurrent participants run side by side
+and advance one trial at a time, so adaptive picks see assignments that are
+still pending, as they would with several replicas. A stimulus counts as
+measured once its 95% posterior interval is within ±--target.
+
+    python benchmarks/adaptive.py [--stimuli 100] [--trials 20] [--target 0.15] [--runs 5]
+"""
+import os, sys, random, argparse, statistics
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from plan import session_plan, extend_plan
+from scheduler import pick_stimulus, precision_report
+from backend import STIMULUS_COUNTS
+
+LABELS = ["partial_spoof", "partial_spoof", "bonafide", "full_spoof"]
+INSTRUCTION_VERSIONS = ["monitor_attacks", "new_tech"]
+
+def synthetic_catalog(n_stimuli):
+    return {
+        "version": "synthetic",
+        "stimuli": [{"stimulus_id": f"s{i:04d}", "label": LABELS[i % len(LABELS)]} for i in range(n_stimuli)],
+        "affect_images": [],
+    }
+
+def simulate(catalog, accuracy, n_trials, concurrent, target, adaptive, rng, max_participants=5000):
+    """
+    Number of participants after which all stimuli reached target (None if max_participants was not enough).
+    """
+    stats = {s["stimulus_id"]: dict.fromkeys(STIMULUS_COUNTS, 0) for s in catalog["stimuli"]}
+    started = 0
+    while started < max_participants:
+        plans = [session_plan({}, catalog, INSTRUCTION_VERSIONS, n_trials=n_trials, adaptive=adaptive)[0]
+                 for _ in range(concurrent)]
+        started += concurrent
+        for position in range(n_trials):
+            if adaptive:
+                for i, plan in enumerate(plans):
+                    stimulus_id = pick_stimulus(plan, catalog, stats)
+                    stats[stimulus_id]["assigned"] += 1
+                    plans[i] = extend_plan(plan, catalog, INSTRUCTION_VERSIONS, stimulus_id)
+            for plan in plans:
+                entry = stats[plan["stimulus_ids"][position]]
+                entry["trials"] += 1
+                entry["correct"] += rng.random() < accuracy[plan["stimulus_ids"][position]]
+                if not adaptive:
+                    entry["assigned"] += 1
+        _, reached = precision_report(catalog, stats, target)
+        if reached == len(catalog["stimuli"]):
+            return started
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stimuli", type=int, default=100)
+    parser.add_argument("--trials", type=int, default=20, help="trials per participant")
+    parser.add_argument("--concurrent", type=int, default=10, help="participants running at the same time")
+    parser.add_argument("--target", type=float, default=0.15, help="95%% interval half-width")
+    parser.add_argument("--alpha", type=float, default=4.0)
+    parser.add_argument("--beta", type=float, default=2.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.stimuli)
+    results = {"random": [], "adaptive": []}
+    for run in range(args.runs):
+        rng = random.Random(run)
+        accuracy = {s["stimulus_id"]: rng.betavariate(args.alpha, args.beta) for s in catalog["stimuli"]}
+        for name in results:
+            results[name].append(simulate(catalog, accuracy, args.trials, args.concurrent, args.target,
+                                          name == "adaptive", random.Random(f"{run}:{name}")))
+        print(f"run {run}: random {results['random'][-1]}, adaptive {results['adaptive'][-1]} participants")
+
+    summary = {name: statistics.median(v for v in values if v is not None) for name, values in results.items()}
+    print(f"\nMedian participants until all {args.stimuli} stimuli are within ±{args.target}: "
+          f"random {summary['random']:.0f}, adaptive {summary['adaptive']:.0f} "
+          f"({1 - summary['adaptive'] / summary['random']:.0%} fewer)")
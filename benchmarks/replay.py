@@ -0,0 +1,230 @@
+# benchmarks/replay.py
+"""
+Replays recorded participant action logs against the app as a load generator.
+
+Every saved trial record carries its action_log (actions with ts_wall). Each
+recorded participant is re-driven headlessly through AppTest in its own
+process, many in parallel, keeping the recorded gaps between actions divided
+by --speed (0 = no waiting). Actions map onto the same widgets:
+
+    add_segment / add_flag   set the slider to the recorded value and click Add
+    update_slider            move the slider (to the value of the next add, if any)
+    play_selection           set the segment slider and click Play selection
+    edit_annotations         apply the recorded diff to the trial state and rerun
+    eval_response            answered in the browser since evaluation batching; applied at Save
+    next_trial               click Save and Continue, then reload
+    emergency_quit           stops the participant
+
+Replayed participants get fresh ids in a scratch state backend (--state-dir),
+so recorded results are never touched. Rerun latencies are reported per action.
+
+    python benchmarks/replay.py [--results-dir results] [--speed 10] [--workers 8] [--limit 20]
+"""
+import os, sys, time, json, argparse, tempfile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+MAX_GAP_S = 30.0  # recorded pauses longer than this are shortened (breaks, idle tabs)
+
+def load_sessions(results_dir, participant_ids=None, limit=None):
+    """
+    Recorded sessions as {participant_id: [trial action logs in trial order]}.
+    """
+    from archive import iter_result_records
+
+    by_participant = {}
+    for rec in iter_result_records(results_dir):
+        pid = str(rec.get("participant_id"))
+        if participant_ids and pid not in participant_ids:
+            continue
+        by_participant.setdefault(pid, {})[rec["trial_index"]] = rec.get("action_log") or []
+    sessions = {pid: [trials[i] for i in sorted(trials)] for pid, trials in sorted(by_participant.items())}
+    if limit:
+        sessions = dict(list(sessions.items())[:limit])
+    return sessions
+
+def _parse_segment(value):
+    start, _, end = str(value).partition("-")
+    return float(start), float(end)
+
+def _next_value(actions, i, action_type):
+    for action in actions[i + 1:]:
+        if action.get("action") == action_type:
+            return action
+    return None
+
+class Replayer:
+    def __init__(self, speed):
+        from streamlit.testing.v1 import AppTest
+
+        self.speed = speed
+        self.latencies = {}
+        self.at = AppTest.from_file(os.path.join(PROJECT_DIR, "app.py"), default_timeout=120)
+
+    def _run(self, label, fn):
+        start = time.perf_counter()
+        fn()
+        self.latencies.setdefault(label, []).append(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(f"{label}: {self.at.exception}")
+
+    def _button(self, label):
+        return next(b for b in self.at.button if b.label == label)
+
+    def _slider(self, suffix):
+        trial_idx = self.at.session_state.trial_index
+        return self.at.slider(key=f"{trial_idx}_{suffix}")
+
+    def _duration(self):
+        return float(self._slider("flag_slider").max)
+
+    def replay(self, trials):
+        at = self.at
+        self._run("start", at.run)
+        self._run("instructions", lambda: self._button("I understand.").click().run())
+        last_ts = None
+        for actions in trials:
+            if at.session_state.trial_index >= len(at.session_state.trial_order):
+                break
+            responses = {}
+            # next_trial is logged after the trial record is written, so saved logs end without it
+            if not actions or actions[-1].get("action") != "next_trial":
+                actions = [*actions, {"action": "next_trial"}]
+            for i, action in enumerate(actions):
+                ts = action.get("ts_wall")
+                if self.speed and ts is not None and last_ts is not None:
+                    time.sleep(min(max(ts - last_ts, 0.0), MAX_GAP_S) / self.speed)
+                last_ts = ts if ts is not None else last_ts
+                if self.apply(action, actions, i, responses) == "stop":
+                    return
+        if at.session_state.trial_index >= len(at.session_state.trial_order):
+            self._run("debrief", at.run)
+
+    def apply(self, action, actions, i, responses):
+        at = self.at
+        kind = action.get("action")
+        clamp = lambda t: min(max(float(t), 0.0), self._duration())
+        trial_idx = at.session_state.trial_index
+
+        if kind == "add_segment":
+            start, end = _parse_segment(action["segment"])
+            self._slider("segment_slider").set_value((clamp(start), clamp(end)))
+            self._run(kind, lambda: self._button("Add segment").click().run())
+        elif kind == "add_flag":
+            self._slider("flag_slider").set_value(clamp(action["flag"]))
+            self._run(kind, lambda: self._button("Add flag").click().run())
+        elif kind == "update_slider":
+            if str(action.get("slider", "")).endswith("segment_slider"):
+                nxt = _next_value(actions, i, "add_segment")
+                slider = self._slider("segment_slider")
+                value = tuple(map(clamp, _parse_segment(nxt["segment"]))) if nxt else slider.value
+            else:
+                nxt = _next_value(actions, i, "add_flag")
+                slider = self._slider("flag_slider")
+                value = clamp(nxt["flag"]) if nxt else slider.value
+            self._run(kind, lambda: slider.set_value(value).run())
+        elif kind == "play_selection":
+            start, end = _parse_segment(action["segment"])
+            self._slider("segment_slider").set_value((clamp(start), clamp(end)))
+            self._run(kind, lambda: self._button("▶ Play selection").click().run())
+        elif kind == "edit_annotations":
+            for name, diff in (("segments_by_trial", action.get("segments") or {}),
+                               ("flags_by_trial", action.get("flags") or {})):
+                current = at.session_state[name].get(trial_idx, [])
+                removed = set(diff.get("removed", []))
+                changed = {c["id"]: c["to"] for c in diff.get("changed", [])}
+                current = [dict(a, **changed.get(a["id"], {})) for a in current if a["id"] not in removed]
+                current += diff.get("added", [])
+                at.session_state[name] = {**at.session_state[name], trial_idx: current}
+            self._run(kind, at.run)
+        elif kind == "eval_response":
+            responses[action["question"]] = action["new_answer"]
+        elif kind == "next_trial":
+            if responses:
+                by_trial = at.session_state["responses_by_trial"]
+                at.session_state["responses_by_trial"] = {**by_trial, trial_idx: {**by_trial.get(trial_idx, {}), **responses}}
+            self._run(kind, lambda: self._button("Save and Continue").click().run())
+            self._run("reload", at.run)
+        elif kind == "emergency_quit":
+            return "stop"
+
+def replay_participant(job):
+    participant_id, trials, speed = job
+    replayer = Replayer(speed)
+    start = time.perf_counter()
+    error = None
+    try:
+        replayer.replay(trials)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "recorded_participant": participant_id,
+        "replayed_participant": replayer.at.session_state["participant_id"] if "participant_id" in replayer.at.session_state else None,
+        "elapsed": time.perf_counter() - start,
+        "latencies": replayer.latencies,
+        "error": error,
+    }
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def main():
+    from config import RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="Replay recorded action logs against the app.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--participants", nargs="*", help="recorded participant ids (default: all)")
+    parser.add_argument("--limit", type=int, help="replay at most this many participants")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = no waiting")
+    parser.add_argument("--workers", type=int, default=4, help="participants replayed in parallel")
+    parser.add_argument("--state-dir", help="scratch directory for the replayed participants' state")
+    parser.add_argument("--json", help="write per-participant results here")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.results_dir, args.participants, args.limit)
+    if not sessions:
+        print(f"No recorded action logs in {args.results_dir}")
+        return
+
+    # Workers inherit this environment; replayed participants never touch the recorded results or bundles
+    state_dir = args.state_dir or tempfile.mkdtemp(prefix="spoof_replay_")
+    os.environ.setdefault("SPOOF_STATE_BACKEND", "file")
+    os.environ["SPOOF_JANITOR"] = "0"  # app.py would otherwise sweep the real RESULTS_DIR in every worker
+    if os.environ["SPOOF_STATE_BACKEND"] == "file":
+        os.environ["SPOOF_STATE_URL"] = state_dir
+    elif os.environ["SPOOF_STATE_BACKEND"] == "sqlite":
+        os.environ["SPOOF_STATE_URL"] = os.path.join(state_dir, "state.sqlite3")
+
+    print(f"Replaying {len(sessions)} participants at {args.speed or 'max'}x with {args.workers} workers -> {state_dir}")
+    start = time.perf_counter()
+    jobs = [(pid, trials, args.speed) for pid, trials in sessions.items()]
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = []
+        for result in pool.map(replay_participant, jobs):
+            status = result["error"] or "ok"
+            print(f"  {result['recorded_participant']} -> {result['replayed_participant']}: "
+                  f"{result['elapsed']:.1f}s {status}")
+            results.append(result)
+    wall = time.perf_counter() - start
+
+    merged = {}
+    for result in results:
+        for label, values in result["latencies"].items():
+            merged.setdefault(label, []).extend(values)
+    print(f"\n{'action':<18} {'reruns':>7} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8}")
+    for label, values in sorted(merged.items()):
+        print(f"{label:<18} {len(values):>7} {1000 * percentile(values, 0.5):>8.0f} "
+              f"{1000 * percentile(values, 0.95):>8.0f} {1000 * max(values):>8.0f}")
+    failed = sum(1 for r in results if r["error"])
+    print(f"\n{sum(map(len, merged.values()))} reruns in {wall:.1f}s, {failed} participant(s) failed")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
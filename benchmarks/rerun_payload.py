@@ -0,0 +1,62 @@
+# benchmarks/rerun_payload.py
+"""
+Measures the element payload of one show_trial rerun as annotations grow.
+
+Renders the first trial headlessly with N segments and N flags and sums the
+serialized size of every element proto (what a full rerun sends to the
+browser), separating out the bytes spent on injected CSS.
+
+    python benchmarks/rerun_payload.py [--counts 0 5 10 20 40]
+"""
+import os, uuid, argparse
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def walk(node):
+    yield node
+    children = getattr(node, "children", None) or {}
+    for child in (children.values() if isinstance(children, dict) else children):
+        yield from walk(child)
+
+def measure(at):
+    total = style = elements = 0
+    for node in walk(at._tree):
+        proto = getattr(node, "proto", None)
+        if proto is None or not hasattr(proto, "ByteSize"):
+            continue
+        size = proto.ByteSize()
+        total += size
+        elements += 1
+        body = getattr(proto, "body", "")
+        if isinstance(body, str) and "<style" in body or "css" in type(node).__name__.lower():
+            style += size
+    return total, style, elements
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", type=int, nargs="+", default=[0, 5, 10, 20, 40])
+    args = parser.parse_args()
+
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["SPOOF_JANITOR"] = "0"  # keep the app's janitor thread off the real RESULTS_DIR
+    at = AppTest.from_file(os.path.join(PROJECT_DIR, "app.py"), default_timeout=60).run()
+    [b for b in at.button if b.label == "I understand."][0].click().run()
+    trial_idx = at.session_state.trial_index
+
+    print(f"{'annotations':>12} {'elements':>9} {'payload_B':>10} {'style_B':>8}")
+    for n in args.counts:
+        at.session_state["segments_by_trial"] = {trial_idx: [
+            {"id": str(uuid.uuid4()), "start": 0.1 * i, "end": 0.1 * i + 0.05, "timestamp": ""} for i in range(n)
+        ]}
+        at.session_state["flags_by_trial"] = {trial_idx: [
+            {"id": str(uuid.uuid4()), "time": 0.1 * i, "timestamp": ""} for i in range(n)
+        ]}
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception)
+        total, style, elements = measure(at)
+        print(f"{2 * n:>12} {elements:>9} {total:>10} {style:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/startup.py
+"""
+Cold-start cost of the app entry point.
+
+Two measurements, each in fresh interpreters so nothing is already imported:
+  - import time of the modules app.py imports (`python -X importtime`), with the
+    cumulative cost of the heaviest packages and whether they load at all;
+  - time to first render: a new process runs app.py once with AppTest (the
+    instructions page a participant sees first) and reports the elapsed time.
+
+Results are compared with benchmarks/startup_baseline.json; --check exits
+non-zero when either number regresses by more than --tolerance, and --update
+rewrites the baseline.
+
+    python benchmarks/startup.py [--runs 5] [--check] [--update]
+"""
+import os, sys, json, time, argparse, subprocess, statistics
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(PROJECT_DIR, "benchmarks", "startup_baseline.json")
+
+# What app.py imports at module load
+APP_IMPORTS = ["streamlit", "session_state", "trial_ui", "debrief", "config", "helpers", "profiler", "admin"]
+# Packages that should only load on the code paths that need them
+WATCHED = ["matplotlib", "pandas", "github", "pylsl", "openpyxl", "numpy", "PIL"]
+
+FIRST_RENDER = """
+import time, sys
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+elapsed = time.perf_counter() - start
+assert not at.exception, at.exception
+print(f"FIRST_RENDER {elapsed:.4f}")
+print("LOADED " + ",".join(sorted(m for m in sys.argv[2].split(",") if m in sys.modules)))
+"""
+
+def run_python(args, env=None):
+    return subprocess.run([sys.executable, *args], cwd=PROJECT_DIR, capture_output=True, text=True,
+                          env={**os.environ, **(env or {})})
+
+def import_times():
+    """
+    Returns (total µs, {top-level module: cumulative µs}) for importing APP_IMPORTS.
+    """
+    proc = run_python(["-X", "importtime", "-c", "import " + ", ".join(APP_IMPORTS)])
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        if not cum.strip().isdigit():
+            continue
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            cumulative[name.strip()] = int(cum)
+        elif name.strip() in WATCHED:
+            cumulative.setdefault(name.strip(), int(cum))
+    total = sum(v for k, v in cumulative.items() if k in APP_IMPORTS)
+    return total, cumulative
+
+def first_render():
+    """
+    Returns (seconds, packages from WATCHED loaded by the first run).
+    """
+    proc = run_python(["-c", FIRST_RENDER, os.path.join(PROJECT_DIR, "app.py"), ",".join(WATCHED)],
+                      # No janitor: it would sweep the real RESULTS_DIR and add a background sweep to the timing
+                      env={"SPOOF_STATE_URL": os.path.join(PROJECT_DIR, "benchmarks", ".startup_state"),
+                           "SPOOF_JANITOR": "0"})
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    seconds = loaded = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("FIRST_RENDER "):
+            seconds = float(line.split()[1])
+        elif line.startswith("LOADED"):
+            loaded = [m for m in line[len("LOADED"):].strip().split(",") if m]
+    return seconds, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time and time to first render.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    imports = [import_times() for _ in range(args.runs)]
+    renders = [first_render() for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _ in imports) / 1000
+    render_s = statistics.median(seconds for seconds, _ in renders)
+    modules = {name: statistics.median(cum.get(name, 0) for _, cum in imports) / 1000
+               for name in APP_IMPORTS + WATCHED}
+
+    print(f"{'module':<16} {'import_ms':>10}")
+    for name, ms in sorted(modules.items(), key=lambda kv: -kv[1]):
+        if ms:
+            print(f"{name:<16} {ms:>10.1f}")
+    print(f"\napp imports: {import_ms:.0f} ms (median of {args.runs})")
+    print(f"first render: {render_s:.2f} s (median of {args.runs}), loaded: {', '.join(renders[0][1]) or 'none'}")
+
+    result = {
+        "import_ms": round(import_ms, 1),
+        "first_render_s": round(render_s, 3),
+        "first_render_loaded": renders[0][1],
+        "modules_ms": {k: round(v, 1) for k, v in modules.items() if v},
+        "python": sys.version.split()[0],
+        "measured_at": time.strftime("%Y-%m-%d"),
+    }
+
+    status = 0
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)
+        for key in ("import_ms", "first_render_s"):
+            change = result[key] / baseline[key] - 1
+            print(f"{key}: {baseline[key]} -> {result[key]} ({change:+.0%})")
+            if args.check and change > args.tolerance:
+                print(f"[FAIL] {key} regressed by more than {args.tolerance:.0%}")
+                status = 1
+    if args.update:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
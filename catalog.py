@@ -0,0 +1,262 @@
+# catalog.py
+"""
+Offline build step that compiles the stimulus and affect spreadsheets into a
+versioned JSON catalog. The app only reads the compiled file, so openpyxl is
+needed at build time and never on a rerun.
+
+Rebuild after editing either spreadsheet:
+
+    python catalog.py
+"""
+import os, re, json, glob, hashlib, datetime
+
+CATALOG_SCHEMA_VERSION = 1
+
+STIMULI_COLUMNS = {
+    "required": ["file_id", "label", "spoof_times", "duration", "video_file"],
+    "optional": ["gen_model", "text_id", "mixed_file"],
+}
+AFFECT_COLUMNS = {
+    "required": ["image_file", "quadrant"],
+    "optional": ["emotion", "media_type"],
+}
+LABELS = ("bonafide", "full_spoof", "partial_spoof")
+
+# e.g. dev01-yourtts-partial-cf_7850_281318_000027_000000, test-clean_8224_274384_000001_000000
+FILE_ID_PATTERN = re.compile(
+    r"^(?P<split>[a-z]+\d*)-(?P<generator>[a-z0-9]+)(?:-(?P<spoof_kind>full|partial-cf))?"
+    r"_(?P<speaker>\d+)_(?P<chapter>\d+)_(?P<utterance>\d+_\d+)$"
+)
+MIX_PATTERN = re.compile(r"_proc_mix_(?P<mix_id>[A-Za-z]+\d+)$")
+
+
+def parse_file_id(file_id):
+    """
+    Extract split, generator, speaker and utterance IDs from a stimulus file id.
+    """
+    m = FILE_ID_PATTERN.match(file_id or "")
+    if not m:
+        return {}
+    speaker = m.group("speaker")
+    return {
+        "split": m.group("split"),
+        "generator": m.group("generator"),
+        "speaker_id": speaker,
+        "utterance_id": f"{speaker}_{m.group('chapter')}_{m.group('utterance')}",
+    }
+
+
+def parse_mix_id(mixed_file):
+    """
+    Extract the mixing condition (e.g. CT119) from a stage3_mix filename.
+    """
+    if not mixed_file:
+        return None
+    stem = os.path.splitext(os.path.basename(mixed_file))[0]
+    m = MIX_PATTERN.search(stem)
+    return m.group("mix_id") if m else None
+
+
+def match_video(video_file):
+    """
+    Return an existing video path, falling back to a fuzzy match on the
+    (truncated) filename inside the same folder.
+    """
+    if not video_file:
+        return None
+    video_file = video_file.strip().replace("\\", "/")
+    if os.path.exists(video_file):
+        return video_file
+
+    folder, fname = os.path.split(video_file)
+    base = re.sub(r"[^a-zA-Z0-9\-]+", "_", os.path.splitext(fname)[0])
+    for c in glob.glob(os.path.join(folder, "*.mp4")):
+        c_base = os.path.splitext(os.path.basename(c))[0]
+        if base in c_base or c_base in base:
+            return c
+    return None
+
+
+def _header_index(header, columns, sheet_name):
+    """
+    Map column names to positions, raising if a required column is missing.
+    """
+    names = [str(h).strip().lower() if h is not None else "" for h in header]
+    missing = [c for c in columns["required"] if c not in names]
+    if missing:
+        raise ValueError(f"{sheet_name}: missing required column(s) {missing}, found {names}")
+    return {c: names.index(c) for c in columns["required"] + columns["optional"] if c in names}
+
+
+def _read_rows(excel_path, columns):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    index = _header_index(next(rows), columns, os.path.basename(excel_path))
+    for row in rows:
+        if not any(v is not None for v in row):
+            continue
+        yield {c: (row[i] if i < len(row) else None) for c, i in index.items()}
+
+
+def _relpath(project_root, path):
+    return os.path.relpath(path, project_root).replace("\\", "/")
+
+
+def compile_stimuli(project_root, stimuli_excel, warnings):
+    from helpers import parse_duration, parse_spoof_intervals
+
+    stimuli = []
+    seen = set()
+    for n, row in enumerate(_read_rows(stimuli_excel, STIMULI_COLUMNS), start=2):
+        file_id = str(row["file_id"] or "").strip()
+        if not file_id:
+            warnings.append(f"row {n}: empty file_id, skipped")
+            continue
+        if file_id in seen:
+            raise ValueError(f"row {n}: duplicate file_id {file_id}")
+        seen.add(file_id)
+
+        label = str(row["label"] or "").strip().lower()
+        if label not in LABELS:
+            raise ValueError(f"row {n}: unknown label {row['label']!r} for {file_id}")
+
+        duration = parse_duration(row["duration"])
+        if duration <= 0:
+            raise ValueError(f"row {n}: invalid duration {row['duration']!r} for {file_id}")
+
+        spoof_raw = str(row["spoof_times"] or "").strip()
+        intervals = [[s, e] for s, e in parse_spoof_intervals(spoof_raw)]
+        if label == "partial_spoof" and not intervals:
+            warnings.append(f"{file_id}: partial_spoof without GT intervals")
+        for s, e in intervals:
+            if e > duration + 1e-6:
+                warnings.append(f"{file_id}: GT interval {s}-{e} ends after duration {duration}")
+
+        video_raw = str(row["video_file"] or "").replace("\\", "/")
+        video = match_video(os.path.join(project_root, video_raw)) if video_raw else None
+        if not video:
+            raise ValueError(f"row {n}: video {video_raw!r} not found for {file_id}")
+
+        audio = None
+        mixed_raw = str(row.get("mixed_file") or "").replace("\\", "/")
+        if mixed_raw:
+            audio_path = os.path.join(project_root, mixed_raw)
+            if os.path.exists(audio_path):
+                audio = _relpath(project_root, audio_path)
+            else:
+                warnings.append(f"{file_id}: audio {mixed_raw} not found")
+
+        ids = parse_file_id(file_id)
+        if not ids:
+            warnings.append(f"{file_id}: could not parse generator/speaker/utterance from file id")
+
+        stimuli.append({
+            "stimulus_id": file_id,
+            "label": label,
+            "generator": ids.get("generator") or row.get("gen_model"),
+            "gen_model": row.get("gen_model"),
+            "split": ids.get("split"),
+            "speaker_id": ids.get("speaker_id"),
+            "utterance_id": ids.get("utterance_id"),
+            "mix_id": parse_mix_id(mixed_raw),
+            "text_id": row.get("text_id"),
+            "duration": duration,
+            "spoof_segment_times": spoof_raw,
+            "gt_intervals": intervals,
+            "video": _relpath(project_root, video),
+            "audio": audio,
+        })
+    return stimuli
+
+
+def compile_affect_images(project_root, affect_excel, warnings):
+    images = []
+    for n, row in enumerate(_read_rows(affect_excel, AFFECT_COLUMNS), start=2):
+        img_path, quadrant = row["image_file"], row["quadrant"]
+        if not img_path or quadrant is None:
+            continue
+        img_path = str(img_path).replace("\\", "/")
+        if not os.path.exists(os.path.join(project_root, img_path)):
+            warnings.append(f"row {n}: affect image {img_path} not found, skipped")
+            continue
+        images.append({
+            "path": img_path,
+            "quadrant": str(quadrant).strip(),
+            "emotion": row.get("emotion"),
+        })
+    return images
+
+
+def catalog_version(stimuli, affect_images):
+    """
+    Hash of the compiled content, so rebuilding unchanged sheets yields the same version.
+    """
+    content = json.dumps({"stimuli": stimuli, "affect_images": affect_images}, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()[:12]
+
+
+def build_catalog(project_root, stimuli_excel, affect_excel):
+    """
+    Compile both spreadsheets into a catalog dict, versioned by catalog_version.
+    """
+    warnings = []
+    stimuli = compile_stimuli(project_root, stimuli_excel, warnings)
+    affect_images = compile_affect_images(project_root, affect_excel, warnings)
+
+    return {
+        "schema_version": CATALOG_SCHEMA_VERSION,
+        "version": catalog_version(stimuli, affect_images),
+        "built_at": datetime.datetime.now().isoformat(),
+        "sources": {
+            "stimuli": _relpath(project_root, stimuli_excel),
+            "affect": _relpath(project_root, affect_excel),
+        },
+        "stimuli": stimuli,
+        "affect_images": affect_images,
+        "warnings": warnings,
+    }
+
+
+def write_catalog(catalog, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(catalog, f, indent=1)
+    os.replace(tmp, path)
+
+
+def load_catalog(path=None):
+    """
+    Load the compiled catalog, or return None if it has not been built.
+    """
+    if path is None:
+        from config import CATALOG_FILE
+        path = CATALOG_FILE
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        catalog = json.load(f)
+    if catalog.get("schema_version") != CATALOG_SCHEMA_VERSION:
+        raise ValueError(
+            f"Catalog schema {catalog.get('schema_version')} != {CATALOG_SCHEMA_VERSION}, rebuild with `python catalog.py`"
+        )
+    return catalog
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import PROJECT_DIR, STIMULI_EXCEL, AFFECT_EXCEL, CATALOG_FILE
+
+    parser = argparse.ArgumentParser(description="Compile stimulus spreadsheets into the app catalog.")
+    parser.add_argument("--stimuli", default=STIMULI_EXCEL)
+    parser.add_argument("--affect", default=AFFECT_EXCEL)
+    parser.add_argument("--out", default=CATALOG_FILE)
+    args = parser.parse_args()
+
+    catalog = build_catalog(PROJECT_DIR, args.stimuli, args.affect)
+    write_catalog(catalog, args.out)
+    for w in catalog["warnings"]:
+        print(f"[WARN] {w}")
+    print(f"Wrote {args.out}: {len(catalog['stimuli'])} stimuli, "
+          f"{len(catalog['affect_images'])} affect images, version {catalog['version']}")
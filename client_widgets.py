@@ -0,0 +1,44 @@
+# client_widgets.py
+import os, time
+import streamlit as st
+import streamlit.components.v1 as components
+from config import PROJECT_DIR
+
+_hotkey_recorder = components.declare_component(
+    "hotkey_recorder", path=os.path.join(PROJECT_DIR, "frontend", "hotkeys")
+)
+
+_likert_grid = components.declare_component(
+    "likert_grid", path=os.path.join(PROJECT_DIR, "frontend", "likert")
+)
+
+def hotkey_recorder(key, batch_size=5, flush_ms=4000, submit_label=None):
+    """
+    Records flags and segment bounds at the trial video's current time via hotkeys.
+    Pressing the submit_label button sends what is still buffered, closing an open segment.
+    Returns the last batch sent by the browser: {"batch_id", "sent_ts", "events"}.
+    """
+    return _hotkey_recorder(batch_size=batch_size, flush_ms=flush_ms, submit_label=submit_label, key=key, default=None)
+
+def likert_grid(items, key, submit_label, columns=2):
+    """
+    Renders the evaluation questions ({"id", "question", "options", "value"}) in the given order.
+    Answer changes are kept in the browser and returned as one batch once the
+    submit_label button is pressed: {"batch_id", "sent_ts", "events"}.
+    """
+    return _likert_grid(items=items, columns=columns, submit_label=submit_label, key=key, default=None)
+
+def take_client_batch(batch, seen_key):
+    """
+    Returns (events, offset) for a batch that has not been processed yet, else ([], 0.0).
+    A component keeps returning its last value on every rerun, so batches are
+    de-duplicated by id. offset maps client timestamps onto the server wall clock.
+    """
+    if not batch or not batch.get("batch_id"):
+        return [], 0.0
+    seen = st.session_state.setdefault(seen_key, [])
+    if batch["batch_id"] in seen:
+        return [], 0.0
+    seen.append(batch["batch_id"])
+    offset = time.time() - float(batch.get("sent_ts") or time.time())
+    return batch.get("events", []), offset
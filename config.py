@@ -1,6 +1,7 @@
 # config.py
 import os
 import streamlit as st
+from theme import THEME_CSS
 
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 RESULTS_DIR = os.path.join(PROJECT_DIR, "results")
@@ -8,6 +9,59 @@ os.makedirs(RESULTS_DIR, exist_ok=True)
 
 AFFECT_EXCEL = os.path.join(PROJECT_DIR, "assets/affect_dataset.xlsx")
 STIMULI_EXCEL = os.path.join(PROJECT_DIR, "assets/llama_subset.xlsx")
+CATALOG_FILE = os.path.join(PROJECT_DIR, "assets/stimulus_catalog.json")
+HEATMAP_DIR = os.path.join(PROJECT_DIR, "heatmaps")
+FEATURE_CACHE_DIR = os.path.join(PROJECT_DIR, "feature_cache")
+
+# Shared participant state: "file" (participant_* files in RESULTS_DIR), "sqlite" or "redis".
+# STATE_BACKEND_URL is the directory, database path or redis:// URL (defaults per backend in backend.py)
+STATE_BACKEND = os.environ.get("SPOOF_STATE_BACKEND", "file")
+STATE_BACKEND_URL = os.environ.get("SPOOF_STATE_URL")
+
+# Journal records per participant before they are folded into a snapshot
+JOURNAL_COMPACT_EVERY = 50
+
+# Soft per-session st.session_state budget; completed trials are evicted after saving
+SESSION_MEMORY_BUDGET_BYTES = 2 * 1024 * 1024
+
+# Client-side hotkey events are sent to the server in batches of this size, or after this idle time
+HOTKEY_BATCH_SIZE = 5
+HOTKEY_FLUSH_MS = 4000
+
+# Admin dashboard (?admin=<st.secrets["admin"]["token"]>): active sessions without progress for
+# this long count as abandoned; the page refreshes itself every ADMIN_REFRESH_S seconds
+ADMIN_ABANDONED_AFTER_S = 30 * 60
+ADMIN_REFRESH_S = 15
+
+# Process-wide memory for cut "Play selection" previews (preview.py)
+PREVIEW_CACHE_BYTES = 32 * 1024 * 1024
+
+# Adaptive scheduling (scheduler.py): pick each trial's stimulus by the uncertainty of its accuracy
+# in the shared results index instead of a random subset of the catalog
+ADAPTIVE_SCHEDULING = os.environ.get("SPOOF_ADAPTIVE", "0") == "1"
+
+# update_slider actions on the same slider closer together than this are logged as one run
+ACTION_LOG_COALESCE_S = 1.0
+
+# Admission control (admission.py): browser sessions admitted at once per replica (0 = no limit),
+# idle time after which a slot is freed, and how often the waiting room polls for a free slot
+ADMISSION_MAX_ACTIVE = int(os.environ.get("SPOOF_MAX_ACTIVE", "40"))
+ADMISSION_IDLE_S = 15 * 60
+ADMISSION_POLL_S = 5
+
+# Background janitor (janitor.py): sweep interval and how long idle bounces and abandoned sessions,
+# and bundles already uploaded, are kept in RESULTS_DIR
+JANITOR_ENABLED = os.environ.get("SPOOF_JANITOR", "1") == "1"
+JANITOR_INTERVAL_S = 15 * 60
+JANITOR_BOUNCE_TTL_S = 2 * 3600
+JANITOR_ABANDONED_TTL_S = 48 * 3600
+JANITOR_UPLOADED_TTL_S = 7 * 24 * 3600
+
+# Opt-in tracemalloc profiling of each show_trial / show_debrief rerun
+ALLOC_PROFILE_ENABLED = os.environ.get("SPOOF_ALLOC_PROFILE", "0") == "1"
+ALLOC_PROFILE_DIR = os.environ.get("SPOOF_ALLOC_PROFILE_DIR", os.path.join(PROJECT_DIR, "alloc_profiles"))
+ALLOC_PROFILE_FRAMES = 1
+ALLOC_PROFILE_TOP = 25
 
 INSTRUCTIONS = {
     "new_tech": """
@@ -124,4 +178,5 @@ CARD_CSS = """
 def apply_styling():
     st.set_page_config(page_title="Moderator Task", layout="wide")
     st.markdown(BASE_CSS, unsafe_allow_html=True)
-    st.markdown(CARD_CSS, unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown(CARD_CSS, unsafe_allow_html=True)
+    st.markdown(THEME_CSS, unsafe_allow_html=True)
\ No newline at end of file
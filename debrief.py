@@ -1,10 +1,10 @@
 # debrief.py
 import streamlit as st
-from streamlit_extras.stylable_container import stylable_container
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+from theme import themed
 import json, os, datetime, time
-from storage import Storage, save_to_github
+from storage import Storage, save_to_github, save_file_to_github
+from archive import write_bundle, bundle_path, read_bundle
+from config import RESULTS_DIR
 from helpers import htmlify
 
 def clear_session_for_next_participant():
@@ -37,29 +37,13 @@ def show_debrief():
     if not storage:
         storage = st.session_state.storage = Storage(st.session_state.participant_id)
 
-    all_trials = storage.load_all_trials()
-    all_summary = []
-
-    for trial_idx, data in all_trials.items():
-        trial = st.session_state.all_trials[trial_idx]
-        participant_segments = data.get("segments", [])
-        participant_flags = data.get("flags", [])
-        participant_responses = data.get("responses", {})
-
-        gt_type = data.get('gt_label', '').lower()  
-        gt_intervals = data.get('gt_segments', [])  
-        duration = float(trial.get("duration", 60.0))
-
-        summary = {
-            "trial_number": trial_idx+1,
-            "duration": duration,
-            "gt_type": gt_type,
-            "gt_intervals": gt_intervals,
-            "participant_segments": participant_segments,
-            "participant_flags": participant_flags,
-            "participant_responses": participant_responses
-        }
-        all_summary.append(summary)
+    # Rows were scored as each trial was saved; nothing is re-read or re-scored here
+    all_summary, scores = storage.journal.aggregate()
+    finished = storage.session_data.get("completion_status")
+    if finished and not all_summary and os.path.exists(bundle_path(RESULTS_DIR, storage.participant_id)):
+        # Reloaded after submitting: the journal went into the bundle, its aggregate holds the rows
+        aggregate = read_bundle(bundle_path(RESULTS_DIR, storage.participant_id))["aggregate"] or {}
+        all_summary, scores = aggregate.get("summary", []), aggregate.get("scores", scores)
 
     submit_col, debrief_col = st.columns([0.4, 0.6])
     with submit_col:
@@ -85,7 +69,7 @@ def show_debrief():
             """,
             unsafe_allow_html=True)
         
-        prolific_id_saved = st.session_state.get("prolific_id_saved", False)
+        prolific_id_saved = st.session_state.get("prolific_id_saved", False) or bool(finished)
         
         if not prolific_id_saved:
             st.markdown(
@@ -99,9 +83,12 @@ def show_debrief():
                 if prolific_input and prolific_input.strip():
                     prolific_id = prolific_input.strip()
                     
+                    status = "emergency_exit" if st.session_state.get("emergency_quit") else "completed"
                     st.session_state.prolific_id = prolific_id
                     st.session_state.storage.prolific_id = prolific_id
                     st.session_state.storage.session_data["prolific_id"] = prolific_id
+                    # Kept after bundling, so a reload comes back to this page instead of a new enrollment
+                    st.session_state.storage.session_data["completion_status"] = status
                     st.session_state.storage.save_session_data()
                     
                     st.success(f"Prolific ID saved: {prolific_id}")
@@ -114,10 +101,11 @@ def show_debrief():
                         "instruction_version": st.session_state.instruction_version,
                         "valence_condition": st.session_state.valence_condition,
                         "summary": all_summary,
+                        "scores": scores,
                         "total_trials": len(all_summary),
                         "created_at": st.session_state.storage.session_data.get("created_at"),
                         "completed_at": datetime.datetime.now().isoformat(),
-                        "completion_status": "completed",
+                        "completion_status": status,
                         "prolific_validated": True
                     }
 
@@ -128,6 +116,7 @@ def show_debrief():
                     github_path = f"results/{os.path.basename(aggregate_out)}"
                     try:
                         save_to_github(aggregate_metadata, github_path)
+                        storage.note_upload(github_path, ok=True)
                         print(f"Uploaded aggregate to GitHub: {github_path}")
                         
                         try:
@@ -138,8 +127,25 @@ def show_debrief():
 
                     except Exception as e:
                         print(f"GitHub upload failed: {e}")
+                        storage.note_upload(github_path, ok=False)
                         st.warning("Results saved locally but cloud upload failed.")
 
+                    bundle_github_path = f"results/bundles/{os.path.basename(bundle_path(RESULTS_DIR, st.session_state.participant_id))}"
+                    try:
+                        bundle_out = write_bundle(RESULTS_DIR, st.session_state.participant_id,
+                                                  aggregate=aggregate_metadata, remove_sources=True, keep_session=True,
+                                                  session=storage.session_data,
+                                                  trials=list(storage.load_all_trials().values()))
+                        print(f"Archived participant bundle: {bundle_out}")
+                        save_file_to_github(bundle_out, bundle_github_path)
+                        storage.note_upload(bundle_github_path, ok=True)
+                    except Exception as e:
+                        print(f"Bundle archival failed: {e}")
+                        storage.note_upload(bundle_github_path, ok=False)
+
+                    storage.update_progress(status=status, completed_at=aggregate_metadata["completed_at"],
+                                            prolific_id=prolific_id)
+
                     st.session_state.prolific_id_saved = True
                     st.rerun()
                     
@@ -147,7 +153,7 @@ def show_debrief():
                     st.error("Please enter a valid Prolific ID")
         
         else:
-            st.success(f"Prolific ID confirmed: {st.session_state.prolific_id}")
+            st.success(f"Prolific ID confirmed: {storage.session_data.get('prolific_id', st.session_state.prolific_id)}")
             st.markdown("---")
             st.markdown("""
             ### Thank you for completing the study!
@@ -155,28 +161,7 @@ def show_debrief():
             Click the button below to end the session.
             """)
             
-            with stylable_container(
-                "exit_button",
-                css_styles="""
-                button {
-                    background-color: #73FFC2 !important;
-                    color: white !important;
-                    font-size: 18px !important;
-                    font-weight: bold !important;
-                    border-radius: 8px !important;
-                    padding: 12px 24px !important;
-                    border: none !important;
-                    cursor: pointer;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                    width: 100%;
-                }
-                button:hover {
-                    background-color: #45a049 !important;
-                    box-shadow: 0 6px 8px rgba(0,0,0,0.15);
-                    transform: translateY(-2px);
-                }
-                """
-            ):
+            with themed("exit"):
                 if st.button("Complete & Exit Study", key="exit_button"):
                     st.info("Success! Someone will review your submission soon.")
                     time.sleep(1)
@@ -184,52 +169,16 @@ def show_debrief():
                     st.rerun()
 
     with debrief_col:
-        for trial_idx, data in all_trials.items():
-            trial = st.session_state.all_trials[trial_idx]
-            participant_segments = data.get("segments", [])
-            participant_flags = data.get("flags", [])
-            participant_responses = data.get("responses", {})
+        for summary in all_summary:
+            participant_segments = summary["participant_segments"]
+            participant_flags = summary["participant_flags"]
+            participant_responses = summary["participant_responses"]
+            gt_type = summary["gt_type"]
+            gt_intervals = summary["gt_intervals"]
+            duration = float(summary["duration"])
+            correct, missed_gt, extra_segments = summary["correct"], summary["missed_gt"], summary["extra_segments"]
 
-            gt_type = data.get('gt_label', '').lower()  
-            gt_intervals = data.get('gt_segments', [])  
-            duration = float(trial.get("duration", 60.0))
-        
-            st.markdown(f"## Trial {trial_idx+1}")
-        
-            # Correctness check
-            participant_segments_list = [(seg["start"], seg["end"]) for seg in participant_segments]
-            correct = False
-            missed_gt = []
-            extra_segments = []
-
-            if gt_type == "bonafide":
-                if not participant_segments_list:
-                    correct = True
-                else:
-                    extra_segments = participant_segments_list
-                    
-            elif gt_type == "full_spoof":
-                if participant_segments_list:
-                    correct = True
-                
-            elif gt_type == "partial_spoof":
-                correct = True
-                if gt_intervals:
-                    for gt_start, gt_end in gt_intervals:
-                        overlap_with_seg = any(max(s, gt_start) < min(e, gt_end) for s, e in participant_segments_list)
-                        overlap_with_flag = any(gt_start <= f["time"] <= gt_end for f in participant_flags)
-                        if not (overlap_with_seg or overlap_with_flag):
-                            missed_gt.append((gt_start, gt_end))
-                            correct = False
-
-                for s, e in participant_segments_list:
-                    outside = all(e <= gt_start or s >= gt_end for gt_start, gt_end in gt_intervals)
-                    if outside:
-                        extra_segments.append((s, e))
-
-                if not participant_segments_list and not participant_flags:
-                    correct = False
-                    missed_gt = gt_intervals
+            st.markdown(f"## Trial {summary['trial_number']}")
 
             st.markdown(f"**Ground truth:** {gt_type.upper()}")
             st.markdown(f"**Your detection was:** {'CORRECT' if correct else 'INCORRECT'}")
@@ -242,6 +191,9 @@ def show_debrief():
             st.markdown("---")
 
             # Visualization
+            import matplotlib.pyplot as plt
+            from matplotlib.patches import Rectangle
+
             fig, ax = plt.subplots(figsize=(10, 1.2))
             ax.set_xlim(0, duration)  
             ax.set_ylim(0, 1)
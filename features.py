@@ -0,0 +1,196 @@
+# features.py
+"""
+Framewise acoustic features of the stimulus audio, cached on disk.
+
+For every WAV, frames of FRAME_LENGTH samples every HOP_LENGTH samples are
+windowed and transformed with a real FFT, giving per frame: RMS energy,
+spectral centroid (Hz), spectral flux and zero-crossing rate. Files are
+processed across a process pool and each result is saved as a .npy array
+named by the SHA-256 of the audio, so it can be opened memory-mapped and is
+only recomputed when the audio (or the frame parameters) change.
+
+    python features.py [dir_or_wav ...] [--workers N]   # default: assets/stage3_mix
+"""
+import os, json, glob, wave, hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+FEATURES = ("rms", "centroid", "flux", "zcr")
+FRAME_LENGTH = 512  # 32 ms at 16 kHz
+HOP_LENGTH = 160    # 10 ms at 16 kHz
+INDEX_FILE = "index.json"
+
+def _params():
+    return {"frame_length": FRAME_LENGTH, "hop_length": HOP_LENGTH, "features": list(FEATURES)}
+
+def file_hash(path, chunk=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_wav(path):
+    """
+    Returns (mono float32 samples in [-1, 1], sample rate).
+    """
+    with wave.open(path, "rb") as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        samples = np.where(ints >= 1 << 23, ints - (1 << 24), ints).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported sample width {width} in {path}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+def frame_features(samples, rate, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Feature matrix (frames, len(FEATURES)) as float32.
+    """
+    if len(samples) < frame_length:
+        samples = np.pad(samples, (0, frame_length - len(samples)))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop_length]
+
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_length - 1)
+
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_length).astype(np.float32), axis=1))
+    freqs = np.fft.rfftfreq(frame_length, 1 / rate)
+    power = spectrum.sum(axis=1)
+    centroid = np.divide(spectrum @ freqs, power, out=np.zeros_like(power), where=power > 0)
+    # Flux: L2 distance between consecutive magnitude spectra, each normalized to unit sum
+    norm = spectrum / np.maximum(power, 1e-12)[:, None]
+    flux = np.zeros(len(frames), dtype=np.float64)
+    flux[1:] = np.sqrt(np.sum(np.diff(norm, axis=0) ** 2, axis=1))
+
+    return np.stack([rms, centroid, flux, zcr], axis=1).astype(np.float32)
+
+def frame_times(n_frames, rate, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Centre time (s) of each frame.
+    """
+    return (np.arange(n_frames) * hop_length + frame_length / 2) / rate
+
+def _extract(job):
+    path, digest, out_file = job
+    samples, rate = read_wav(path)
+    feats = frame_features(samples, rate)
+    tmp = f"{out_file}.tmp.npy"
+    np.save(tmp, feats)
+    os.replace(tmp, out_file)
+    return digest, {"rate": rate, "frames": len(feats), "duration": len(samples) / rate}
+
+def load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"params": _params(), "features": {}, "files": {}}
+    with open(path, "r") as f:
+        index = json.load(f)
+    if index.get("params") != _params():
+        print("[WARN] Feature parameters changed, recomputing all features")
+        return {"params": _params(), "features": {}, "files": {}}
+    return index
+
+def _save_index(cache_dir, index):
+    path = os.path.join(cache_dir, INDEX_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def _hash_cached(path, index):
+    """
+    Hash of path, reusing the indexed one while size and mtime are unchanged.
+    """
+    stat = os.stat(path)
+    known = index["files"].get(os.path.abspath(path))
+    if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+        return known["sha256"]
+    digest = file_hash(path)
+    index["files"][os.path.abspath(path)] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+    return digest
+
+def wav_files(sources):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths += sorted(glob.glob(os.path.join(source, "*.wav")))
+        else:
+            paths.append(source)
+    return paths
+
+def extract_all(paths, cache_dir, workers=None):
+    """
+    Computes features for every WAV not cached yet. Returns {path: sha256}.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_index(cache_dir)
+    hashes, jobs = {}, {}
+    for path in paths:
+        digest = _hash_cached(path, index)
+        hashes[path] = digest
+        out_file = os.path.join(cache_dir, f"{digest}.npy")
+        if digest not in index["features"] or not os.path.exists(out_file):
+            jobs.setdefault(digest, (path, digest, out_file))
+
+    if workers == 1 or len(jobs) <= 1:
+        results = [_extract(job) for job in jobs.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_extract, jobs.values()))
+    for digest, meta in results:
+        index["features"][digest] = dict(meta, source=os.path.basename(jobs[digest][0]))
+    _save_index(cache_dir, index)
+    print(f"{len(jobs)} computed, {len(hashes) - len(jobs)} cached")
+    return hashes
+
+def load_features(path, cache_dir):
+    """
+    Memory-mapped feature matrix and frame times of a cached WAV, or None if it is not cached.
+    """
+    index = load_index(cache_dir)
+    digest = _hash_cached(path, index)
+    meta = index["features"].get(digest)
+    out_file = os.path.join(cache_dir, f"{digest}.npy")
+    if meta is None or not os.path.exists(out_file):
+        return None
+    feats = np.load(out_file, mmap_mode="r")
+    return {"features": feats, "times": frame_times(len(feats), meta["rate"]), "columns": FEATURES, **meta}
+
+def bin_features(cached, bin_s, n_bins=None):
+    """
+    Averages the frames of load_features output into bins of bin_s seconds,
+    to line up with the per-bin agreement of heatmaps.agreement.
+    """
+    bins = np.floor(cached["times"] / bin_s).astype(int)
+    n_bins = n_bins or int(bins.max()) + 1
+    keep = bins < n_bins
+    counts = np.bincount(bins[keep], minlength=n_bins)
+    sums = np.stack([np.bincount(bins[keep], weights=cached["features"][keep, i], minlength=n_bins)
+                     for i in range(len(FEATURES))], axis=1)
+    return sums / np.maximum(counts, 1)[:, None]
+
+if __name__ == "__main__":
+    import argparse, time
+    from config import PROJECT_DIR, FEATURE_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Compute and cache framewise acoustic features.")
+    parser.add_argument("sources", nargs="*", default=[os.path.join(PROJECT_DIR, "assets/stage3_mix")])
+    parser.add_argument("--cache-dir", default=FEATURE_CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = wav_files(args.sources)
+    extract_all(paths, args.cache_dir, args.workers)
+    print(f"{len(paths)} files in {time.perf_counter() - start:.2f}s -> {args.cache_dir}")
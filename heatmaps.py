@@ -0,0 +1,192 @@
+# heatmaps.py
+"""
+Per-stimulus temporal agreement from all participants' segments and flags.
+
+Each stimulus timeline is cut into fixed bins. For every saved trial the bins
+covered by a segment and the bins holding a flag are marked (a participant
+counts at most once per bin), and the counts are accumulated per stimulus.
+Agreement is count / participants. State is kept on disk so a re-run only bins
+trial records it has not seen yet, and only changed stimuli are re-plotted.
+
+    python heatmaps.py [--bin 0.1] [--rebuild]
+"""
+import os, json
+import numpy as np
+
+LAYERS = ("segments", "flags", "marked")
+
+def load_state(out_dir, bin_s):
+    """
+    Returns (processed record keys, processed bundle names, {stimulus_id: {"n", "duration", layers...}}).
+    State built with a different bin width is discarded.
+    """
+    state_file = os.path.join(out_dir, "state.json")
+    counts_file = os.path.join(out_dir, "counts.npz")
+    if not (os.path.exists(state_file) and os.path.exists(counts_file)):
+        return set(), set(), {}
+    with open(state_file, "r") as f:
+        meta = json.load(f)
+    if meta.get("bin_s") != bin_s:
+        print(f"[WARN] Bin width changed ({meta.get('bin_s')} -> {bin_s}), rebuilding")
+        return set(), set(), {}
+    stimuli = {}
+    with np.load(counts_file) as arrays:
+        for sid, info in meta["stimuli"].items():
+            stimuli[sid] = dict(info, **{layer: arrays[f"{sid}::{layer}"] for layer in LAYERS})
+    return set(meta["processed"]), set(meta.get("bundles", [])), stimuli
+
+def save_state(out_dir, bin_s, processed, bundles, stimuli):
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {f"{sid}::{layer}": s[layer] for sid, s in stimuli.items() for layer in LAYERS}
+    np.savez_compressed(os.path.join(out_dir, "counts.tmp.npz"), **arrays)
+    os.replace(os.path.join(out_dir, "counts.tmp.npz"), os.path.join(out_dir, "counts.npz"))
+    meta = {
+        "bin_s": bin_s,
+        "processed": sorted(processed),
+        "bundles": sorted(bundles),
+        "stimuli": {sid: {"n": s["n"], "duration": s["duration"], "gt_intervals": s["gt_intervals"]}
+                    for sid, s in stimuli.items()},
+    }
+    with open(os.path.join(out_dir, "state.json"), "w") as f:
+        json.dump(meta, f)
+
+def bin_count(duration, bin_s):
+    return max(1, int(np.ceil(duration / bin_s)))
+
+def bin_records(records, duration, bin_s):
+    """
+    Bins a stimulus' trial records. Returns per-bin counts of participants whose
+    segments cover, flags fall in, or either marks each bin.
+    """
+    n_bins = bin_count(duration, bin_s)
+    n = len(records)
+
+    seg_rec, seg_start, seg_end = [], [], []
+    flag_rec, flag_t = [], []
+    for r, rec in enumerate(records):
+        for s in rec.get("segments") or []:
+            seg_rec.append(r); seg_start.append(s["start"]); seg_end.append(s["end"])
+        for f in rec.get("flags") or []:
+            flag_rec.append(r); flag_t.append(f["time"])
+
+    to_bin = lambda t: np.clip(np.floor(np.asarray(t, dtype=float) / bin_s).astype(int), 0, n_bins - 1)
+
+    # Difference array per record: +1 at a segment's first bin, -1 after its last one
+    diff = np.zeros((n, n_bins + 1), dtype=np.int32)
+    if seg_rec:
+        first = to_bin(seg_start)
+        # A segment ending exactly on a bin edge does not cover the next bin
+        last = np.maximum(first, np.clip(np.ceil(np.asarray(seg_end, dtype=float) / bin_s).astype(int) - 1, 0, n_bins - 1))
+        np.add.at(diff, (np.asarray(seg_rec), first), 1)
+        np.add.at(diff, (np.asarray(seg_rec), last + 1), -1)
+    covered = np.cumsum(diff[:, :-1], axis=1) > 0
+
+    flagged = np.zeros((n, n_bins), dtype=bool)
+    if flag_rec:
+        flagged[np.asarray(flag_rec), to_bin(flag_t)] = True
+
+    return {
+        "segments": covered.sum(axis=0),
+        "flags": flagged.sum(axis=0),
+        "marked": (covered | flagged).sum(axis=0),
+    }
+
+def render(stimulus_id, s, bin_s, out_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    n = max(s["n"], 1)
+    edges = np.arange(len(s["marked"]) + 1) * bin_s
+    fig, (ax_line, ax_heat) = plt.subplots(2, 1, figsize=(10, 3), sharex=True,
+                                           gridspec_kw={"height_ratios": [3, 1]})
+    for gt_start, gt_end in s["gt_intervals"]:
+        ax_line.axvspan(gt_start, gt_end, color=(1, 0, 0, 0.15), lw=0)
+    ax_line.stairs(s["marked"] / n, edges, label="segment or flag", color="black")
+    ax_line.stairs(s["segments"] / n, edges, label="segment", color=(0.0, 0.45, 0.8))
+    ax_line.stairs(s["flags"] / n, edges, label="flag", color="orange")
+    ax_line.set_ylim(0, 1)
+    ax_line.set_ylabel("agreement")
+    ax_line.set_title(f"{stimulus_id} (n={s['n']}, red = GT spoofed)", fontsize=9)
+    ax_line.legend(fontsize=7, loc="upper right")
+    ax_heat.imshow((s["marked"] / n)[None, :], aspect="auto", cmap="magma", vmin=0, vmax=1,
+                   extent=[0, edges[-1], 0, 1])
+    ax_heat.set_yticks([])
+    ax_heat.set_xlabel("time (s)")
+    fig.savefig(os.path.join(out_dir, f"{stimulus_id}.png"), dpi=100, bbox_inches="tight")
+    plt.close(fig)
+
+def update(results_dir, out_dir, bin_s=0.1, rebuild=False, plot=True):
+    """
+    Bins all trial records not processed yet, saves the state and re-plots changed stimuli.
+    Returns the ids of the updated stimuli.
+    """
+    from archive import iter_result_records, BUNDLE_SUFFIX
+    from catalog import load_catalog
+
+    catalog = load_catalog() or {"stimuli": []}
+    by_id = {s["stimulus_id"]: s for s in catalog["stimuli"]}
+    by_video = {os.path.basename(s["video"]): s for s in catalog["stimuli"]}
+
+    processed, bundles, stimuli = (set(), set(), {}) if rebuild else load_state(out_dir, bin_s)
+    # A changed catalog duration (e.g. verify_media.py --write) changes a stimulus' bins. Record keys do not
+    # say which stimulus they belong to, so everything is re-binned rather than losing earlier participants
+    resized = sorted(sid for sid, s in stimuli.items()
+                     if sid in by_id and len(s["marked"]) != bin_count(by_id[sid]["duration"], bin_s))
+    if resized:
+        print(f"[WARN] Duration changed in the catalog for {len(resized)} stimuli ({', '.join(resized[:3])}), rebuilding")
+        rebuild = True
+        processed, bundles, stimuli = set(), set(), {}
+    # Bundles are immutable once written, so a bundle seen before can be skipped whole
+    current_bundles = {f for f in os.listdir(results_dir) if f.endswith(BUNDLE_SUFFIX)}
+    pending = {}
+    for rec in iter_result_records(results_dir, skip_keys=processed, skip_bundles=bundles):
+        key = f"{rec.get('participant_id')}:{rec.get('trial_index')}"
+        if key in processed:
+            continue
+        stim = by_id.get(rec.get("stimulus_id")) or by_video.get(rec.get("audio"))
+        if stim is None:
+            continue
+        pending.setdefault(stim["stimulus_id"], []).append(rec)
+        processed.add(key)
+
+    for sid, records in pending.items():
+        stim = by_id[sid]
+        binned = bin_records(records, stim["duration"], bin_s)
+        s = stimuli.get(sid)
+        if s is None:
+            s = stimuli[sid] = {"n": 0, "duration": stim["duration"], "gt_intervals": stim["gt_intervals"],
+                                **{layer: np.zeros_like(binned[layer]) for layer in LAYERS}}
+        s["n"] += len(records)
+        for layer in LAYERS:
+            s[layer] = s[layer] + binned[layer]
+
+    if pending or rebuild or current_bundles - bundles:
+        save_state(out_dir, bin_s, processed, bundles | current_bundles, stimuli)
+    if plot:
+        for sid in (stimuli if rebuild else pending):
+            render(sid, stimuli[sid], bin_s, out_dir)
+    return sorted(pending)
+
+def agreement(out_dir, stimulus_id, bin_s=0.1):
+    """
+    Per-bin agreement arrays for one stimulus, e.g. for joins with acoustic features.
+    """
+    _, _, stimuli = load_state(out_dir, bin_s)
+    s = stimuli[stimulus_id]
+    return {layer: s[layer] / max(s["n"], 1) for layer in LAYERS}
+
+if __name__ == "__main__":
+    import argparse
+    from config import RESULTS_DIR, HEATMAP_DIR
+
+    parser = argparse.ArgumentParser(description="Update per-stimulus agreement heatmaps.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--out", default=HEATMAP_DIR)
+    parser.add_argument("--bin", type=float, default=0.1, help="bin width in seconds")
+    parser.add_argument("--rebuild", action="store_true", help="ignore saved state and re-bin everything")
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args()
+
+    updated = update(args.results_dir, args.out, args.bin, args.rebuild, plot=not args.no_plot)
+    print(f"Updated {len(updated)} stimuli in {args.out}")
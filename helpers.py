@@ -1,9 +1,7 @@
 import streamlit as st
-import re, os, datetime
-try:
-    from pylsl import StreamInfo, StreamOutlet, local_clock
-except (RuntimeError, ImportError):
-    print("Error. LSL not supported in cloud deployment.")
+import re, os, datetime, uuid
+
+_lsl_unavailable = False
 
 def datetime_converter(obj):
     if isinstance(obj, datetime.datetime):
@@ -11,16 +9,31 @@ def datetime_converter(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 def init_lsl():
-    if "lsl_outlet" not in st.session_state:
-        info = StreamInfo(
-            name="StreamlitEvents",
-            type="Markers",
-            channel_count=1,
-            nominal_srate=0,            
-            channel_format="string",
-            source_id="streamlit_ui_001"
-        )
-        st.session_state.lsl_outlet = StreamOutlet(info)
+    """
+    Creates the session's LSL marker outlet. pylsl is imported here, not at module
+    load, so the app starts without it; a failed import is not retried.
+    """
+    global _lsl_unavailable
+    if "lsl_outlet" in st.session_state:
+        return
+    if _lsl_unavailable:
+        st.session_state.lsl_outlet = None
+        return
+    try:
+        from pylsl import StreamInfo, StreamOutlet
+    except (RuntimeError, ImportError):
+        _lsl_unavailable = True
+        st.session_state.lsl_outlet = None
+        raise
+    info = StreamInfo(
+        name="StreamlitEvents",
+        type="Markers",
+        channel_count=1,
+        nominal_srate=0,            
+        channel_format="string",
+        source_id="streamlit_ui_001"
+    )
+    st.session_state.lsl_outlet = StreamOutlet(info)
 
 def htmlify(text):
     """
@@ -46,15 +59,12 @@ def compute_answer_validity(trial_idx, required_wait):
     """
     start_ts_wall = st.session_state.get(f"trial_{trial_idx}_start_ts")
 
-    action_log = st.session_state.action_log_by_trial.get(trial_idx, [])
-    first_ts_wall = None
+    from action_log import ActionLog
 
-    for a in action_log:
-        if a.get("action") in ["add_segment", "add_flag", "eval_response"]:
-            if a.get("ts_wall") is not None:
-                t = a["ts_wall"]
-                if first_ts_wall is None or t < first_ts_wall:
-                    first_ts_wall = t
+    action_log = st.session_state.action_log_by_trial.get(trial_idx) or ActionLog()
+    if not isinstance(action_log, ActionLog):
+        action_log = ActionLog.from_records(action_log)
+    first_ts_wall = action_log.first_ts(["add_segment", "add_flag", "edit_annotations", "eval_response"])
 
     if start_ts_wall and first_ts_wall:
         waited = first_ts_wall - start_ts_wall
@@ -96,6 +106,45 @@ def parse_spoof_intervals(raw):
         intervals.append((start, end))
     return intervals
 
+def _row_values(row, fields, duration):
+    """
+    Clamped numeric values of an annotation table row, or None if a cell is empty.
+    """
+    values = {}
+    for f in fields:
+        v = row.get(f)
+        if v is None or v != v:  # empty cells come back as None/NaN
+            return None
+        values[f] = min(max(float(v), 0.0), duration)
+    if "start" in values and values["end"] < values["start"]:
+        values["start"], values["end"] = values["end"], values["start"]
+    return values
+
+def diff_annotations(current, edited_rows, fields, duration):
+    """
+    Applies the rows of the annotation table to the current annotations.
+    Returns the new list and a diff of added, removed and changed annotations.
+    Rows with empty cells are ignored.
+    """
+    by_id = {a["id"]: a for a in current}
+    new, added, changed, kept = [], [], [], set()
+    for row in edited_rows:
+        values = _row_values(row, fields, duration)
+        if values is None:
+            continue
+        old = by_id.get(row.get("id"))
+        if old is None or old["id"] in kept:
+            annotation = {"id": str(uuid.uuid4()), **values, "timestamp": datetime.datetime.now().isoformat()}
+            added.append(annotation)
+        else:
+            kept.add(old["id"])
+            annotation = dict(old, **values)
+            if any(old[f] != annotation[f] for f in fields):
+                changed.append({"id": old["id"], "from": {f: old[f] for f in fields}, "to": values})
+        new.append(annotation)
+    removed = [a["id"] for a in current if a["id"] not in kept]
+    return new, {"added": added, "removed": removed, "changed": changed}
+
 def trial_is_correct(gt_type, gt_intervals, participant_segments, participant_flags):
     """
     Determines if a participant correctly marked a trial.
@@ -129,6 +178,65 @@ def trial_is_correct(gt_type, gt_intervals, participant_segments, participant_fl
 
     return False
 
+def score_trial(gt_type, gt_intervals, participant_segments, participant_flags):
+    """
+    Scores a trial as shown on the debrief: correctness, missed GT intervals and segments outside them.
+    """
+    segments = [(seg["start"], seg["end"]) for seg in participant_segments]
+    correct = False
+    missed_gt = []
+    extra_segments = []
+
+    if gt_type == "bonafide":
+        if not segments:
+            correct = True
+        else:
+            extra_segments = segments
+
+    elif gt_type == "full_spoof":
+        if segments:
+            correct = True
+
+    elif gt_type == "partial_spoof":
+        correct = True
+        if gt_intervals:
+            for gt_start, gt_end in gt_intervals:
+                overlap_with_seg = any(max(s, gt_start) < min(e, gt_end) for s, e in segments)
+                overlap_with_flag = any(gt_start <= f["time"] <= gt_end for f in participant_flags)
+                if not (overlap_with_seg or overlap_with_flag):
+                    missed_gt.append((gt_start, gt_end))
+                    correct = False
+
+        for s, e in segments:
+            outside = all(e <= gt_start or s >= gt_end for gt_start, gt_end in gt_intervals)
+            if outside:
+                extra_segments.append((s, e))
+
+        if not segments and not participant_flags:
+            correct = False
+            missed_gt = gt_intervals
+
+    return {"correct": correct, "missed_gt": missed_gt, "extra_segments": extra_segments}
+
+def summary_row(trial_idx, trial_data, duration):
+    """
+    Debrief/aggregate summary of a saved trial, scored once when the trial is saved.
+    """
+    gt_type = (trial_data.get("gt_label") or "").lower()
+    gt_intervals = trial_data.get("gt_segments") or []
+    segments = trial_data.get("segments", [])
+    flags = trial_data.get("flags", [])
+    return {
+        "trial_number": trial_idx + 1,
+        "duration": duration,
+        "gt_type": gt_type,
+        "gt_intervals": gt_intervals,
+        "participant_segments": segments,
+        "participant_flags": flags,
+        "participant_responses": trial_data.get("responses", {}),
+        **score_trial(gt_type, gt_intervals, segments, flags),
+    }
+
 def evaluate_trial(trial):
     return {
         "duration": float(trial.get("trial_duration", 60.0)),
@@ -0,0 +1,285 @@
+# janitor.py
+"""
+Background clean-up that keeps RESULTS_DIR bounded.
+
+Every visit reserves a participant id and writes a session file, and sessions
+that are never finished or uploaded stay in the directory forever. A daemon
+thread started by app.py sweeps the directory every JANITOR_INTERVAL_S seconds:
+
+  - bounces (a session with no saved trial and no journal) idle for
+    JANITOR_BOUNCE_TTL_S are deleted;
+  - sessions that answered every trial but never reached the Prolific submit are
+    bundled as completed once idle for JANITOR_ABANDONED_TTL_S;
+  - abandoned sessions idle for JANITOR_ABANDONED_TTL_S are archived as a bundle
+    whose aggregate records completion_status "abandoned" and the journal state
+    (annotations of the unfinished trial), then the upload is attempted;
+  - session records kept as tombstones of finished participants are deleted
+    after JANITOR_UPLOADED_TTL_S;
+  - bundles older than JANITOR_UPLOADED_TTL_S are deleted locally only once the
+    copy in the results repository is verified to be identical; otherwise
+    the upload is retried;
+  - stimuli assigned to sessions that bounced, were abandoned or exited early
+    are released in the results index (scheduler.py), as they will never be
+    answered; this goes through the progress index, so it works with every backend;
+  - the file backend's progress and results indexes are compacted once they
+    are mostly superseded lines.
+
+Loose participant files only exist with the file state backend; with sqlite or
+redis only bundles are swept. A lease file makes replicas sharing the directory
+take turns. Run a sweep by hand with
+
+    python janitor.py [--dry-run] [--results-dir results]
+"""
+import os, re, json, time, datetime, threading
+from archive import write_bundle, session_finished
+
+LEASE_FILE = ".janitor.lease"
+_FILE_PATTERN = re.compile(r"^participant_(?P<pid>[0-9A-Za-z]+)_(?P<kind>session\.json|trial_\d+\.json|journal\.jsonl|"
+                           r"snapshot\.json|aggregate\.json|bundle\.jsonl\.gz)$")
+
+_thread = None
+_thread_lock = threading.Lock()
+
+def _group_files(results_dir):
+    """
+    {participant_id: {kind: path}} of the participant files in results_dir.
+    """
+    groups = {}
+    for name in os.listdir(results_dir):
+        m = _FILE_PATTERN.match(name)
+        if m:
+            groups.setdefault(m.group("pid"), {})[m.group("kind")] = os.path.join(results_dir, name)
+    return groups
+
+def _acquire_lease(results_dir, stale_after):
+    path = os.path.join(results_dir, LEASE_FILE)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+            return path
+        except FileExistsError:
+            if time.time() - os.path.getmtime(path) < stale_after:
+                return None
+            os.remove(path)  # left behind by a replica that died mid-sweep
+    return None
+
+def _read_session(files):
+    try:
+        with open(files["session.json"]) as f:
+            return json.load(f)
+    except (KeyError, OSError, json.JSONDecodeError):
+        return {}
+
+def _bundle_name(path):
+    return f"results/bundles/{os.path.basename(path)}"
+
+def _upload(path):
+    from storage import save_file_to_github
+    save_file_to_github(path, _bundle_name(path))
+
+def release_stale_assignments(backend, now, bounce_ttl, abandoned_ttl, dry_run=False):
+    """
+    Releases the unanswered stimulus assignments of sessions that will not continue: early exits and
+    sessions idle past the bounce (no trial saved) or abandoned TTL. Returns the number released.
+    """
+    from scheduler import release_unanswered
+
+    released = 0
+    for pid, entry in backend.load_progress().items():
+        if entry.get("status") == "completed":
+            continue
+        answered = int(entry.get("trial_index") or 0)
+        idle = now - float(entry.get("updated_at") or now)
+        if not (entry.get("status") in ("emergency_exit", "abandoned", "bounced")
+                or idle > (abandoned_ttl if answered else bounce_ttl)):
+            continue
+        if entry.get("assignments_released_at", 0) >= float(entry.get("updated_at") or 0):
+            continue  # nothing happened since the last release
+        session = backend.load_session(pid) or {}
+        stimulus_ids = session.get("stimulus_ids") or []
+        start = max(answered, entry.get("assignments_released_through", 0))
+        released += max(len(stimulus_ids) - start, 0)
+        if not dry_run:
+            release_unanswered(backend, session, start)
+            backend.update_progress(pid, {"assignments_released_through": max(len(stimulus_ids), start),
+                                          "assignments_released_at": now})
+    return released
+
+def sweep(results_dir, backend=None, now=None, dry_run=False, bounce_ttl=None, abandoned_ttl=None, uploaded_ttl=None):
+    """
+    One clean-up pass over the bundles in results_dir and, with the file backend, the loose
+    participant files in its directory. Returns counts of what was done.
+    """
+    from config import JANITOR_BOUNCE_TTL_S, JANITOR_ABANDONED_TTL_S, JANITOR_UPLOADED_TTL_S
+    from backend import FileBackend
+    from journal import TrialJournal
+
+    now = now or time.time()
+    bounce_ttl = JANITOR_BOUNCE_TTL_S if bounce_ttl is None else bounce_ttl
+    abandoned_ttl = JANITOR_ABANDONED_TTL_S if abandoned_ttl is None else abandoned_ttl
+    uploaded_ttl = JANITOR_UPLOADED_TTL_S if uploaded_ttl is None else uploaded_ttl
+    stats = {"bounces_removed": 0, "abandoned_archived": 0, "bundled": 0, "bundles_deleted": 0,
+             "uploads_retried": 0, "tombstones_removed": 0, "kept": 0}
+
+    def mark(pid, **fields):
+        if backend is not None and not dry_run:
+            backend.update_progress(pid, {**fields, "updated_at": now})
+
+    if backend is not None:
+        stats["assignments_released"] = release_stale_assignments(backend, now, bounce_ttl, abandoned_ttl, dry_run)
+
+    # Loose files live in the file backend's directory (RESULTS_DIR unless SPOOF_STATE_URL moves it)
+    state_dir = backend.results_dir if isinstance(backend, FileBackend) else None
+    groups = [(results_dir, pid, files) for pid, files in _group_files(results_dir).items()]
+    if state_dir and os.path.abspath(state_dir) != os.path.abspath(results_dir):
+        groups += [(state_dir, pid, files) for pid, files in _group_files(state_dir).items()]
+
+    for directory, pid, files in groups:
+        loose = {k: p for k, p in files.items() if k != "bundle.jsonl.gz"}
+        if loose and directory == state_dir:
+            idle = now - max(os.path.getmtime(p) for p in loose.values())
+            trials = [k for k in loose if k.startswith("trial_")]
+            journal_file = loose.get("journal.jsonl")
+            has_journal = "snapshot.json" in loose or (journal_file and os.path.getsize(journal_file) > 0)
+
+            session = _read_session(loose)
+            journal = TrialJournal(backend, pid) if "session.json" in loose and idle > abandoned_ttl else None
+            if session.get("completion_status") and set(loose) == {"session.json"}:
+                # Tombstone left by the debrief so reloads find the finished participant
+                if idle > uploaded_ttl:
+                    if not dry_run:
+                        os.remove(loose["session.json"])
+                    stats["tombstones_removed"] += 1
+                else:
+                    stats["kept"] += 1
+            elif "aggregate.json" in loose and "session.json" in loose:
+                # Finished, but the debrief could not bundle (e.g. the app restarted mid-submit)
+                if not dry_run:
+                    backend.save_session(pid, {**session, "completion_status": "completed"})
+                    write_bundle(directory, pid, remove_sources=True, keep_session=True)
+                mark(pid, status="completed")
+                stats["bundled"] += 1
+            elif not trials and not has_journal and idle > bounce_ttl:
+                if not dry_run:
+                    for path in loose.values():
+                        os.remove(path)
+                mark(pid, status="bounced")
+                stats["bounces_removed"] += 1
+            elif journal and session_finished(session, max(session.get("trial_index", 0), journal.state["trial_index"])):
+                # Answered every trial but never submitted the Prolific id at the debrief
+                if not dry_run:
+                    summary, scores = journal.aggregate()
+                    aggregate = {
+                        "participant_id": pid,
+                        "completion_status": "completed",
+                        "completed_at": datetime.datetime.fromtimestamp(now - idle).isoformat(),
+                        "summary": summary,
+                        "scores": scores,
+                        "total_trials": len(trials),
+                        "prolific_validated": False,
+                    }
+                    backend.save_session(pid, {**session, "completion_status": "completed"})
+                    out = write_bundle(directory, pid, aggregate=aggregate, remove_sources=True, keep_session=True)
+                    try:
+                        _upload(out)
+                    except Exception as e:
+                        print(f"[WARN] Janitor could not upload {os.path.basename(out)}: {e}")
+                mark(pid, status="completed")
+                stats["bundled"] += 1
+            elif journal:
+                if not dry_run:
+                    aggregate = {
+                        "participant_id": pid,
+                        "completion_status": "abandoned",
+                        "abandoned_at": datetime.datetime.fromtimestamp(now).isoformat(),
+                        "last_activity": datetime.datetime.fromtimestamp(now - idle).isoformat(),
+                        "total_trials": len(trials),
+                        "journal_state": journal.resume(),
+                    }
+                    out = write_bundle(directory, pid, aggregate=aggregate, remove_sources=True)
+                    try:
+                        _upload(out)
+                    except Exception as e:
+                        print(f"[WARN] Janitor could not upload {os.path.basename(out)}: {e}")
+                mark(pid, status="abandoned")
+                stats["abandoned_archived"] += 1
+            else:
+                stats["kept"] += 1
+            continue
+
+        bundle = files.get("bundle.jsonl.gz")
+        if bundle and now - os.path.getmtime(bundle) > uploaded_ttl:
+            from storage import github_file_matches
+            try:
+                verified = github_file_matches(bundle, _bundle_name(bundle))
+            except Exception as e:
+                print(f"[WARN] Janitor could not verify the upload of {os.path.basename(bundle)}: {e}")
+                verified = False
+            if verified:
+                if not dry_run:
+                    os.remove(bundle)
+                stats["bundles_deleted"] += 1
+            else:
+                if not dry_run:
+                    try:
+                        _upload(bundle)  # deleted on a later sweep once the copy verifies
+                    except Exception as e:
+                        print(f"[WARN] Janitor upload retry failed for {os.path.basename(bundle)}: {e}")
+                stats["uploads_retried"] += 1
+
+    if isinstance(backend, FileBackend) and not dry_run:
+        backend.compact_progress(drop_statuses=("bounced",))
+        backend.compact_stimulus_stats()
+    return stats
+
+def run_once(results_dir=None, dry_run=False):
+    from config import RESULTS_DIR, JANITOR_INTERVAL_S
+    from backend import get_backend, FileBackend
+
+    backend = get_backend()
+    if results_dir and isinstance(backend, FileBackend):
+        backend = FileBackend(results_dir)
+    results_dir = results_dir or RESULTS_DIR
+    lease = _acquire_lease(results_dir, stale_after=2 * JANITOR_INTERVAL_S)
+    if lease is None:
+        return None  # another replica is sweeping
+    try:
+        stats = sweep(results_dir, backend, dry_run=dry_run)
+    finally:
+        os.remove(lease)
+    if any(v for k, v in stats.items() if k != "kept"):
+        print(f"Janitor: {stats}")
+    return stats
+
+def _loop(interval):
+    while True:
+        try:
+            run_once()
+        except Exception as e:
+            print(f"[WARN] Janitor sweep failed: {e}")
+        time.sleep(interval)
+
+def start_janitor():
+    """
+    Starts the janitor thread once per process (no-op when disabled or already running).
+    """
+    global _thread
+    from config import JANITOR_ENABLED, JANITOR_INTERVAL_S
+
+    if not JANITOR_ENABLED:
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_loop, args=(JANITOR_INTERVAL_S,), name="results-janitor", daemon=True)
+            _thread.start()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run one clean-up pass over the results directory.")
+    parser.add_argument("--results-dir")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be done without changing anything")
+    args = parser.parse_args()
+
+    stats = run_once(args.results_dir, dry_run=args.dry_run)
+    print(json.dumps(stats) if stats is not None else "Another janitor holds the lease, nothing done")
@@ -0,0 +1,132 @@
+# journal.py
+import time, copy
+
+JOURNAL_OPS = (
+    "segment_added",
+    "segment_removed",
+    "segment_updated",
+    "flag_added",
+    "flag_removed",
+    "flag_updated",
+    "response_changed",
+    "trial_completed",
+)
+
+def empty_state():
+    return {"trial_index": 0, "segments": {}, "flags": {}, "responses": {}, "summary": {}, "scores": empty_scores()}
+
+def empty_scores():
+    return {"trials": 0, "correct": 0, "segments": 0, "flags": 0, "by_gt_type": {}}
+
+def _count_row(scores, row, sign):
+    scores["trials"] += sign
+    scores["correct"] += sign * bool(row.get("correct"))
+    scores["segments"] += sign * len(row.get("participant_segments", []))
+    scores["flags"] += sign * len(row.get("participant_flags", []))
+    by_type = scores["by_gt_type"].setdefault(row.get("gt_type") or "unknown", {"trials": 0, "correct": 0})
+    by_type["trials"] += sign
+    by_type["correct"] += sign * bool(row.get("correct"))
+
+def apply_record(state, record):
+    """
+    Applies a single journal record to an in-memory state.
+    """
+    op = record["op"]
+    trial = record["trial"]
+    if op == "segment_added":
+        state["segments"].setdefault(trial, []).append(record["segment"])
+    elif op == "segment_removed":
+        state["segments"][trial] = [s for s in state["segments"].get(trial, []) if s["id"] != record["id"]]
+    elif op == "segment_updated":
+        state["segments"][trial] = [record["segment"] if s["id"] == record["segment"]["id"] else s
+                                    for s in state["segments"].get(trial, [])]
+    elif op == "flag_added":
+        state["flags"].setdefault(trial, []).append(record["flag"])
+    elif op == "flag_removed":
+        state["flags"][trial] = [f for f in state["flags"].get(trial, []) if f["id"] != record["id"]]
+    elif op == "flag_updated":
+        state["flags"][trial] = [record["flag"] if f["id"] == record["flag"]["id"] else f
+                                 for f in state["flags"].get(trial, [])]
+    elif op == "response_changed":
+        state["responses"].setdefault(trial, {})[record["question"]] = record["answer"]
+    elif op == "trial_completed":
+        # Completed trials live in their trial file; only in-progress state is kept.
+        state["trial_index"] = max(state["trial_index"], trial + 1)
+        for key in ("segments", "flags", "responses"):
+            state[key].pop(trial, None)
+        # The running aggregate keeps the scored summary of every completed trial
+        if "summary" in record:
+            summary, scores = state.setdefault("summary", {}), state.setdefault("scores", empty_scores())
+            if trial in summary:
+                _count_row(scores, summary[trial], -1)
+            summary[trial] = record["summary"]
+            _count_row(scores, record["summary"], 1)
+    else:
+        raise ValueError(f"Unknown journal op: {op}")
+
+class TrialJournal:
+    """
+    Write-ahead journal of small trial mutations for one participant.
+    Records are appended to the state backend and periodically compacted into a
+    snapshot, so resuming only replays the journal tail on top of the last snapshot.
+    """
+    def __init__(self, backend, participant_id, compact_every=50):
+        self.backend = backend
+        self.participant_id = participant_id
+        self.compact_every = compact_every
+        self.state, self.seq = self._load()
+        self.pending = 0
+
+    def _load(self):
+        state, seq = empty_state(), 0
+        snapshot, records = self.backend.load_journal(self.participant_id)
+        if snapshot:
+            seq = snapshot["seq"]
+            state = snapshot["state"]
+            state = dict(empty_state(), **state)  # snapshots from before the running aggregate
+            for key in ("segments", "flags", "responses", "summary"):
+                state[key] = {int(k): v for k, v in state[key].items()}  # JSON keys are strings
+
+        for record in records:
+            # Records already folded into the snapshot survive a crash during compaction
+            if record["seq"] <= seq:
+                continue
+            apply_record(state, record)
+            seq = record["seq"]
+        return state, seq
+
+    def resume(self):
+        """
+        Returns a copy of the replayed state (trial index and in-progress annotations).
+        """
+        return copy.deepcopy(self.state)
+
+    def aggregate(self):
+        """
+        Summary rows of the completed trials (in trial order) and their running scores.
+        """
+        summary = self.state["summary"]
+        return [summary[i] for i in sorted(summary)], self.state["scores"]
+
+    def append(self, op, trial_idx, **data):
+        """
+        Appends a mutation record and applies it to the in-memory state.
+        """
+        if op not in JOURNAL_OPS:
+            raise ValueError(f"Unknown journal op: {op}")
+        self.seq += 1
+        record = {"seq": self.seq, "op": op, "trial": trial_idx, "ts": time.time(), **data}
+        self.backend.append_journal(self.participant_id, record)
+        apply_record(self.state, record)
+
+        self.pending += 1
+        if op == "trial_completed" or self.pending >= self.compact_every:
+            self.compact()
+        return record
+
+    def compact(self):
+        """
+        Writes the current state as the snapshot and drops the journal records it covers.
+        """
+        self.backend.write_snapshot(self.participant_id, {"seq": self.seq, "state": self.state})
+        self.pending = 0
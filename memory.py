@@ -0,0 +1,98 @@
+# memory.py
+import sys
+import streamlit as st
+from backend import StateBackend
+
+# Per-trial containers in st.session_state, keyed by trial index
+TRIAL_STATE_KEYS = [
+    "segments_by_trial",
+    "flags_by_trial",
+    "responses_by_trial",
+    "action_log_by_trial",
+    "saved_trials",
+]
+
+def deep_sizeof(obj, seen=None):
+    """
+    Approximate recursive size of an object in bytes. State backends are shared by all
+    sessions of the process and are not counted.
+    """
+    if isinstance(obj, StateBackend):
+        return 0
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+def session_memory_report():
+    """
+    Returns (total_bytes, [(key, bytes), ...]) for the current session, largest first.
+    """
+    seen = set()
+    sizes = []
+    for key in list(st.session_state.keys()):
+        try:
+            sizes.append((key, deep_sizeof(st.session_state[key], seen)))
+        except Exception:
+            continue
+    sizes.sort(key=lambda kv: kv[1], reverse=True)
+    return sum(s for _, s in sizes), sizes
+
+def trial_scratch_keys(trial_idx):
+    """
+    Non-widget session state keys created by show_trial for a given trial (timing,
+    annotation table version, client batch ids). Widget states are dropped by Streamlit itself
+    once the widgets are no longer rendered.
+    """
+    explicit = {
+        f"trial{trial_idx}_annotation_table_version",
+        f"trial{trial_idx}_hotkey_batches",
+        f"trial{trial_idx}_evaluation_batches",
+    }
+    return [
+        k for k in st.session_state.keys()
+        if isinstance(k, str) and (k in explicit or k.startswith(f"trial_{trial_idx}_"))
+    ]
+
+def evict_completed_trial(trial_idx):
+    """
+    Drops a saved trial's annotations, action log and timing keys from the session.
+    They are persisted by Storage.save_trial and read back from storage by the debrief.
+    """
+    freed = 0
+    for key in TRIAL_STATE_KEYS:
+        container = st.session_state.get(key)
+        if container and trial_idx in container:
+            freed += deep_sizeof(container.pop(trial_idx))
+    for key in trial_scratch_keys(trial_idx):
+        freed += deep_sizeof(st.session_state[key])
+        del st.session_state[key]
+    return freed
+
+def enforce_memory_budget(budget_bytes):
+    """
+    Keeps the session under budget: when over it, evicts the completed trials still held
+    (e.g. restored on resume) and warns with the largest keys if that was not enough.
+    """
+    total, sizes = session_memory_report()
+    if total <= budget_bytes:
+        return total
+    current = st.session_state.get("trial_index", 0)
+    held = {idx for key in TRIAL_STATE_KEYS for idx in (st.session_state.get(key) or {})
+            if isinstance(idx, int) and idx < current}
+    if sum(evict_completed_trial(idx) for idx in sorted(held)):
+        total, sizes = session_memory_report()
+    if total > budget_bytes:
+        top = ", ".join(f"{k}={s}" for k, s in sizes[:5])
+        print(f"[WARN] Session {st.session_state.get('participant_id')} uses {total} bytes (budget {budget_bytes}): {top}")
+    return total
@@ -0,0 +1,130 @@
+# plan.py
+"""
+Per-participant session plans derived from a seed.
+
+Every random choice of a session (valence condition, instruction version,
+stimulus subset and order, affect images, trust cues, sanity checks and the
+evaluation question order) is drawn from its own random.Random seeded with
+"<seed>:<catalog version>:<purpose>". A session therefore only persists the
+seed, the catalog version, the stimulus ids and the shuffled affect image
+pool, and the whole plan can be regenerated exactly on any replica. Stimulus
+ids and images are kept so a rebuilt catalog does not change a running
+session's trials.
+
+Adaptive plans (scheduler.py) start without stimuli and get one appended per
+trial. Everything else drawn for trial i only depends on i, so extending a
+plan never changes the trials already shown.
+"""
+import random, secrets
+
+PLAN_VERSION = 1
+VALENCE_CONDITIONS = ["HVHA", "LVHA"]
+SANITY_CHOICES = [False, False, True]
+
+def new_seed():
+    return secrets.randbits(63)
+
+def plan_rng(seed, catalog_version, purpose):
+    return random.Random(f"{seed}:{catalog_version}:{purpose}")
+
+def make_plan(seed, catalog, instruction_versions, n_trials=None, stimulus_ids=None, catalog_version=None,
+              overrides=None, affect_pool=None):
+    """
+    Regenerates the plan of a seed. stimulus_ids, catalog_version and affect_pool
+    are given when resuming, otherwise they are drawn from the catalog. overrides
+    pins the conditions of sessions that predate seed plans.
+    """
+    version = catalog_version or catalog["version"]
+    rng = lambda purpose: plan_rng(seed, version, purpose)
+    overrides = overrides or {}
+
+    valence_condition = overrides.get("valence_condition") or rng("valence").choice(VALENCE_CONDITIONS)
+    instruction_version = overrides.get("instruction_version") or rng("instruction").choice(sorted(instruction_versions))
+
+    if stimulus_ids is None:
+        stimulus_ids = sorted(s["stimulus_id"] for s in catalog["stimuli"])
+        rng("stimuli").shuffle(stimulus_ids)
+        stimulus_ids = stimulus_ids[:n_trials] if n_trials else stimulus_ids
+    n = len(stimulus_ids)
+
+    if affect_pool is None:
+        if version != catalog["version"]:
+            print(f"[WARN] Plan of catalog {version} has no pinned affect images, drawing them from {catalog['version']}")
+        affect_pool = sorted(img["path"] for img in catalog["affect_images"]
+                             if img["quadrant"].startswith(valence_condition))
+        rng("affect").shuffle(affect_pool)
+    pool = list(affect_pool)
+    if pool and len(pool) < n:
+        # If not enough images, cycle through them
+        pool = pool * (n // len(pool) + 1)
+
+    trust_rng, sanity_rng = rng("trust_cue"), rng("sanity")
+    plan = {
+        "plan_version": PLAN_VERSION,
+        "seed": seed,
+        "catalog_version": version,
+        "valence_condition": valence_condition,
+        "instruction_version": instruction_version,
+        "stimulus_ids": list(stimulus_ids),
+        "affect_pool": list(affect_pool),
+        "affect_images": pool[:n],
+        "trust_cues": [trust_rng.choice([True, False]) for _ in range(n)],
+        "sanity_checks": [sanity_rng.choice(SANITY_CHOICES) for _ in range(n)],
+    }
+    if overrides:
+        plan["overrides"] = overrides
+    return plan
+
+def question_order(plan, trial_idx, n_questions):
+    """
+    Evaluation question order of a trial.
+    """
+    order = list(range(n_questions))
+    plan_rng(plan["seed"], plan["catalog_version"], f"questions:{trial_idx}").shuffle(order)
+    return order
+
+def extend_plan(plan, catalog, instruction_versions, stimulus_id):
+    """
+    The plan with stimulus_id appended as its next trial.
+    """
+    extended = make_plan(plan["seed"], catalog, instruction_versions, stimulus_ids=plan["stimulus_ids"] + [stimulus_id],
+                         catalog_version=plan["catalog_version"], overrides=plan.get("overrides"),
+                         affect_pool=plan["affect_pool"])
+    if plan.get("adaptive"):
+        extended.update(adaptive=True, n_trials=plan["n_trials"])
+    return extended
+
+def session_plan(session_data, catalog, instruction_versions, n_trials=None, adaptive=False):
+    """
+    Returns (plan, created). A new plan is created when the session has no seed yet;
+    only its seed, catalog version and stimulus ids need to be persisted. New adaptive
+    plans have no stimuli yet, they are picked per trial by scheduler.py.
+    """
+    if "seed" in session_data:
+        plan = make_plan(session_data["seed"], catalog, instruction_versions,
+                         stimulus_ids=session_data["stimulus_ids"], catalog_version=session_data["catalog_version"],
+                         overrides=session_data.get("overrides"), affect_pool=session_data.get("affect_pool"))
+        if session_data.get("adaptive"):
+            plan.update(adaptive=True, n_trials=session_data["n_trials"])
+        return plan, False
+
+    # Sessions started before seed plans keep their stimuli and conditions
+    stimulus_ids = None
+    legacy_trials = session_data.get("all_trials") or []
+    if legacy_trials and all(t.get("stimulus_id") for t in legacy_trials):
+        stimulus_ids = [t["stimulus_id"] for t in legacy_trials]
+    overrides = {k: session_data[k] for k in ("valence_condition", "instruction_version") if session_data.get(k)}
+    if adaptive and stimulus_ids is None:
+        plan = make_plan(new_seed(), catalog, instruction_versions, stimulus_ids=[], overrides=overrides)
+        plan.update(adaptive=True, n_trials=min(n_trials or len(catalog["stimuli"]), len(catalog["stimuli"])))
+        return plan, True
+    plan = make_plan(new_seed(), catalog, instruction_versions, n_trials=n_trials, stimulus_ids=stimulus_ids,
+                     overrides=overrides)
+    return plan, True
+
+def persisted_fields(plan):
+    """
+    The part of a plan stored in the session record.
+    """
+    keys = ("plan_version", "seed", "catalog_version", "stimulus_ids", "affect_pool", "overrides", "adaptive", "n_trials")
+    return {key: plan[key] for key in keys if key in plan}
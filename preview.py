@@ -0,0 +1,114 @@
+# preview.py
+"""
+Segment previews cut on the server from memory-mapped WAV files.
+
+The "Play selection" control under the segment slider plays only the selected
+[start, end] of the stimulus audio (the catalog's "audio" field, a PCM WAV in
+assets/stage3_mix). The data chunk is located once per file from the RIFF
+headers and memory-mapped. A preview copies just the frames of the selection
+behind a new 44-byte header, so the file is never decoded or read as a whole.
+
+Cut previews are kept in a process-wide LRU of at most PREVIEW_CACHE_BYTES.
+Bounds are rounded to PREVIEW_STEP_S, so repeated plays and other
+participants' plays of the same selection are served from memory.
+"""
+import os, struct, threading
+from collections import OrderedDict
+import numpy as np
+
+PREVIEW_STEP_S = 0.01
+
+class PreviewError(ValueError):
+    pass
+
+_lock = threading.Lock()
+_maps = {}              # path -> (mtime, layout, memmap of the data chunk)
+_cache = OrderedDict()  # (path, start_ms, end_ms) -> wav bytes
+_cache_bytes = 0
+
+def wav_layout(path):
+    """
+    (channels, sample rate, bytes per sample, data offset, data size) of a PCM WAV, from its chunk headers.
+    """
+    fmt = None
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise PreviewError(f"{path} is not a RIFF/WAVE file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise PreviewError(f"{path} has no data chunk")
+            kind, size = struct.unpack("<4sI", header)
+            if kind == b"fmt ":
+                body = f.read(size)
+                audio_format, channels, rate, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+                if audio_format not in (1, 0xFFFE):
+                    raise PreviewError(f"{path} is not PCM (format {audio_format})")
+                fmt = (channels, rate, bits // 8, block_align)
+            elif kind == b"data":
+                if fmt is None:
+                    raise PreviewError(f"{path}: data chunk before fmt chunk")
+                data_size = min(size, os.path.getsize(path) - f.tell())
+                channels, rate, width, _ = fmt
+                return channels, rate, width, f.tell(), data_size
+            else:
+                f.seek(size, os.SEEK_CUR)
+            if size % 2:
+                f.seek(1, os.SEEK_CUR)  # chunks are word aligned
+
+def _mapped(path):
+    mtime = os.path.getmtime(path)
+    entry = _maps.get(path)
+    if entry is None or entry[0] != mtime:
+        layout = wav_layout(path)
+        data = np.memmap(path, dtype=np.uint8, mode="r", offset=layout[3], shape=(layout[4],))
+        entry = _maps[path] = (mtime, layout, data)
+    return entry[1], entry[2]
+
+def _wav_header(channels, rate, width, data_size):
+    block_align = channels * width
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, channels, rate,
+                       rate * block_align, block_align, width * 8, b"data", data_size)
+
+def cut_segment(path, start, end):
+    """
+    WAV bytes of [start, end] seconds of path, copied from the memory map without decoding.
+    """
+    with _lock:
+        (channels, rate, width, _, data_size), data = _mapped(path)
+    block = channels * width
+    total_frames = data_size // block
+    first = min(max(int(round(start * rate)), 0), total_frames)
+    last = min(max(int(round(end * rate)), first), total_frames)
+    if last <= first:
+        raise PreviewError(f"empty selection {start:.2f}-{end:.2f}s")
+    frames = data[first * block:last * block].tobytes()
+    return _wav_header(channels, rate, width, len(frames)) + frames
+
+def segment_preview(path, start, end):
+    """
+    Cached cut_segment, with bounds rounded to PREVIEW_STEP_S.
+    """
+    global _cache_bytes
+    from config import PREVIEW_CACHE_BYTES
+
+    key = (path, int(round(start / PREVIEW_STEP_S)), int(round(end / PREVIEW_STEP_S)))
+    with _lock:
+        wav = _cache.get(key)
+        if wav is not None:
+            _cache.move_to_end(key)
+            return wav
+    wav = cut_segment(path, key[1] * PREVIEW_STEP_S, key[2] * PREVIEW_STEP_S)
+    with _lock:
+        if key not in _cache and len(wav) <= PREVIEW_CACHE_BYTES:
+            _cache[key] = wav
+            _cache_bytes += len(wav)
+            while _cache_bytes > PREVIEW_CACHE_BYTES:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= len(evicted)
+    return wav
+
+def cache_info():
+    with _lock:
+        return {"entries": len(_cache), "bytes": _cache_bytes, "mapped_files": len(_maps)}
@@ -0,0 +1,110 @@
+# profiler.py
+"""
+Opt-in allocation profiling around show_trial / show_debrief reruns.
+
+Enable with SPOOF_ALLOC_PROFILE=1. tracemalloc is process-wide, so with several
+concurrent sessions a rerun's growth also includes allocations made by other
+sessions' threads in the same window; per-participant numbers are attributions,
+not exact ownership. Reports are written to ALLOC_PROFILE_DIR as one JSON per
+participant plus a process-wide summary.
+"""
+import os, sys, json, time, threading, tracemalloc, contextlib, datetime
+import streamlit as st
+from config import ALLOC_PROFILE_ENABLED, ALLOC_PROFILE_DIR, ALLOC_PROFILE_FRAMES, ALLOC_PROFILE_TOP
+
+_lock = threading.Lock()
+_participants = {}
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+def _open_figures():
+    plt = sys.modules.get("matplotlib.pyplot")
+    return len(plt.get_fignums()) if plt else 0
+
+def _site(stat):
+    frame = stat.traceback[0]
+    return f"{os.path.relpath(frame.filename)}:{frame.lineno}"
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"  # replicas may share ALLOC_PROFILE_DIR
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def _record(participant_id, label, elapsed, stats):
+    current, peak = tracemalloc.get_traced_memory()
+    with _lock:
+        p = _participants.setdefault(participant_id, {
+            "participant_id": participant_id,
+            "first_seen": datetime.datetime.now().isoformat(),
+            "reruns": {},
+            "growth_bytes": 0,
+            "sites": {},
+            "history": [],
+        })
+        growth = sum(s.size_diff for s in stats)
+        p["reruns"][label] = p["reruns"].get(label, 0) + 1
+        p["growth_bytes"] += growth
+        for s in stats:
+            if s.size_diff:
+                site = _site(s)
+                p["sites"][site] = p["sites"].get(site, 0) + s.size_diff
+        # Keep the site table bounded; small sites are dropped first
+        if len(p["sites"]) > ALLOC_PROFILE_TOP * 4:
+            keep = sorted(p["sites"].items(), key=lambda kv: abs(kv[1]), reverse=True)[:ALLOC_PROFILE_TOP * 2]
+            p["sites"] = dict(keep)
+        p["history"].append({
+            "label": label,
+            "trial_index": st.session_state.get("trial_index"),
+            "growth_bytes": growth,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "open_figures": _open_figures(),
+            "elapsed_s": round(elapsed, 4),
+        })
+        p["history"] = p["history"][-200:]
+        report = dict(p, top_sites=sorted(p["sites"].items(), key=lambda kv: kv[1], reverse=True)[:ALLOC_PROFILE_TOP])
+        report.pop("sites")
+        summary = {
+            "updated_at": datetime.datetime.now().isoformat(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "open_figures": _open_figures(),
+            "participants": {pid: q["growth_bytes"] for pid, q in _participants.items()},
+        }
+        # Written under the lock so concurrent sessions cannot interleave or truncate the files
+        os.makedirs(ALLOC_PROFILE_DIR, exist_ok=True)
+        _write_json(os.path.join(ALLOC_PROFILE_DIR, f"participant_{participant_id}.json"), report)
+        _write_json(os.path.join(ALLOC_PROFILE_DIR, "summary.json"), summary)
+
+@contextlib.contextmanager
+def profile_rerun(label):
+    """
+    Snapshots tracemalloc before and after the wrapped rerun and records the
+    top allocation sites that grew, attributed to the current participant.
+    """
+    if not ALLOC_PROFILE_ENABLED:
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(ALLOC_PROFILE_FRAMES)
+    before = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Also runs on st.stop()/st.rerun(), which unwind through here
+        elapsed = time.perf_counter() - start
+        after = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        stats = after.compare_to(before, "lineno")
+        try:
+            _record(st.session_state.get("participant_id", "unknown"), label, elapsed, stats)
+        except Exception as e:
+            print(f"[WARN] Allocation profile failed: {e}")
@@ -0,0 +1,262 @@
+# quality.py
+"""
+Offline detection of scripted, copy-pasted and inattentive sessions.
+
+Each participant is reduced to two sets of shingles:
+
+    behaviour  4-grams of (action, log-binned gap to the previous action) per trial,
+               i.e. what was done in which rhythm, independent of the stimulus
+    content    (stimulus, question, answer) and (stimulus, rounded segment / flag)
+               items, i.e. what was answered and marked
+
+and each set to a MinHash signature (NUM_PERM universal hashes, vectorized with
+NumPy). Signatures are split into LSH bands, so only participants that share a
+band bucket are compared. The cost grows roughly linearly with the number of
+participants instead of quadratically. Candidate pairs whose estimated Jaccard
+similarity reaches --threshold are reported and merged into clusters.
+
+Every participant also gets a quality score in [0, 1] (1 = no concerns). It is
+lowered by:
+- failed sanity questions;
+- answer_validity failures;
+- answers left at the default;
+- straight-lined evaluation grids;
+- machine-regular timing;
+- a near-duplicate of another session.
+
+    python quality.py [--results-dir results] [--threshold 0.8] [--json quality.json]
+"""
+import math, hashlib
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32                    # 32 bands of 4 rows: pairs above ~0.42 similarity become candidates
+MERSENNE = (1 << 31) - 1
+SHINGLE_SIZE = 4
+MAX_BUCKET = 200              # larger buckets (e.g. everyone leaving all defaults) are reported as one group
+
+SANITY_QUESTION = "What scenario were you given for this task?"
+SANITY_ANSWERS = {"monitor_attacks": "Monitoring for audio attacks.", "new_tech": "Evaluating new technology."}
+DEFAULT_ANSWERS = {"Unsure", "I did not pay attention."}
+# Timing regularity below this coefficient of variation of inter-action gaps looks scripted
+MIN_GAP_CV = 0.15
+
+PENALTIES = {
+    "sanity_failed": 0.35,
+    "invalid_wait": 0.2,
+    "default_answers": 0.15,
+    "straightlining": 0.1,
+    "regular_timing": 0.2,
+    "near_duplicate": 0.3,
+}
+
+def _hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little") % MERSENNE
+
+def _gap_bin(gap):
+    return "-" if gap is None else str(int(round(math.log2(max(gap, 0.01)) * 2)))
+
+def load_participants(results_dir):
+    """
+    {participant_id: [trial records sorted by trial_index]} from bundles and loose trial files.
+    """
+    from archive import iter_result_records
+
+    participants = {}
+    for rec in iter_result_records(results_dir):
+        participants.setdefault(str(rec.get("participant_id")), []).append(rec)
+    for trials in participants.values():
+        trials.sort(key=lambda r: r.get("trial_index", 0))
+    return participants
+
+def shingles(trials):
+    """
+    (behaviour, content) shingle sets of one participant, as hashed integers.
+    """
+    behaviour, content = set(), set()
+    for trial in trials:
+        stimulus = trial.get("stimulus_id") or trial.get("audio")
+        tokens, last_ts = [], None
+        for action in trial.get("action_log") or []:
+            ts = action.get("ts_wall")
+            gap = ts - last_ts if ts is not None and last_ts is not None else None
+            tokens.append(f"{action.get('action')}:{_gap_bin(gap)}")
+            last_ts = action.get("ts_wall_end", ts)
+        tokens = ["<start>", *tokens, "<end>"]
+        for i in range(max(len(tokens) - SHINGLE_SIZE + 1, 1)):
+            behaviour.add(_hash("|".join(tokens[i:i + SHINGLE_SIZE])))
+        for question, answer in (trial.get("responses") or {}).items():
+            content.add(_hash(f"{stimulus}|{question}|{answer}"))
+        for seg in trial.get("segments") or []:
+            content.add(_hash(f"{stimulus}|seg|{float(seg['start']):.1f}-{float(seg['end']):.1f}"))
+        for flag in trial.get("flags") or []:
+            content.add(_hash(f"{stimulus}|flag|{float(flag['time']):.1f}"))
+    return behaviour, content
+
+def minhash(shingle_sets, num_perm=NUM_PERM, seed=0):
+    """
+    Signature matrix (participants, num_perm) of uint64 for a list of hashed shingle sets.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(shingle_sets), num_perm), MERSENNE, dtype=np.uint64)
+    for i, s in enumerate(shingle_sets):
+        if s:
+            x = np.fromiter(s, dtype=np.uint64, count=len(s))
+            signatures[i] = ((a[:, None] * x[None, :] + b[:, None]) % MERSENNE).min(axis=1)
+    return signatures
+
+def lsh_candidates(signatures, bands=BANDS, max_bucket=MAX_BUCKET):
+    """
+    Returns (candidate index pairs, oversized buckets as index lists).
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs, groups = set(), []
+    for band in range(bands):
+        buckets = {}
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(n):
+            buckets.setdefault(chunk[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) > max_bucket:
+                groups.append(members)
+            elif len(members) > 1:
+                pairs.update((p, q) for k, p in enumerate(members) for q in members[k + 1:])
+    return pairs, groups
+
+def similar_pairs(ids, shingle_sets, threshold, num_perm=NUM_PERM, bands=BANDS):
+    """
+    [(id_a, id_b, estimated Jaccard)] at or above threshold, plus oversized LSH buckets.
+    Participants without any shingles are never matched.
+    """
+    signatures = minhash(shingle_sets, num_perm)
+    pairs, groups = lsh_candidates(signatures, bands)
+    matches = []
+    for p, q in sorted(pairs):
+        if not shingle_sets[p] or not shingle_sets[q]:
+            continue
+        similarity = float((signatures[p] == signatures[q]).mean())
+        if similarity >= threshold:
+            matches.append((ids[p], ids[q], similarity))
+    return matches, [sorted(ids[i] for i in g) for g in groups]
+
+def clusters(matches):
+    """
+    Connected components of the matched pairs (union-find).
+    """
+    parent = {}
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for a, b, _ in matches:
+        parent[find(a)] = find(b)
+    groups = {}
+    for x in list(parent):
+        groups.setdefault(find(x), []).append(x)
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+def participant_signals(trials):
+    """
+    Attention and timing signals of one participant, each a rate in [0, 1] (or None if not measurable).
+    """
+    sanity_total = sanity_failed = 0
+    answers = defaults = straight = graded = 0
+    invalid = [not (t.get("answer_validity") or {}).get("is_valid", True) for t in trials]
+    gaps = []
+    for trial in trials:
+        responses = trial.get("responses") or {}
+        expected = SANITY_ANSWERS.get(trial.get("instruction_version"))
+        if SANITY_QUESTION in responses and expected:
+            sanity_total += 1
+            sanity_failed += responses[SANITY_QUESTION] != expected
+        grid = [a for q, a in responses.items() if q != SANITY_QUESTION]
+        answers += len(grid)
+        defaults += sum(a in DEFAULT_ANSWERS for a in grid)
+        if len(grid) > 1:
+            graded += 1
+            straight += len(set(grid)) == 1
+        ts = [a["ts_wall"] for a in trial.get("action_log") or [] if a.get("ts_wall") is not None]
+        gaps += [b - a for a, b in zip(ts, ts[1:]) if b > a]
+    gap_cv = float(np.std(gaps) / np.mean(gaps)) if len(gaps) >= 5 and np.mean(gaps) > 0 else None
+    return {
+        "trials": len(trials),
+        "sanity_failed": sanity_failed / sanity_total if sanity_total else None,
+        "invalid_wait": sum(invalid) / len(invalid) if invalid else None,
+        "default_answers": defaults / answers if answers else None,
+        "straightlining": straight / graded if graded else None,
+        "gap_cv": gap_cv,
+        "regular_timing": float(gap_cv is not None and gap_cv < MIN_GAP_CV),
+    }
+
+def quality_report(participants, threshold=0.8, num_perm=NUM_PERM, bands=BANDS):
+    """
+    Per-participant scores and reasons, plus the near-duplicate pairs and clusters.
+    """
+    ids = sorted(participants)
+    sets = [shingles(participants[pid]) for pid in ids]
+    duplicates = {}
+    report = {"pairs": {}, "clusters": {}, "large_groups": {}}
+    for kind, index in (("behaviour", 0), ("content", 1)):
+        matches, groups = similar_pairs(ids, [s[index] for s in sets], threshold, num_perm, bands)
+        report["pairs"][kind] = [{"a": a, "b": b, "similarity": round(s, 3)} for a, b, s in matches]
+        report["clusters"][kind] = clusters(matches)
+        report["large_groups"][kind] = groups
+        for a, b, s in matches:
+            for x, y in ((a, b), (b, a)):
+                if s > duplicates.get(x, (0.0, None))[0]:
+                    duplicates[x] = (s, f"{kind} of {y}")
+
+    participants_out = []
+    for pid in ids:
+        signals = participant_signals(participants[pid])
+        signals["near_duplicate"] = float(pid in duplicates)
+        score, reasons = 1.0, []
+        for name, weight in PENALTIES.items():
+            value = signals.get(name)
+            if value:
+                score -= weight * value
+                reasons.append(f"{name}={value:.2f}")
+        if pid in duplicates:
+            reasons.append(f"similar to {duplicates[pid][1]} ({duplicates[pid][0]:.2f})")
+        participants_out.append({"participant_id": pid, "score": round(max(score, 0.0), 3),
+                                 "reasons": reasons, **signals})
+    participants_out.sort(key=lambda r: r["score"])
+    report["participants"] = participants_out
+    return report
+
+if __name__ == "__main__":
+    import argparse, json, time
+    from config import RESULTS_DIR
+
+    parser = argparse.ArgumentParser(description="Score participants and find near-duplicate sessions.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--threshold", type=float, default=0.8, help="estimated Jaccard similarity to report")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--min-score", type=float, default=0.7, help="list participants below this score")
+    parser.add_argument("--json", help="write the full report here")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    participants = load_participants(args.results_dir)
+    report = quality_report(participants, args.threshold, args.num_perm, args.bands)
+    elapsed = time.perf_counter() - start
+
+    flagged = [p for p in report["participants"] if p["score"] < args.min_score]
+    print(f"{'participant':<14} {'score':>6}  reasons")
+    for p in flagged:
+        print(f"{p['participant_id']:<14} {p['score']:>6.2f}  {', '.join(p['reasons'])}")
+    for kind in ("behaviour", "content"):
+        for cluster in report["clusters"][kind]:
+            print(f"[WARN] {kind} cluster of {len(cluster)} similar sessions: {', '.join(cluster)}")
+        for group in report["large_groups"][kind]:
+            print(f"[WARN] {len(group)} sessions share an identical {kind} band (e.g. all defaults)")
+    print(f"\n{len(participants)} participants, {len(flagged)} below {args.min_score}; {elapsed:.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,172 @@
+# scheduler.py
+"""
+Adaptive stimulus scheduling (opt-in with SPOOF_ADAPTIVE=1).
+
+Without it every participant gets a seeded random subset of the catalog, so
+stimuli that are already well measured keep being shown as often as those
+nobody has rated yet. With it, a session's stimuli are picked one trial at a
+time from the shared results index. That index is kept per stimulus by the
+state backend and updated on every saved trial; it counts how often the
+stimulus was assigned, answered and answered correctly. Assignments are
+counted in both modes, so pending trials of random-subset sessions are seen too.
+
+A stimulus's accuracy has the posterior Beta(1 + correct, 1 + trials - correct).
+Among the stimuli the participant has not seen, the next trial gets the one
+with the largest posterior variance, i.e. the one about which least is known.
+Stimuli that are assigned to running sessions but not answered yet count as
+observations at the posterior mean. Participants starting together therefore
+spread over different stimuli instead of all getting the same one. The label
+of each trial (bonafide, full or partial spoof) comes from a seeded, stratified
+sample of the catalog's labels, so every participant still sees the catalog's
+mix. Ties are broken with the plan's seed.
+
+The number of trials per participant does not change. Each pick is appended
+to the session's stimulus_ids, so a resumed session keeps its trials on any
+replica. Selection only has an effect when the catalog holds more stimuli
+than a session has trials. Check the precision reached so far with
+
+    python scheduler.py [--target 0.1] [--rebuild]
+"""
+import math
+from plan import plan_rng, extend_plan
+
+def posterior(entry):
+    """
+    (mean, variance) of a stimulus's accuracy from its results index entry, pending assignments included.
+    """
+    trials, correct = entry.get("trials", 0), entry.get("correct", 0)
+    pending = max(entry.get("assigned", 0) - trials, 0)
+    a, b = 1 + correct, 1 + trials - correct
+    mean = a / (a + b)
+    a, b = a + pending * mean, b + pending * (1 - mean)
+    return mean, a * b / ((a + b) ** 2 * (a + b + 1))
+
+def label_sequence(plan, catalog):
+    """
+    Label of each of the plan's trials: a stratified sample of the catalog's labels in seeded order.
+    """
+    labels = sorted(s["label"] for s in catalog["stimuli"])
+    step = len(labels) / plan["n_trials"]
+    sequence = [labels[int(i * step)] for i in range(plan["n_trials"])]
+    plan_rng(plan["seed"], plan["catalog_version"], "adaptive_labels").shuffle(sequence)
+    return sequence
+
+def pick_stimulus(plan, catalog, stats):
+    """
+    Stimulus id for the plan's next trial, or None when every stimulus was already used.
+    """
+    position = len(plan["stimulus_ids"])
+    used = set(plan["stimulus_ids"])
+    candidates = sorted((s for s in catalog["stimuli"] if s["stimulus_id"] not in used), key=lambda s: s["stimulus_id"])
+    if not candidates:
+        return None
+    label = label_sequence(plan, catalog)[position]
+    candidates = [s for s in candidates if s["label"] == label] or candidates
+    rng = plan_rng(plan["seed"], plan["catalog_version"], f"adaptive:{position}")
+    scored = [(round(posterior(stats.get(s["stimulus_id"], {}))[1], 12), rng.random(), s["stimulus_id"])
+              for s in candidates]
+    return max(scored)[2]
+
+def schedule_next(storage, plan, catalog, instruction_versions):
+    """
+    Picks the stimulus of the session's next trial, records the assignment and persists it.
+    Returns the extended plan (the unchanged plan if nothing is left to pick).
+    """
+    try:
+        stats = storage.backend.load_stimulus_stats()
+    except Exception as e:
+        print(f"[WARN] Results index unavailable, scheduling without it: {e}")
+        stats = {}
+    stimulus_id = pick_stimulus(plan, catalog, stats)
+    if stimulus_id is None:
+        print(f"[WARN] No unused stimulus left for {storage.participant_id}")
+        return plan
+    plan = extend_plan(plan, catalog, instruction_versions, stimulus_id)
+    storage.session_data["stimulus_ids"] = plan["stimulus_ids"]
+    storage.save_session_data()
+    record_stimulus(storage.backend, stimulus_id, assigned=1)
+    return plan
+
+def record_stimulus(backend, stimulus_id, **counts):
+    """
+    Adds counts to the results index. Failures never interrupt the participant.
+    """
+    try:
+        backend.update_stimulus_stats(stimulus_id, counts)
+    except Exception as e:
+        print(f"[WARN] Results index update failed for {stimulus_id}: {e}")
+
+def assign_plan(backend, session_data):
+    """
+    Counts the stimuli of a new non-adaptive plan as assigned, so sessions of both modes show up as
+    pending in the results index. Stimuli of trials answered before the index existed are left out.
+    """
+    for stimulus_id in session_data["stimulus_ids"][session_data.get("trial_index", 0):]:
+        record_stimulus(backend, stimulus_id, assigned=1)
+    session_data["stimuli_assigned"] = True
+
+def release_unanswered(backend, session, answered):
+    """
+    Takes back the assignments of a session that ends without answering them,
+    so they no longer count as pending.
+    """
+    if backend is not None and (session.get("adaptive") or session.get("stimuli_assigned")):
+        for stimulus_id in session.get("stimulus_ids", [])[answered:]:
+            record_stimulus(backend, stimulus_id, assigned=-1)
+
+def precision_report(catalog, stats, target):
+    """
+    Rows of (stimulus id, label, trials, mean, 95% half-width) and how many stimuli reached target.
+    """
+    rows = []
+    for s in sorted(catalog["stimuli"], key=lambda s: s["stimulus_id"]):
+        entry = stats.get(s["stimulus_id"], {})
+        trials, correct = entry.get("trials", 0), entry.get("correct", 0)
+        a, b = 1 + correct, 1 + trials - correct
+        half_width = 1.96 * math.sqrt(a * b / ((a + b) ** 2 * (a + b + 1)))
+        rows.append((s["stimulus_id"], s["label"], trials, a / (a + b), half_width))
+    return rows, sum(r[4] <= target for r in rows)
+
+def rebuild_stats(results_dir, backend):
+    """
+    Fills an empty results index from the saved trials (e.g. after switching backends).
+    """
+    from archive import iter_result_records
+    from helpers import summary_row
+
+    if backend.load_stimulus_stats():
+        raise RuntimeError("The results index is not empty, rebuilding would count trials twice")
+    counts = {}
+    for rec in iter_result_records(results_dir):
+        if not rec.get("stimulus_id"):
+            continue
+        correct = summary_row(rec.get("trial_index", 0), rec, float(rec.get("trial_duration") or 60.0))["correct"]
+        entry = counts.setdefault(rec["stimulus_id"], {"assigned": 0, "trials": 0, "correct": 0})
+        entry["assigned"] += 1
+        entry["trials"] += 1
+        entry["correct"] += int(correct)
+    for stimulus_id, entry in counts.items():
+        backend.update_stimulus_stats(stimulus_id, entry)
+    return sum(e["trials"] for e in counts.values())
+
+if __name__ == "__main__":
+    import argparse
+    from config import RESULTS_DIR
+    from backend import get_backend
+    from catalog import load_catalog
+
+    parser = argparse.ArgumentParser(description="Per-stimulus precision from the shared results index.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--target", type=float, default=0.1, help="95%% interval half-width counted as measured")
+    parser.add_argument("--rebuild", action="store_true", help="fill an empty index from the saved trials first")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    if args.rebuild:
+        print(f"Added {rebuild_stats(args.results_dir, backend)} trials to the results index")
+    catalog = load_catalog()
+    rows, reached = precision_report(catalog, backend.load_stimulus_stats(), args.target)
+    print(f"{'stimulus':<28} {'label':<14} {'trials':>6} {'acc':>6} {'±95%':>6}")
+    for stimulus_id, label, trials, mean, half_width in rows:
+        print(f"{stimulus_id:<28} {label:<14} {trials:>6} {mean:>6.2f} {half_width:>6.2f}")
+    print(f"\n{reached}/{len(rows)} stimuli within ±{args.target}")
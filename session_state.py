@@ -1,109 +1,99 @@
 import streamlit as st
-import hashlib, datetime, json, os, random, glob
+import datetime, os
 from loader import Loader
-from config import PROJECT_DIR, RESULTS_DIR, INSTRUCTIONS
+from config import PROJECT_DIR, RESULTS_DIR, INSTRUCTIONS, ADAPTIVE_SCHEDULING
 from storage import Storage
+from backend import get_backend
+from plan import session_plan, persisted_fields
+from scheduler import schedule_next, assign_plan
 
 def init_session_state(test_subsample=None):
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
     query_params = st.query_params
+    backend = get_backend()
 
-    if "participant_id" in query_params:
-        participant_id = query_params["participant_id"][0]
-    elif "participant_id" in st.session_state:
-        participant_id = st.session_state.participant_id
-    else:
-        participant_id = hashlib.sha256(
-            datetime.datetime.now().isoformat().encode()
-        ).hexdigest()[:10]
+    # A participant_id in the URL resumes that participant on any replica, if the backend knows it
+    participant_id = query_params.get("participant_id")
+    if (participant_id and participant_id != st.session_state.get("participant_id")
+            and backend.load_session(participant_id) is None):
+        print(f"[WARN] Unknown participant_id {participant_id} in URL, allocating a new one")
+        participant_id = None
+    if not participant_id:
+        participant_id = st.session_state.get("participant_id")
+    if not participant_id:
+        participant_id = backend.new_participant_id({"created_at": datetime.datetime.now().isoformat()})
 
     st.session_state.participant_id = participant_id
     
     if "prolific_id" in query_params:
-        prolific_id = query_params["prolific_id"][0]
+        prolific_id = query_params["prolific_id"]
     elif "prolific_id" in st.session_state:
         prolific_id = st.session_state.prolific_id
     else:
         prolific_id = "unknown"
 
     st.session_state.prolific_id = prolific_id
-    st.query_params = {"participant_id": [participant_id]}
+    if query_params.get("participant_id") != participant_id:
+        st.query_params["participant_id"] = participant_id
     
     if "storage" not in st.session_state:
-        st.session_state.storage = Storage()
+        st.session_state.storage = Storage(participant_id, prolific_id, backend)
     storage = st.session_state.storage
 
-    if storage.session_data.get("valence_condition"):
-        st.session_state.valence_condition = storage.session_data["valence_condition"]
-    else:
-        st.session_state.valence_condition = random.choice(["HVHA", "LVHA"])
-        storage.session_data["valence_condition"] = st.session_state.valence_condition
-        storage.save_session_data()  
+    # Every per-participant random choice comes from the seed-derived plan
+    if "plan" not in st.session_state or "all_trials" not in st.session_state:
+        # The loader is only needed while building the trial list, so it is not kept in the session
+        loader = Loader(PROJECT_DIR)
+        plan, created = session_plan(storage.session_data, loader.catalog, INSTRUCTIONS, n_trials=test_subsample,
+                                     adaptive=ADAPTIVE_SCHEDULING)
+        if created:
+            for key in ("all_trials", "trial_order", "trial_affect_mapping", "valence_condition", "instruction_version"):
+                storage.session_data.pop(key, None)  # superseded by the plan
+            storage.session_data.update(persisted_fields(plan))
+            if not plan.get("adaptive"):
+                assign_plan(backend, storage.session_data)
+            storage.save_session_data()
+            storage.update_progress(
+                status="active",
+                started_at=storage.session_data.get("created_at") or datetime.datetime.now().isoformat(),
+                trial_index=storage.session_data.get("trial_index", 0),
+                n_trials=plan.get("n_trials", len(plan["stimulus_ids"])),
+                valence_condition=plan["valence_condition"],
+                instruction_version=plan["instruction_version"],
+                prolific_id=prolific_id,
+                queue_wait_s=st.session_state.get("queue_wait_s", 0.0),
+            )
+        st.session_state.plan = plan
+        st.session_state.all_trials = loader.build_trials(plan)
+    plan = st.session_state.plan
 
-    if 'loader' not in st.session_state:
-        st.session_state.loader = Loader(PROJECT_DIR, valence_condition=st.session_state.valence_condition)
-        st.session_state.affect_imgs = st.session_state.loader.load_affect_images()
+    st.session_state.valence_condition = plan["valence_condition"]
+    st.session_state.instruction_version = plan["instruction_version"]
 
     st.session_state.emergency_quit = st.session_state.get("emergency_quit", False)
     st.session_state.refresh_occurred = st.session_state.get("refresh_occurred", False)
 
-    if "all_trials" not in st.session_state:
-        saved_trials = storage.session_data.get("all_trials")
-        
-        if saved_trials:
-            print("Restoring trials from saved session")
-            st.session_state.all_trials = saved_trials
-        else:
-            trials = st.session_state.loader.load_trials()
-            if test_subsample:
-                trials = trials[:test_subsample]
-            st.session_state.all_trials = trials
-            
-            storage.session_data["all_trials"] = trials
-            storage.save_session_data()
+    st.session_state.trial_index = storage.session_data.get("trial_index", 0)
 
-    st.session_state.trial_order = storage.session_data.get("trial_order")
-    if not st.session_state.trial_order:
-        st.session_state.trial_order = list(range(len(st.session_state.all_trials)))
-        random.shuffle(st.session_state.trial_order) 
-        storage.session_data["trial_order"] = st.session_state.trial_order
-        storage.save_session_data()
+    # Adaptive plans get the stimulus of a trial only once the participant reaches it
+    if plan.get("adaptive") and len(plan["stimulus_ids"]) <= st.session_state.trial_index < plan["n_trials"]:
+        loader = Loader(PROJECT_DIR)
+        plan = st.session_state.plan = schedule_next(storage, plan, loader.catalog, INSTRUCTIONS)
+        st.session_state.all_trials = loader.build_trials(plan)
+    st.session_state.trial_order = list(range(plan.get("n_trials", len(st.session_state.all_trials))))
 
-    if "trial_affect_mapping" not in storage.session_data or not storage.session_data["trial_affect_mapping"]:
-        affect_pool = st.session_state.affect_imgs.copy()
-        random.shuffle(affect_pool)
-        trial_affect_mapping = {}
-        num_trials = len(st.session_state.all_trials)
-        if len(affect_pool) < num_trials:
-            # If not enough images, cycle through them
-            affect_pool = affect_pool * ((num_trials // len(affect_pool)) + 1)
-        for i in range(num_trials):
-            trial_affect_mapping[i] = affect_pool[i]
-            st.session_state.all_trials[i]["affect_image"] = affect_pool[i]["path"]
-            st.session_state.all_trials[i]["quadrant"] = affect_pool[i]["quadrant"]
-        storage.session_data["trial_affect_mapping"] = trial_affect_mapping
-        storage.save_session_data()
-    else:
-        trial_affect_mapping = storage.session_data["trial_affect_mapping"]
-        for trial_idx, affect_data in trial_affect_mapping.items():
-            trial_idx = int(trial_idx)  # JSON keys are strings
-            if trial_idx < len(st.session_state.all_trials):
-                st.session_state.all_trials[trial_idx]["affect_image"] = affect_data["path"]
-                st.session_state.all_trials[trial_idx]["quadrant"] = affect_data["quadrant"]
-    st.session_state.trial_affect_mapping = trial_affect_mapping
-
-    st.session_state.trial_index = storage.session_data.get("trial_index", 0)
-    
-    st.session_state.instruction_version = storage.session_data.get("instruction_version")
-    if not st.session_state.instruction_version:
-        st.session_state.instruction_version = random.choice(list(INSTRUCTIONS.keys()))
-        storage.session_data["instruction_version"] = st.session_state.instruction_version
+    # Restore in-progress annotations replayed from the journal
+    resumed = storage.journal.resume()
+    for key, journal_key in [
+        ("segments_by_trial", "segments"),
+        ("flags_by_trial", "flags"),
+        ("responses_by_trial", "responses"),
+    ]:
+        if key not in st.session_state:
+            st.session_state[key] = resumed[journal_key]
 
     for key in [
-        "segments_by_trial",
-        "flags_by_trial",
-        "responses_by_trial",
         "action_log_by_trial",
         "saved_trials",
         "all_trials_restored"
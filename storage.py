@@ -1,53 +1,81 @@
 # storage.py
-import os, json, datetime
-from config import RESULTS_DIR
-from helpers import datetime_converter
+import os, json, datetime, time
+from config import RESULTS_DIR, JOURNAL_COMPACT_EVERY
+from helpers import datetime_converter, summary_row
+from journal import TrialJournal
+from backend import get_backend
+from action_log import as_records
+from scheduler import record_stimulus
 import streamlit as st
-from github import Github
 
 class Storage:
     """
-    Handles saving and loading of participant session and trial data.
+    Handles saving and loading of participant session and trial data through the shared state backend.
     """
-    def __init__(self):
-        self.participant_id = st.session_state.participant_id
-        self.prolific_id = st.session_state.prolific_id
+    def __init__(self, participant_id=None, prolific_id=None, backend=None):
+        self.backend = backend or get_backend()
+        self.participant_id = participant_id or st.session_state.participant_id
+        self.prolific_id = prolific_id or st.session_state.get("prolific_id", "unknown")
+        # Local path kept for naming derived files (aggregate) next to the participant's results
         self.session_file = os.path.join(RESULTS_DIR, f"participant_{self.participant_id}_session.json")
-        
-        if os.path.exists(self.session_file):
-            with open(self.session_file, "r") as f:
-                self.session_data = json.load(f)
-        else:
-            st.query_params = {}
+
+        session_data = self.backend.load_session(self.participant_id)
+        if session_data is None:
             self.session_data = {}
             self.save_session_data()
+        else:
+            self.session_data = session_data
+
+        self.journal = TrialJournal(self.backend, self.participant_id, compact_every=JOURNAL_COMPACT_EVERY)
+        # The journal is ahead of the session record if the app stopped between the two writes of a save
+        resumed_index = self.journal.state["trial_index"]
+        if resumed_index > self.session_data.get("trial_index", 0):
+            self.session_data["trial_index"] = resumed_index
+        self.pending_uploads = None  # read from the progress index on the first upload
+
+    def update_progress(self, **fields):
+        """
+        Updates the participant's entry in the progress index. Failures never interrupt the participant.
+        """
+        try:
+            self.backend.update_progress(self.participant_id, {**fields, "updated_at": time.time()})
+        except Exception as e:
+            print(f"[WARN] Progress index update failed for {self.participant_id}: {e}")
+
+    def note_upload(self, name, ok):
+        """
+        Tracks the upload backlog: a failed upload stays pending until the same name succeeds.
+        """
+        if self.pending_uploads is None:
+            try:
+                entry = self.backend.load_progress().get(self.participant_id, {})
+            except Exception as e:
+                print(f"[WARN] Could not read progress index: {e}")
+                entry = {}
+            self.pending_uploads = list(entry.get("pending_uploads", []))
+        if ok == (name not in self.pending_uploads):
+            return
+        if ok:
+            self.pending_uploads.remove(name)
+        else:
+            self.pending_uploads.append(name)
+        self.update_progress(pending_uploads=self.pending_uploads)
 
     def load_all_trials(self):
         """
         Loads all saved trials for the participant.
         """
-        trial_files = sorted(
-            [f for f in os.listdir(RESULTS_DIR) if f.startswith(f"participant_{self.participant_id}_trial_")],
-            key=lambda x: int(x.split("_")[-1].split(".")[0])
-        )
-        all_trials = {}
-        for f in trial_files:
-            with open(os.path.join(RESULTS_DIR, f), "r") as tf:
-                data = json.load(tf)
-                all_trials[data["trial_index"]] = data
-        return all_trials
+        return self.backend.load_trials(self.participant_id)
     
     def save_session_data(self):
         """
-        Saves session data to a JSON file.
+        Saves the session record to the backend.
         """
-        session_file = os.path.join(RESULTS_DIR, f"participant_{self.participant_id}_session.json")
-        with open(session_file, "w") as f:
-            json.dump(self.session_data, f, indent=2)
+        self.backend.save_session(self.participant_id, self.session_data)
             
     def save_trial(self, trial_idx, extra_metadata=None):
         """
-        Saves data for a single trial to a JSON file.
+        Saves data for a single trial to the backend.
         """
         trial = st.session_state.all_trials[trial_idx]
         
@@ -64,7 +92,10 @@ class Storage:
             "trial_index": trial_idx,
             "trial_number": trial_idx + 1,  
             "affect_image": os.path.basename(trial.get("affect_image") or ""),
+            "quadrant": trial.get("quadrant"),
             "audio": os.path.basename(trial.get("video") or ""),            
+            "stimulus_id": trial.get("stimulus_id"),
+            "generator": trial.get("generator"),
             "gt_label": gt_label,
             "gt_segments": gt_segments,  
             "gt_segments_raw": trial.get('spoof_segment_times', ''),  
@@ -73,7 +104,7 @@ class Storage:
             "segments": st.session_state.segments_by_trial.get(trial_idx, []),
             "flags": st.session_state.flags_by_trial.get(trial_idx, []),
             "responses": st.session_state.responses_by_trial.get(trial_idx, {}),
-            "action_log": st.session_state.action_log_by_trial.get(trial_idx, []),
+            "action_log": as_records(st.session_state.action_log_by_trial.get(trial_idx)),
 
             # Timing 
             "trial_start_time": str(st.session_state.get(f"trial_{trial_idx}_start_time")),
@@ -85,11 +116,16 @@ class Storage:
         if extra_metadata:
             trial_data.update(extra_metadata)
 
-        trial_file = os.path.join(RESULTS_DIR, f"participant_{self.participant_id}_trial_{trial_idx}.json")
-        with open(trial_file, "w") as f:
-            json.dump(trial_data, f, indent=2)
+        self.backend.save_trial(self.participant_id, trial_idx, trial_data)
 
-        self.session_data["trial_index"] = trial_idx + 1        
+        summary = summary_row(trial_idx, trial_data, float(trial.get("duration", 60.0)))
+        self.journal.append("trial_completed", trial_idx, summary=summary)
+        if trial.get("stimulus_id"):
+            record_stimulus(self.backend, trial["stimulus_id"], trials=1, correct=int(summary["correct"]))
+        # The session record is what resume, archive.completed_participants and the janitor read first
+        self.session_data["trial_index"] = trial_idx + 1
+        self.save_session_data()
+        self.update_progress(trial_index=trial_idx + 1, last_saved_at=trial_data["timestamp"])
         return trial_data
 
 def save_to_github(trial_metadata, file_name):
@@ -97,6 +133,8 @@ def save_to_github(trial_metadata, file_name):
     repo_name = st.secrets["github"]["repo"]
     branch = st.secrets["github"].get("branch", "main")
 
+    from github import Github
+
     g = Github(token)
     repo = g.get_repo(repo_name)
     content = json.dumps(trial_metadata, indent=2, default=datetime_converter)
@@ -105,4 +143,43 @@ def save_to_github(trial_metadata, file_name):
         file = repo.get_contents(file_name, ref=branch)
         repo.update_file(file.path, f"Update {file_name}", content, file.sha, branch=branch)
     except:
-        repo.create_file(file_name, f"Add {file_name}", content, branch=branch)
\ No newline at end of file
+        repo.create_file(file_name, f"Add {file_name}", content, branch=branch)
+
+def save_file_to_github(local_path, file_name):
+    """
+    Uploads a local (possibly binary) file, e.g. an archive bundle.
+    """
+    token = st.secrets["github"]["token"]
+    repo_name = st.secrets["github"]["repo"]
+    branch = st.secrets["github"].get("branch", "main")
+
+    from github import Github
+
+    g = Github(token)
+    repo = g.get_repo(repo_name)
+    with open(local_path, "rb") as f:
+        content = f.read()
+
+    try:
+        file = repo.get_contents(file_name, ref=branch)
+        repo.update_file(file.path, f"Update {file_name}", content, file.sha, branch=branch)
+    except:
+        repo.create_file(file_name, f"Add {file_name}", content, branch=branch)
+
+def github_file_matches(local_path, file_name):
+    """
+    True if file_name in the results repository has exactly the content of local_path.
+    Compares git blob hashes, so nothing is downloaded.
+    """
+    import hashlib
+    from github import Github
+
+    token = st.secrets["github"]["token"]
+    repo_name = st.secrets["github"]["repo"]
+    branch = st.secrets["github"].get("branch", "main")
+
+    with open(local_path, "rb") as f:
+        content = f.read()
+    local_sha = hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+    remote = Github(token).get_repo(repo_name).get_contents(file_name, ref=branch)
+    return remote.sha == local_sha
@@ -0,0 +1,27 @@
+# tests/conftest.py
+import os, sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def file_backend(tmp_path):
+    from backend import FileBackend
+    return FileBackend(str(tmp_path / "state"))
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    from backend import SQLiteBackend
+    return SQLiteBackend(str(tmp_path / "state.sqlite3"))
+
+@pytest.fixture
+def session_state():
+    """
+    st.session_state in bare mode (no script run), emptied before and after the test.
+    """
+    import streamlit as st
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    yield st.session_state
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
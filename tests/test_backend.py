@@ -0,0 +1,72 @@
+# tests/test_backend.py
+import multiprocessing
+import pytest
+from backend import FileBackend, SQLiteBackend
+
+WORKERS, UPDATES = 4, 500
+
+def open_backend(kind, path):
+    return FileBackend(path) if kind == "file" else SQLiteBackend(path)
+
+@pytest.fixture(params=["file", "sqlite"])
+def backend_path(request, tmp_path):
+    return request.param, str(tmp_path / ("state" if request.param == "file" else "state.sqlite3"))
+
+def test_round_trip(backend_path):
+    backend = open_backend(*backend_path)
+    assert backend.reserve_participant_id("p1", {"trial_index": 0})
+    assert not backend.reserve_participant_id("p1", {})
+    backend.save_session("p1", {"trial_index": 2, "stimulus_ids": ["a", "b"]})
+    backend.save_trial("p1", 1, {"trial_index": 1, "answer": "x"})
+    backend.save_trial("p1", 0, {"trial_index": 0, "answer": "y"})
+    backend.update_progress("p1", {"trial_index": 1, "status": "running"})
+    backend.update_progress("p1", {"trial_index": 2})
+    backend.update_stimulus_stats("a", {"assigned": 1})
+    backend.update_stimulus_stats("a", {"trials": 1, "correct": 1})
+
+    # A second instance stands for another replica
+    other = open_backend(*backend_path)
+    assert other.load_session("p1") == {"trial_index": 2, "stimulus_ids": ["a", "b"]}
+    assert list(other.load_trials("p1")) == [0, 1]
+    assert other.load_progress() == {"p1": {"trial_index": 2, "status": "running"}}
+    assert other.load_stimulus_stats() == {"a": {"assigned": 1, "trials": 1, "correct": 1}}
+
+def test_file_compaction_keeps_the_index(tmp_path):
+    backend = FileBackend(str(tmp_path))
+    for i in range(30):
+        backend.update_progress(f"p{i % 3}", {"trial_index": i})
+        backend.update_stimulus_stats(f"s{i % 3}", {"assigned": 1})
+    progress, stats = backend.load_progress(), backend.load_stimulus_stats()
+    assert backend.compact_progress() and backend.compact_stimulus_stats()
+    with open(backend.progress_file) as f:
+        assert len(f.readlines()) == 3
+    other = FileBackend(str(tmp_path))
+    assert other.load_progress() == progress and other.load_stimulus_stats() == stats
+    # The replica that compacted re-reads the new file
+    backend.update_stimulus_stats("s0", {"assigned": 1})
+    assert backend.load_stimulus_stats()["s0"]["assigned"] == 11
+
+def append_updates(kind, path, worker):
+    backend = open_backend(kind, path)
+    for i in range(UPDATES):
+        backend.update_progress(f"w{worker}", {"trial_index": i + 1})
+        backend.update_stimulus_stats("shared", {"assigned": 1})
+
+def test_concurrent_appends_survive_compaction(backend_path):
+    kind, path = backend_path
+    backend = open_backend(kind, path)
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=append_updates, args=(kind, path, w)) for w in range(WORKERS)]
+    for p in workers:
+        p.start()
+    while any(p.is_alive() for p in workers):
+        if kind == "file":
+            backend.compact_progress(min_lines_per_entry=1)
+            backend.compact_stimulus_stats(min_lines_per_entry=1)
+    for p in workers:
+        p.join()
+        assert p.exitcode == 0
+
+    other = open_backend(kind, path)
+    assert other.load_stimulus_stats()["shared"]["assigned"] == WORKERS * UPDATES
+    assert other.load_progress() == {f"w{w}": {"trial_index": UPDATES} for w in range(WORKERS)}
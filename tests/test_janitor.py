@@ -0,0 +1,65 @@
+# tests/test_janitor.py
+import os, time
+import pytest
+from streamlit.testing.v1 import AppTest
+from archive import read_bundle, bundle_path
+from janitor import sweep
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOURS = 3600
+
+@pytest.fixture
+def app_backend(tmp_path, monkeypatch):
+    """
+    A file backend in tmp_path used by the app, with the janitor thread off.
+    """
+    import backend, config
+    state = backend.FileBackend(str(tmp_path))
+    monkeypatch.setattr(backend, "_backend", state)
+    monkeypatch.setattr(config, "JANITOR_ENABLED", False)
+    monkeypatch.chdir(PROJECT_DIR)
+    return state
+
+def run_session(answered=None):
+    """
+    Runs the app as one participant who answers `answered` trials (all by default) and leaves.
+    """
+    at = AppTest.from_file(os.path.join(PROJECT_DIR, "app.py"), default_timeout=60).run()
+    assert not at.exception, at.exception
+    [b for b in at.button if b.label == "I understand."][0].click().run()
+    n_trials = len(at.session_state.trial_order) if answered is None else answered
+    for _ in range(n_trials):
+        [b for b in at.button if b.label == "Add segment"][0].click().run()
+        [b for b in at.button if b.label == "Save and Continue"][0].click().run()
+        at.run()
+        assert not at.exception, at.exception
+    return at.session_state.participant_id
+
+def test_finished_session_without_submit_is_bundled_as_completed(app_backend):
+    pid = run_session()
+    stats = sweep(app_backend.results_dir, app_backend, now=time.time() + 49 * HOURS)
+
+    assert stats["bundled"] == 1 and stats["abandoned_archived"] == 0
+    bundle = read_bundle(bundle_path(app_backend.results_dir, pid))
+    assert bundle["aggregate"]["completion_status"] == "completed"
+    assert len(bundle["trials"]) == len(bundle["aggregate"]["summary"]) == app_backend.load_session(pid)["trial_index"]
+    assert app_backend.load_progress()[pid]["status"] == "completed"
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_abandoned_session_releases_what_it_did_not_answer(app_backend, monkeypatch, adaptive):
+    import session_state
+    monkeypatch.setattr(session_state, "ADAPTIVE_SCHEDULING", adaptive)
+    pid = run_session(answered=3)
+    session = app_backend.load_session(pid)
+    assert session["trial_index"] == 3 and bool(session.get("adaptive")) == adaptive
+
+    later = time.time() + 49 * HOURS
+    stats = sweep(app_backend.results_dir, app_backend, now=later)
+    assert stats["abandoned_archived"] == 1
+    assert stats["assignments_released"] == len(session["stimulus_ids"]) - 3
+    counts = app_backend.load_stimulus_stats().values()
+    assert sum(c["assigned"] for c in counts) == sum(c["trials"] for c in counts) == 3
+
+    # Released once only
+    assert sweep(app_backend.results_dir, app_backend, now=later + HOURS)["assignments_released"] == 0
+    assert sum(c["assigned"] for c in app_backend.load_stimulus_stats().values()) == 3
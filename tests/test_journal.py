@@ -0,0 +1,92 @@
+# tests/test_journal.py
+import pytest
+from journal import TrialJournal
+
+def segment(i, start=1.0, end=2.0):
+    return {"id": f"seg{i}", "start": start, "end": end, "timestamp": ""}
+
+def summary(trial_idx, correct=True):
+    return {"trial_number": trial_idx + 1, "gt_type": "bonafide", "correct": correct,
+            "participant_segments": [], "participant_flags": []}
+
+@pytest.fixture(params=["file", "sqlite"])
+def backend(request, file_backend, sqlite_backend):
+    return file_backend if request.param == "file" else sqlite_backend
+
+def test_replay_after_crash(backend):
+    journal = TrialJournal(backend, "p1", compact_every=50)
+    journal.append("segment_added", 0, segment=segment(1))
+    journal.append("segment_added", 0, segment=segment(2))
+    journal.append("segment_updated", 0, segment=segment(2, 3.0, 4.0))
+    journal.append("flag_added", 0, flag={"id": "f1", "time": 1.5, "timestamp": ""})
+    journal.append("segment_removed", 0, id="seg1")
+    journal.append("response_changed", 0, question="q", answer="a")
+
+    # A new process only has what reached the backend
+    resumed = TrialJournal(backend, "p1", compact_every=50)
+    assert resumed.seq == journal.seq == 6
+    assert resumed.state == journal.state
+    assert resumed.state["segments"][0] == [segment(2, 3.0, 4.0)]
+    assert resumed.state["flags"][0][0]["time"] == 1.5
+    assert resumed.state["responses"][0] == {"q": "a"}
+
+def test_trial_completed_compacts_and_keeps_running_aggregate(backend):
+    journal = TrialJournal(backend, "p1", compact_every=50)
+    journal.append("segment_added", 0, segment=segment(1))
+    journal.append("trial_completed", 0, summary=summary(0))
+    journal.append("trial_completed", 1, summary=summary(1, correct=False))
+
+    snapshot, records = backend.load_journal("p1")
+    assert snapshot["seq"] == 3 and records == []
+    resumed = TrialJournal(backend, "p1")
+    assert resumed.state["trial_index"] == 2
+    assert resumed.state["segments"] == {}
+    rows, scores = resumed.aggregate()
+    assert [r["trial_number"] for r in rows] == [1, 2]
+    assert scores["trials"] == 2 and scores["correct"] == 1
+
+def test_compaction_every_n_operations(backend):
+    journal = TrialJournal(backend, "p1", compact_every=3)
+    for i in range(7):
+        journal.append("flag_added", 0, flag={"id": f"f{i}", "time": float(i), "timestamp": ""})
+    snapshot, records = backend.load_journal("p1")
+    assert snapshot["seq"] == 6
+    assert [r["seq"] for r in records] == [7]
+    assert len(TrialJournal(backend, "p1").state["flags"][0]) == 7
+
+def test_records_covered_by_snapshot_are_not_replayed(backend):
+    journal = TrialJournal(backend, "p1", compact_every=50)
+    first = journal.append("flag_added", 0, flag={"id": "f1", "time": 1.0, "timestamp": ""})
+    journal.compact()
+    # A crash during compaction can leave records the snapshot already covers
+    backend.append_journal("p1", first)
+    journal.append("flag_added", 0, flag={"id": "f2", "time": 2.0, "timestamp": ""})
+    resumed = TrialJournal(backend, "p1")
+    assert [f["id"] for f in resumed.state["flags"][0]] == ["f1", "f2"]
+    assert resumed.seq == 2
+
+def test_storage_resume_takes_the_journal_trial_index(file_backend):
+    from storage import Storage
+
+    file_backend.save_session("p1", {"trial_index": 1})
+    journal = TrialJournal(file_backend, "p1")
+    for i in range(3):
+        journal.append("trial_completed", i, summary=summary(i))
+    assert Storage("p1", "prolific", file_backend).session_data["trial_index"] == 3
+
+def test_save_trial_persists_trial_index(file_backend, session_state):
+    from storage import Storage
+
+    trials = [{"stimulus_id": f"s{i}", "video": f"v{i}.mp4", "duration": 10.0} for i in range(3)]
+    session_state.update(
+        participant_id="p1", instruction_version="new_tech", valence_condition="HVHA", all_trials=trials,
+        gt_type="bonafide", gt_intervals=[], segments_by_trial={}, flags_by_trial={}, responses_by_trial={},
+        action_log_by_trial={},
+    )
+    storage = Storage("p1", "prolific", file_backend)
+    for i in range(2):
+        storage.save_trial(i)
+
+    assert file_backend.load_session("p1")["trial_index"] == 2
+    assert sorted(file_backend.load_trials("p1")) == [0, 1]
+    assert file_backend.load_progress()["p1"]["trial_index"] == 2
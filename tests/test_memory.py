@@ -0,0 +1,24 @@
+# tests/test_memory.py
+from memory import deep_sizeof, session_memory_report, enforce_memory_budget
+
+def test_shared_backend_is_not_counted(file_backend, session_state):
+    from storage import Storage
+
+    for i in range(50):
+        file_backend.update_progress(f"other{i}", {"trial_index": i, "notes": "x" * 1000})
+    file_backend.load_progress()
+    storage = Storage("p1", "prolific", file_backend)
+    assert deep_sizeof(storage.backend) == 0
+    session_state["storage"] = storage
+    total, _ = session_memory_report()
+    assert total < 50 * 1000
+
+def test_budget_evicts_completed_trials(session_state):
+    session_state.update(
+        participant_id="p1", trial_index=2,
+        segments_by_trial={0: [{"id": "s", "note": "x" * 5000}], 2: []},
+        flags_by_trial={1: [{"id": "f", "time": 1.0}]},
+    )
+    total = enforce_memory_budget(1000)
+    assert total <= 1000
+    assert list(session_state["segments_by_trial"]) == [2] and session_state["flags_by_trial"] == {}
@@ -0,0 +1,40 @@
+# tests/test_plan.py
+from plan import session_plan, persisted_fields, extend_plan
+
+INSTRUCTION_VERSIONS = ["monitor_attacks", "new_tech"]
+
+def make_catalog(version="v1", n_stimuli=12, extra_images=0):
+    labels = ["partial_spoof", "bonafide", "full_spoof"]
+    return {
+        "version": version,
+        "stimuli": [{"stimulus_id": f"s{i:02d}", "label": labels[i % 3]} for i in range(n_stimuli)],
+        "affect_images": [{"path": f"img/{q}_{i}.jpg", "quadrant": q}
+                          for q in ("HVHA", "LVHA") for i in range(3 + extra_images)],
+    }
+
+def resume(plan, catalog):
+    regenerated, created = session_plan(persisted_fields(plan), catalog, INSTRUCTION_VERSIONS)
+    assert not created
+    return regenerated
+
+def test_plan_regenerates_from_persisted_fields():
+    catalog = make_catalog()
+    plan, created = session_plan({}, catalog, INSTRUCTION_VERSIONS, n_trials=8)
+    assert created
+    assert resume(plan, catalog) == plan
+
+def test_plan_survives_catalog_rebuild():
+    catalog = make_catalog()
+    plan, _ = session_plan({}, catalog, INSTRUCTION_VERSIONS, n_trials=8)
+    rebuilt = make_catalog(version="v2", n_stimuli=20, extra_images=4)
+    assert resume(plan, rebuilt) == plan
+
+def test_adaptive_plan_extends_without_changing_earlier_trials():
+    catalog = make_catalog()
+    plan, _ = session_plan({}, catalog, INSTRUCTION_VERSIONS, n_trials=8, adaptive=True)
+    assert plan["stimulus_ids"] == [] and plan["n_trials"] == 8
+    first = extend_plan(plan, catalog, INSTRUCTION_VERSIONS, "s03")
+    second = extend_plan(first, catalog, INSTRUCTION_VERSIONS, "s07")
+    for key in ("stimulus_ids", "affect_images", "trust_cues", "sanity_checks"):
+        assert second[key][:1] == first[key]
+    assert resume(second, make_catalog(version="v2", extra_images=2)) == second
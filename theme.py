@@ -0,0 +1,80 @@
+# theme.py
+"""
+Shared button theme. Each style is defined once and injected once per page by
+config.apply_styling; widgets opt in by being placed inside a `themed` container,
+whose key becomes a CSS class (st-key-theme-<style>--<suffix>) matched by the
+style's selector. Adding more annotations therefore adds no CSS to a rerun.
+"""
+import streamlit as st
+
+_BUTTON_BASE = {
+    "color": "black !important",
+    "border-radius": "10px !important",
+    "cursor": "pointer",
+    "box-shadow": "2px 2px 6px rgba(0,0,0,0.2)",
+}
+_BUTTON_HOVER = {
+    "background-color": "#85A0A8 !important",
+    "box-shadow": "3px 3px 8px rgba(0,0,0,0.3)",
+}
+
+BUTTON_STYLES = {
+    "start": {
+        "button": {**_BUTTON_BASE, "background-color": "#73FFC2 !important", "color": "white !important",
+                   "font-size": "100px !important", "border": "2px solid #361F27 !important", "padding": "5px 10px"},
+        "hover": _BUTTON_HOVER,
+    },
+    "quit": {
+        "button": {**_BUTTON_BASE, "background-color": "#73FFC2 !important",
+                   "font-size": "100px !important", "border": "2px solid #361F27 !important", "padding": "5px 10px"},
+        "hover": _BUTTON_HOVER,
+    },
+    "add": {
+        "button": {**_BUTTON_BASE, "background-color": "#f95738 !important",
+                   "font-size": "14px !important", "border": "2px solid #A53B3D !important", "padding": "4px 10px"},
+        "hover": _BUTTON_HOVER,
+    },
+    "edit": {
+        "button": {**_BUTTON_BASE, "background-color": "#B0C6CE !important",
+                   "font-size": "16px !important", "border": "2px solid #82A4B0 !important", "padding": "5px 10px"},
+        "hover": _BUTTON_HOVER,
+    },
+    "next": {
+        "button": {**_BUTTON_BASE, "background-color": "#B3BCB5 !important", "border-radius": "5px !important",
+                   "padding": "5px 5px !important", "font-size": "14px !important", "font-weight": "bold !important",
+                   "border": "2px solid #8A9A90 !important"},
+        "hover": {**_BUTTON_HOVER, "background-color": "#95A49A !important"},
+    },
+    "exit": {
+        "button": {**_BUTTON_BASE, "background-color": "#73FFC2 !important", "color": "white !important",
+                   "font-size": "18px !important", "font-weight": "bold !important", "border-radius": "8px !important",
+                   "padding": "12px 24px !important", "border": "none !important",
+                   "box-shadow": "0 4px 6px rgba(0,0,0,0.1)", "width": "100%"},
+        "hover": {"background-color": "#45a049 !important", "box-shadow": "0 6px 8px rgba(0,0,0,0.15)",
+                  "transform": "translateY(-2px)"},
+    },
+}
+
+def _rules(declarations):
+    return " ".join(f"{prop}: {value};" for prop, value in declarations.items())
+
+def build_theme_css():
+    """
+    Builds a single <style> block for every registered style.
+    """
+    blocks = []
+    for name, style in BUTTON_STYLES.items():
+        selector = f'div[class*="st-key-theme-{name}--"] button'
+        blocks.append(f"{selector} {{ {_rules(style['button'])} }}")
+        blocks.append(f"{selector}:hover {{ {_rules(style['hover'])} }}")
+    return "<style>\n" + "\n".join(blocks) + "\n</style>"
+
+THEME_CSS = build_theme_css()
+
+def themed(style, key=None):
+    """
+    Container whose buttons take the given registered style; no CSS is emitted.
+    """
+    if style not in BUTTON_STYLES:
+        raise KeyError(f"Unknown theme style: {style}")
+    return st.container(key=f"theme-{style}--{key or style}")
@@ -1,47 +1,150 @@
 # trial_ui.py
 import streamlit as st
 from streamlit.components.v1 import html as components_html
-from streamlit_extras.stylable_container import stylable_container
-from matplotlib.patches import Rectangle
-import matplotlib.pyplot as plt
-from helpers import htmlify, parse_spoof_intervals, compute_answer_validity
-from config import RESULTS_DIR, INSTRUCTIONS
+from theme import themed
+from helpers import htmlify, parse_spoof_intervals, compute_answer_validity, diff_annotations
+from config import INSTRUCTIONS, SESSION_MEMORY_BUDGET_BYTES, HOTKEY_BATCH_SIZE, HOTKEY_FLUSH_MS
 from debrief import show_debrief
 from storage import save_to_github
-import uuid, random, datetime, hashlib, time, os, json
-
-try:
-    from pylsl import StreamInfo, StreamOutlet, local_clock
-    LSL_AVAILABLE = True
-except (RuntimeError, ImportError):
-    LSL_AVAILABLE = False
-
-import time
-
-def log_action(trial_idx, action_type, **kwargs):
+from memory import evict_completed_trial, enforce_memory_budget
+from plan import question_order as plan_question_order
+from client_widgets import hotkey_recorder, likert_grid, take_client_batch
+from action_log import ActionLog
+from preview import segment_preview, PreviewError
+import uuid, datetime, hashlib, time, os, json
+
+def log_action(trial_idx, action_type, ts_wall=None, **kwargs):
     """
     Logs an action locally (wall clock) and optionally via LSL.
-    Always records ts_wall.
-    Records ts_lsl only if LSL is available.
+    Always records ts_wall; pass it for events that happened client-side.
+    Records ts_lsl only if LSL is available. Every action is pushed to LSL, while
+    the trial's ActionLog coalesces slider bursts.
     """
-    ts_wall = time.time()
+    if ts_wall is None:
+        ts_wall = time.time()
 
     ts_lsl = None
-    if LSL_AVAILABLE and st.session_state.get("lsl_outlet") is not None:
+    if st.session_state.get("lsl_outlet") is not None:
+        from pylsl import local_clock  # already loaded by init_lsl
         ts_lsl = local_clock() 
         msg = f"{action_type}|trial={trial_idx}|" + "|".join(f"{k}:{v}" for k, v in kwargs.items())
         st.session_state.lsl_outlet.push_sample([msg], ts_lsl)
 
-    log_entry = {
-        "action": action_type,
-        "ts_wall": ts_wall,  
-        **kwargs
-    }
+    action_log = st.session_state.action_log_by_trial.get(trial_idx)
+    if action_log is None:
+        action_log = st.session_state.action_log_by_trial[trial_idx] = ActionLog()
+    action_log.append(action_type, ts_wall, ts_lsl, **kwargs)
 
-    if ts_lsl is not None:
-        log_entry["ts_lsl"] = ts_lsl
+def sync_hotkey_batch(trial_idx, batch, duration):
+    """
+    Applies a batch of hotkey flags/segments recorded in the browser at the video's currentTime.
+    """
+    events, offset = take_client_batch(batch, f"trial{trial_idx}_hotkey_batches")
+    storage = st.session_state.storage
+    clamp = lambda t: min(max(float(t), 0.0), duration)
+    for event in events:
+        ts_wall = float(event.get("client_ts", time.time() - offset)) + offset
+        timestamp = datetime.datetime.fromtimestamp(ts_wall).isoformat()
+        if event.get("type") == "flag":
+            flag = {"id": str(uuid.uuid4()), "time": clamp(event["time"]), "timestamp": timestamp}
+            log_action(trial_idx, "add_flag", ts_wall=ts_wall, flag=flag["time"], id=flag["id"], source="hotkey")
+            st.session_state.flags_by_trial[trial_idx].append(flag)
+            storage.journal.append("flag_added", trial_idx, flag=flag)
+        elif event.get("type") == "segment":
+            segment = {"id": str(uuid.uuid4()), "start": clamp(event["start"]), "end": clamp(event["end"]), "timestamp": timestamp}
+            # A segment still open when the trial was submitted is closed by the browser
+            source = "hotkey_closed_on_submit" if event.get("closed_on_submit") else "hotkey"
+            log_action(trial_idx, "add_segment", ts_wall=ts_wall, segment=f"{segment['start']}-{segment['end']}",
+                       id=segment["id"], source=source)
+            st.session_state.segments_by_trial[trial_idx].append(segment)
+            storage.journal.append("segment_added", trial_idx, segment=segment)
+
+def sync_evaluation_batch(trial_idx, batch, questions):
+    """
+    Applies a batch of evaluation answers changed in the browser, one log entry per change.
+    """
+    events, offset = take_client_batch(batch, f"trial{trial_idx}_evaluation_batches")
+    storage = st.session_state.storage
+    responses = st.session_state.responses_by_trial[trial_idx]
+    for event in events:
+        q = questions[int(event["question_id"])]
+        old_answer = responses.get(q)
+        if event["answer"] == old_answer:
+            continue
+        responses[q] = event["answer"]
+        log_action(trial_idx, "eval_response", ts_wall=float(event["client_ts"]) + offset,
+                   question=q, old_answer=old_answer, new_answer=event["answer"], ts_client=event["client_ts"])
+        storage.journal.append("response_changed", trial_idx, question=q, answer=event["answer"])
+
+def edit_annotations(trial_idx, duration):
+    """
+    Renders one editable table for the trial's segments and flags. Edits stay pending
+    until "Apply changes" (or the trial's save) applies them together as one diff.
+    Returns the edited tables for apply_annotation_edits.
+    """
+    version = st.session_state.setdefault(f"trial{trial_idx}_annotation_table_version", 0)
+    segments = st.session_state.segments_by_trial[trial_idx]
+    flags = st.session_state.flags_by_trial[trial_idx]
+    import pandas as pd
+
+    time_column = lambda label: st.column_config.NumberColumn(label, min_value=0.0, max_value=duration, step=0.01, format="%.2f")
+
+    # Not a form: the pending edits must reach the server when "Save and Continue" is clicked without applying them
+    st.markdown("##### Current Segments")
+    edited_segments = st.data_editor(
+        pd.DataFrame(segments, columns=["id", "start", "end"]).astype({"start": float, "end": float}),
+        key=f"{trial_idx}_segment_table_{version}",
+        num_rows="dynamic",
+        hide_index=True,
+        width="stretch",
+        column_config={"id": None, "start": time_column("Start (s)"), "end": time_column("End (s)")},
+    )
+    st.markdown("##### Current Flags")
+    edited_flags = st.data_editor(
+        pd.DataFrame(flags, columns=["id", "time"]).astype({"time": float}),
+        key=f"{trial_idx}_flag_table_{version}",
+        num_rows="dynamic",
+        hide_index=True,
+        width="stretch",
+        column_config={"id": None, "time": time_column("Time (s)")},
+    )
+    with themed("edit", "annotations"):
+        submitted = st.button("Apply changes", key=f"{trial_idx}_apply_annotations")
+
+    if submitted and apply_annotation_edits(trial_idx, duration, edited_segments, edited_flags):
+        st.rerun()
+    return edited_segments, edited_flags
+
+def apply_annotation_edits(trial_idx, duration, edited_segments, edited_flags):
+    """
+    Applies the diff between the edited tables and the trial's annotations, journaled and
+    logged as a single action. Returns whether anything changed.
+    """
+    segments = st.session_state.segments_by_trial[trial_idx]
+    flags = st.session_state.flags_by_trial[trial_idx]
+    new_segments, segment_diff = diff_annotations(segments, edited_segments.to_dict("records"), ["start", "end"], duration)
+    new_flags, flag_diff = diff_annotations(flags, edited_flags.to_dict("records"), ["time"], duration)
+    if not any(segment_diff.values()) and not any(flag_diff.values()):
+        return False
 
-    st.session_state.action_log_by_trial.setdefault(trial_idx, []).append(log_entry)
+    storage = st.session_state.storage
+    for kind, new, diff in (("segment", new_segments, segment_diff), ("flag", new_flags, flag_diff)):
+        for annotation_id in diff["removed"]:
+            storage.journal.append(f"{kind}_removed", trial_idx, id=annotation_id)
+        for annotation in diff["added"]:
+            storage.journal.append(f"{kind}_added", trial_idx, **{kind: annotation})
+        changed_ids = {c["id"] for c in diff["changed"]}
+        for annotation in new:
+            if annotation["id"] in changed_ids:
+                storage.journal.append(f"{kind}_updated", trial_idx, **{kind: annotation})
+
+    st.session_state.segments_by_trial[trial_idx] = new_segments
+    st.session_state.flags_by_trial[trial_idx] = new_flags
+    log_action(trial_idx, "edit_annotations", segments=segment_diff, flags=flag_diff)
+
+    # A fresh table key drops the applied edit state from the old widget
+    st.session_state[f"trial{trial_idx}_annotation_table_version"] += 1
+    return True
 
 def show_trial():
     """
@@ -68,21 +171,21 @@ def show_trial():
     st.session_state.segments_by_trial.setdefault(trial_idx, [])
     st.session_state.flags_by_trial.setdefault(trial_idx, [])
     st.session_state.responses_by_trial.setdefault(trial_idx, {})
-    st.session_state.action_log_by_trial.setdefault(trial_idx, [])
+    if trial_idx not in st.session_state.action_log_by_trial:
+        st.session_state.action_log_by_trial[trial_idx] = ActionLog()
     st.session_state.saved_trials.setdefault(trial_idx, {})
 
     st.session_state.gt_type = trial.get("label")
-    st.session_state.gt_intervals = parse_spoof_intervals(trial.get("spoof_segment_times", ""))
+    if trial.get("gt_intervals") is not None:
+        st.session_state.gt_intervals = trial["gt_intervals"]
+    else:
+        st.session_state.gt_intervals = parse_spoof_intervals(trial.get("spoof_segment_times", ""))
     duration = float(trial.get("duration", 60.0))
     if f"trial_{trial_idx}_start_ts" not in st.session_state:
         st.session_state[f"trial_{trial_idx}_start_ts"] = time.time()
 
     # trust source cue
-    if "trust_cue" not in trial:
-        trial_trust_cue = random.choice([True, False]) 
-        st.session_state.all_trials[st.session_state.trial_index]["trust_cue"] = trial_trust_cue
-    else:
-        trial_trust_cue = trial["trust_cue"]
+    trial_trust_cue = trial.get("trust_cue", False)
     st.session_state.trust_cue = trial_trust_cue
 
     instructions_html = htmlify(INSTRUCTIONS[st.session_state.instruction_version])
@@ -107,25 +210,7 @@ def show_trial():
             st.session_state.start_button_clicked = False
 
         if st.session_state.trial_index == 0 and not st.session_state.start_button_clicked:
-            with stylable_container(
-                "start",
-                css_styles="""
-                button { 
-                    background-color: #73FFC2 !important; 
-                    color: white !important; 
-                    font-size: 100px !important; 
-                    border-radius: 10px !important; 
-                    border: 2px solid #361F27 !important; 
-                    padding: 5px 10px; 
-                    cursor: pointer; 
-                    box-shadow: 2px 2px 6px rgba(0,0,0,0.2); 
-                } 
-                button:hover { 
-                    background-color: #85A0A8 !important; 
-                    box-shadow: 3px 3px 8px rgba(0,0,0,0.3); 
-                } 
-                """
-            ):
+            with themed("start"):
                 if st.button("I understand."):
                     st.session_state.start_button_clicked = True
                 else:
@@ -136,25 +221,12 @@ def show_trial():
     with quit_col: 
         _,  emergency_esc = st.columns([0.7, 0.3]) 
         with emergency_esc: 
-            with stylable_container( 
-                "quit", 
-                css_styles=""" 
-                button { 
-                background-color: #73FFC2 !important; 
-                color: black !important; 
-                font-size: 100px !important; 
-                border-radius: 10px !important; 
-                border: 2px solid #361F27 !important; 
-                padding: 5px 10px; cursor: pointer; 
-                box-shadow: 2px 2px 6px rgba(0,0,0,0.2); 
-                } 
-                button:hover { 
-                    background-color: #85A0A8 !important; 
-                    box-shadow: 3px 3px 8px rgba(0,0,0,0.3); 
-                } """ ): 
+            with themed("quit"): 
                 if st.button("EMERGENCY EXIT"): 
                     st.session_state["emergency_quit"] = True 
                     log_action(trial_idx, "emergency_quit")
+                    storage.update_progress(status="emergency_exit", trial_index=trial_idx,
+                                            exited_at=datetime.datetime.now().isoformat())
                     st.rerun()       
 
     with aff_col:
@@ -184,6 +256,9 @@ def show_trial():
         st.markdown('<div class="video-wrapper">', unsafe_allow_html=True)
         if trial.get('video') and os.path.exists(trial['video']):
             st.video(trial['video'])
+            batch = hotkey_recorder(key=f"{trial_idx}_hotkeys", batch_size=HOTKEY_BATCH_SIZE, flush_ms=HOTKEY_FLUSH_MS,
+                                    submit_label="Save and Continue")
+            sync_hotkey_batch(trial_idx, batch, duration)
         else:
             st.warning("Video file not found or path invalid for this trial.")
         st.markdown("#### Listen to the entire audio before making any choices.")
@@ -199,31 +274,28 @@ def show_trial():
             key=f"{trial_idx}_segment_slider",
             on_change=lambda: log_action(trial_idx, "update_slider", slider=f"{trial_idx}_segment_slider")
         )
-        with stylable_container("add_segment", css_styles="""
-            button {
-                background-color: #f95738 !important;
-                color: black !important;
-                font-size: 14px !important;
-                border-radius: 10px !important; 
-                border: 2px solid #A53B3D !important;
-                padding: 4px 10px;
-                cursor: pointer;
-                box-shadow: 2px 2px 6px rgba(0,0,0,0.2);
-            }
-            button:hover {
-                background-color: #85A0A8 !important;
-                box-shadow: 3px 3px 8px rgba(0,0,0,0.3);
-            }
-            """
-            ):
+        with themed("add", "segment"):
             if st.button("Add segment", key=f"{trial_idx}_add_segment"):
-                log_action(trial_idx, "add_segment", segment=f"{segment_slider[0]}-{segment_slider[1]}", id=str(uuid.uuid4()))
-                st.session_state.segments_by_trial[trial_idx].append({ 
+                segment = { 
                     "id": str(uuid.uuid4()), 
                     "start": segment_slider[0], 
                     "end": segment_slider[1],  
                     "timestamp": datetime.datetime.now().isoformat() 
-                })
+                }
+                log_action(trial_idx, "add_segment", segment=f"{segment_slider[0]}-{segment_slider[1]}", id=segment["id"])
+                st.session_state.segments_by_trial[trial_idx].append(segment)
+                storage.journal.append("segment_added", trial_idx, segment=segment)
+
+        # Only the selected slice of the stimulus audio is sent to the browser
+        audio_path = trial.get("audio")
+        if audio_path and os.path.exists(audio_path):
+            if st.button("▶ Play selection", key=f"{trial_idx}_play_selection"):
+                try:
+                    wav = segment_preview(audio_path, segment_slider[0], segment_slider[1])
+                    log_action(trial_idx, "play_selection", segment=f"{segment_slider[0]}-{segment_slider[1]}")
+                    st.audio(wav, format="audio/wav", autoplay=True)
+                except PreviewError as e:
+                    st.caption(f"Cannot play this selection: {e}")
 
         st.write("---")
         # --- FLAGS ---
@@ -235,36 +307,25 @@ def show_trial():
             key=f"{trial_idx}_flag_slider",
             on_change=lambda: log_action(trial_idx, "update_slider", slider=f"{trial_idx}_flag_slider")
         )
-        with stylable_container("add_flag", css_styles="""
-            button {
-                background-color: #f95738 !important;
-                color: black !important;
-                font-size: 14px !important;
-                border-radius: 10px !important; 
-                border: 2px solid #A53B3D !important;
-                padding: 4px 10px;
-                cursor: pointer;
-                box-shadow: 2px 2px 6px rgba(0,0,0,0.2);
-            }
-            button:hover {
-                background-color: #85A0A8 !important;
-                box-shadow: 3px 3px 8px rgba(0,0,0,0.3);
-            }
-            """
-            ):
+        with themed("add", "flag"):
             if st.button("Add flag", key=f"{trial_idx}_add_flag"):
-                log_action(trial_idx, "add_flag", flag=flag_slider, id=str(uuid.uuid4()))
-                st.session_state.flags_by_trial[trial_idx].append({ 
+                flag = { 
                     "id": str(uuid.uuid4()), 
                     "time": flag_slider, 
                     "timestamp": datetime.datetime.now().isoformat() 
-                    })
+                    }
+                log_action(trial_idx, "add_flag", flag=flag_slider, id=flag["id"])
+                st.session_state.flags_by_trial[trial_idx].append(flag)
+                storage.journal.append("flag_added", trial_idx, flag=flag)
 
         st.markdown("<hr style='border:1px solid #F5F5F5'>", unsafe_allow_html=True)
-        delete_col, plot_col = st.columns([0.5, 0.5])
+        table_col, plot_col = st.columns([0.5, 0.5])
 
         # Plot timeline
         with plot_col:
+            import matplotlib.pyplot as plt
+            from matplotlib.patches import Rectangle
+
             fig_h, fig_w = 1.5, max(10, duration/5)
             fig, ax = plt.subplots(figsize=(fig_w, fig_h))
             ax.set_xlim(0, duration)
@@ -288,78 +349,13 @@ def show_trial():
 
             st.pyplot(fig, bbox_inches="tight")
 
-        # Delete list
-        with delete_col:
-            st.markdown("##### Current Segments")
-            seg_to_delete = []
-            for seg in st.session_state.segments_by_trial[trial_idx][:]:
-                c1, c2, c3 = st.columns([0.3, 0.2, 0.4])
-                with c1:
-                    st.write(f"Segment: {seg['start']:.2f} - {seg['end']:.2f}s")
-                with c2:
-                    with stylable_container(f"delete_seg_{seg['id']}", css_styles="""
-                        button {
-                            background-color: #B0C6CE !important;
-                            color: black !important;
-                            font-size: 16px !important;
-                            border-radius: 10px !important; 
-                            border: 2px solid #82A4B0 !important;
-                            padding: 5px 10px;
-                            cursor: pointer;
-                            box-shadow: 2px 2px 6px rgba(0,0,0,0.2);
-                        }
-                        button:hover {
-                            background-color: #85A0A8 !important;
-                            box-shadow: 3px 3px 8px rgba(0,0,0,0.3);
-                        }
-                        """
-                    ):
-                        if st.button("Delete", key=f"{trial_idx}_del_seg_{seg['id']}"):
-                            seg_to_delete.append(seg['id'])
-                            log_action(trial_idx, "delete_segment", deleted_segment=seg['id'])
-                            st.write("Confirm deletion?")
-            if seg_to_delete:
-                st.session_state.segments_by_trial[trial_idx] = [
-                    s for s in st.session_state.segments_by_trial[trial_idx] if s['id'] not in seg_to_delete
-                ]
-
-            st.markdown("##### Current Flags")
-            flags_to_delete = []
-            for flag in st.session_state.flags_by_trial[trial_idx][:]: 
-                c1, c2, c3 = st.columns([0.3, 0.2, 0.4])
-                with c1:
-                    st.write(f"Flag: {flag['time']:.2f}s")
-                with c2:
-                    with stylable_container(f"delete_flag_{flag['id']}",  css_styles="""
-                            button {
-                                background-color: #B0C6CE !important;
-                                color: black !important;
-                                font-size: 16px !important;
-                                border-radius: 10px !important; 
-                                border: 2px solid #82A4B0 !important;
-                                padding: 5px 10px;
-                                cursor: pointer;
-                                box-shadow: 2px 2px 6px rgba(0,0,0,0.2);
-                            }
-                            button:hover {
-                                background-color: #85A0A8 !important;
-                                box-shadow: 3px 3px 8px rgba(0,0,0,0.3);
-                            }
-                            """
-                        ):
-                        if st.button("Delete", key=f"{trial_idx}_del_flag_{flag['id']}"):
-                            flags_to_delete.append(flag['id'])
-                            log_action(trial_idx, "delete_flag", deleted_ids=flag['id'])
-                            st.write("Confirm deletion?")
-            if flags_to_delete:
-                st.session_state.flags_by_trial[trial_idx] = [f for f in st.session_state.flags_by_trial[trial_idx] if f['id'] not in flags_to_delete]
+        # Annotation table: edits to all segments and flags are applied together
+        with table_col:
+            annotation_edits = edit_annotations(trial_idx, duration)
 
         # EVALUATION
         # EVALUATION
-        sanity_key = f"trial{trial_idx}_sanity"
-        if sanity_key not in st.session_state:
-            st.session_state[sanity_key] = random.choice([False, False, True])
-        sanity_check = st.session_state[sanity_key]
+        sanity_check = st.session_state.plan["sanity_checks"][trial_idx]
 
         st.markdown("### Evaluate the audio")
 
@@ -391,79 +387,25 @@ def show_trial():
             else:
                 st.session_state.responses_by_trial[trial_idx].setdefault(q, options[2])  # "Unsure"
 
-        qorder_key = f"trial{trial_idx}_question_order"
-        if qorder_key not in st.session_state:
-            order = list(range(len(questions)))
-            random.shuffle(order)
-            st.session_state[qorder_key] = order
-        question_order = st.session_state[qorder_key]
-
-        i = 0
-        while i < len(question_order):
-            cols = st.columns(2)
-            for j in range(2):
-                if i + j >= len(question_order):
-                    break
-
-                q_index = question_order[i + j]
-                q = questions[q_index]
-
-                with cols[j]:
-                    st.markdown(
-                        f"<div style='font-size:12px; font-weight:bold; line-height:1.1; margin-bottom:6px;'>{q}</div>",
-                        unsafe_allow_html=True
-                    )
-
-                    radio_key = f"trial{trial_idx}_question_{q_index}"
-
-                    if "scenario" in q.lower() or "instructions" in q.lower():
-                        selected = st.radio(
-                            label=" ",
-                            options=sanity_options,
-                            key=radio_key,
-                            index=sanity_options.index(
-                                st.session_state.responses_by_trial[trial_idx][q]
-                            ),
-                            label_visibility="collapsed"
-                        )
-                    else:
-                        selected = st.radio(
-                            label=" ",
-                            options=options,
-                            key=radio_key,
-                            index=options.index(
-                                st.session_state.responses_by_trial[trial_idx][q]
-                            ),
-                            label_visibility="collapsed"
-                        )
-
-                    if selected != st.session_state.responses_by_trial[trial_idx][q]:
-                        st.session_state.responses_by_trial[trial_idx][q] = selected
-                        log_action(trial_idx, "eval_response", question=q, old_answer=None, new_answer=selected)
-            i += 2
+        question_order = plan_question_order(st.session_state.plan, trial_idx, len(questions))
+
+        items = []
+        for q_index in question_order:
+            q = questions[q_index]
+            is_sanity = "scenario" in q.lower() or "instructions" in q.lower()
+            items.append({
+                "id": q_index,
+                "question": q,
+                "options": sanity_options if is_sanity else options,
+                "value": st.session_state.responses_by_trial[trial_idx][q],
+            })
+        batch = likert_grid(items, key=f"{trial_idx}_evaluation", submit_label="Save and Continue")
+        sync_evaluation_batch(trial_idx, batch, questions)
 
     st.markdown("<br><br><br>", unsafe_allow_html=True)
     _, next_col = st.columns([0.8, 0.2])
     with next_col:
-        with stylable_container( 
-            "next", 
-            css_styles=""" 
-            button { 
-            background-color: #B3BCB5 !important; 
-            color: black !important; 
-            border-radius: 5px !important; 
-            padding: 5px 5px !important; 
-            font-size: 14px !important; 
-            font-weight: bold !important; 
-            border: 2px solid #8A9A90 !important; 
-            cursor: pointer; 
-            box-shadow: 2px 2px 6px rgba(0,0,0,0.2); 
-            } button:
-            hover 
-            { background-color: #95A49A !important; 
-            box-shadow: 3px 3px 8px rgba(0,0,0,0.3); 
-            } 
-            """ ):
+        with themed("next"):
                 if st.button("Save and Continue"):
                     trial_idx = st.session_state.trial_index
                     trial_end = datetime.datetime.now()
@@ -474,27 +416,26 @@ def show_trial():
                     if trial_duration_key not in st.session_state:
                         st.session_state[trial_duration_key] = (trial_end - trial_start).total_seconds()
 
+                    apply_annotation_edits(trial_idx, duration, *annotation_edits)
                     required_wait = float(trial.get("duration", 0))
                     validity_info = compute_answer_validity(trial_idx, required_wait)
                     trial_data = st.session_state.storage.save_trial(trial_idx, extra_metadata=validity_info)
                     st.session_state.trial_index += 1
-                    st.session_state.storage.session_data["trial_index"] = st.session_state.trial_index
-                    st.session_state.storage.save_session_data()
                     
                     file_name = f"{st.session_state.participant_id}_trial_{trial_idx}.json"
                     github_path = f"results/full_run/{file_name}"
 
+                    # The trial record stays in the state backend; it is archived with the bundle at the debrief
                     try:
                         save_to_github(trial_data, github_path)
-                        local_file = os.path.join(RESULTS_DIR, file_name)
-                        if os.path.exists(local_file):
-                            os.remove(local_file)
-                            print(f"Deleted local file: {file_name}")
+                        storage.note_upload(github_path, ok=True)
                     except Exception as e:
                         print(f"Upload failed: {e}")
-                        print(f"Local file kept: {file_name}")
+                        storage.note_upload(github_path, ok=False)
                         
                     log_action(trial_idx, "next_trial")
+                    evict_completed_trial(trial_idx)
+                    enforce_memory_budget(SESSION_MEMORY_BUDGET_BYTES)
                 
                     components_html( 
                     """ 
@@ -0,0 +1,291 @@
+# verify_media.py
+"""
+Checks every media file referenced by the stimulus catalog against the catalog.
+
+For each stimulus the trial video (MP4) and the mixed audio (WAV) are opened
+and their real durations read from the container headers: the MP4 movie header
+(mvhd) and the WAV frame count. Every affect image (JPG) is fully decoded with
+Pillow. Files are checked in a thread pool, since the work is mostly I/O.
+
+Reported per stimulus:
+  - files that are missing or do not parse or decode. For MP4 this means the box
+    structure, the track headers, and chunk offsets that point past the end of the
+    file. With --decode and ffmpeg on the PATH, the video is also fully decoded.
+  - catalog durations that differ from the video duration by more than --tolerance
+    seconds. The catalog duration sets the slider range and the required wait in
+    compute_answer_validity.
+  - video and audio durations that disagree.
+  - GT intervals that are malformed or end after the clip.
+
+--write stores the video durations in the catalog (the spreadsheet value is
+kept as sheet_duration) and recomputes the catalog version. A later
+`python catalog.py` rebuild starts from the spreadsheet again, so also copy the
+printed corrections into the sheet.
+
+    python verify_media.py [--workers 8] [--tolerance 0.25] [--decode] [--write] [--json report.json]
+"""
+import os, json, wave, struct, shutil, subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+class MediaError(Exception):
+    pass
+
+# MP4 boxes that only contain other boxes, on the path to the headers read here
+_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+
+def _iter_boxes(f, start, end):
+    """
+    Yields (type, payload offset, payload size) of the boxes in [start, end).
+    """
+    offset = start
+    while offset < end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            raise MediaError(f"truncated box header at byte {offset}")
+        size, kind = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset  # box extends to the end of the file
+        if size < header_size or offset + size > end:
+            raise MediaError(f"box {kind!r} at byte {offset} overruns its parent ({size} bytes)")
+        yield kind, offset + header_size, size - header_size
+        offset += size
+
+def _read_boxes(f, start, end, found):
+    for kind, payload, size in _iter_boxes(f, start, end):
+        found.setdefault(kind, []).append((payload, size))
+        if kind in _CONTAINER_BOXES:
+            _read_boxes(f, payload, payload + size, found)
+
+def _header_duration(f, payload):
+    """
+    (duration, timescale) of an mvhd / mdhd full box.
+    """
+    f.seek(payload)
+    version = f.read(1)[0]
+    if version == 1:
+        f.seek(payload + 4 + 16)  # version/flags, 64-bit creation and modification times
+        timescale, duration = struct.unpack(">IQ", f.read(12))
+    else:
+        f.seek(payload + 4 + 8)
+        timescale, duration = struct.unpack(">II", f.read(8))
+    return duration, timescale
+
+def mp4_info(path):
+    """
+    Reads the duration in seconds and the track types of an MP4 file from its headers,
+    verifying that the box tree and chunk offsets are consistent with the file size.
+    """
+    file_size = os.path.getsize(path)
+    found = {}
+    with open(path, "rb") as f:
+        _read_boxes(f, 0, file_size, found)
+        for required in (b"ftyp", b"moov", b"mvhd", b"mdat"):
+            if required not in found:
+                raise MediaError(f"no {required.decode()} box")
+        duration, timescale = _header_duration(f, found[b"mvhd"][0][0])
+        if not timescale:
+            raise MediaError("mvhd timescale is 0")
+
+        tracks = []
+        for payload, _ in found.get(b"hdlr", []):
+            f.seek(payload + 8)  # version/flags and pre_defined
+            tracks.append(f.read(4).decode("latin-1"))
+        for payload, _ in found.get(b"mdhd", []):
+            if not _header_duration(f, payload)[1]:
+                raise MediaError("mdhd timescale is 0")
+
+        # Every chunk the sample tables point at has to lie inside the file
+        for kind, fmt, width in ((b"stco", ">I", 4), (b"co64", ">Q", 8)):
+            for payload, _ in found.get(kind, []):
+                f.seek(payload + 4)
+                count = struct.unpack(">I", f.read(4))[0]
+                data = f.read(count * width)
+                if len(data) < count * width:
+                    raise MediaError(f"truncated {kind.decode()} table")
+                if count and max(struct.unpack(f">{count}{fmt[1]}", data)) >= file_size:
+                    raise MediaError("chunk offset points past the end of the file, the file is truncated")
+    if "vide" not in tracks:
+        raise MediaError(f"no video track (tracks: {tracks})")
+    return {"duration": duration / timescale, "tracks": tracks}
+
+def wav_info(path):
+    """
+    Duration of a WAV file from its header; the sample data is read to make sure all frames are present.
+    """
+    try:
+        with wave.open(path, "rb") as w:
+            frames, rate, frame_size = w.getnframes(), w.getframerate(), w.getnchannels() * w.getsampwidth()
+            read = 0
+            while True:
+                chunk = w.readframes(1 << 16)
+                if not chunk:
+                    break
+                read += len(chunk)
+    except (wave.Error, EOFError) as e:
+        raise MediaError(str(e))
+    if not rate:
+        raise MediaError("sample rate is 0")
+    if read != frames * frame_size:
+        raise MediaError(f"header announces {frames} frames but the data holds {read // max(frame_size, 1)}")
+    return {"duration": frames / rate, "sample_rate": rate}
+
+def image_info(path):
+    """
+    Size of an image after a full decode.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        with Image.open(path) as img:
+            img.load()
+            return {"size": list(img.size), "format": img.format}
+    except Exception as e:
+        raise MediaError(f"{type(e).__name__}: {e}")
+
+def ffmpeg_decode(path):
+    """
+    Fully decodes a media file with ffmpeg, raising on any decoder error.
+    """
+    proc = subprocess.run(["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-f", "null", "-"],
+                          capture_output=True, text=True)
+    if proc.returncode or proc.stderr.strip():
+        raise MediaError(f"ffmpeg: {proc.stderr.strip()[:500]}")
+
+def _check(reader, path, decode=False):
+    if not path:
+        return None
+    if not os.path.exists(path):
+        return {"path": path, "error": "missing"}
+    try:
+        info = reader(path)
+        if decode:
+            ffmpeg_decode(path)
+        return {"path": path, **info}
+    except (MediaError, OSError, struct.error) as e:
+        return {"path": path, "error": str(e)}
+
+def verify_stimulus(project_root, stim, tolerance, decode=False):
+    """
+    Checks the media of one catalog stimulus. Returns a report with a list of problems.
+    """
+    resolve = lambda p: os.path.join(project_root, p) if p else None
+    video = _check(mp4_info, resolve(stim.get("video")), decode)
+    audio = _check(wav_info, resolve(stim.get("audio")))
+    problems = []
+    for name, result in (("video", video), ("audio", audio)):
+        if result and "error" in result:
+            problems.append(f"{name} {result['error']}: {result['path']}")
+    if video is None:
+        problems.append("no video in catalog")
+
+    media_duration = None
+    if video and "duration" in video:
+        media_duration = video["duration"]
+    elif audio and "duration" in audio:
+        media_duration = audio["duration"]
+    if media_duration is not None:
+        if abs(stim["duration"] - media_duration) > tolerance:
+            problems.append(f"catalog duration {stim['duration']:.2f}s != media {media_duration:.2f}s")
+        if video and audio and "duration" in video and "duration" in audio \
+                and abs(video["duration"] - audio["duration"]) > tolerance:
+            problems.append(f"video {video['duration']:.2f}s and audio {audio['duration']:.2f}s differ")
+
+    clip_end = media_duration if media_duration is not None else stim["duration"]
+    for start, end in stim.get("gt_intervals") or []:
+        if start < 0 or end <= start:
+            problems.append(f"malformed GT interval {start}-{end}")
+        elif end > clip_end + tolerance:
+            problems.append(f"GT interval {start}-{end} ends after the clip ({clip_end:.2f}s)")
+
+    return {
+        "stimulus_id": stim["stimulus_id"],
+        "catalog_duration": stim["duration"],
+        "media_duration": round(media_duration, 3) if media_duration is not None else None,
+        "video": video,
+        "audio": audio,
+        "problems": problems,
+    }
+
+def verify_catalog(project_root, catalog, workers=8, tolerance=0.25, decode=False):
+    """
+    Returns (stimulus reports, affect image reports), checked in a thread pool.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stimuli = list(pool.map(lambda s: verify_stimulus(project_root, s, tolerance, decode), catalog["stimuli"]))
+        images = list(pool.map(lambda img: _check(image_info, os.path.join(project_root, img["path"])),
+                               catalog["affect_images"]))
+    return stimuli, images
+
+def apply_durations(catalog, reports, tolerance=0.25):
+    """
+    Writes measured durations into the catalog and recomputes its version. Returns the corrected stimulus ids.
+    """
+    from catalog import catalog_version
+
+    by_id = {r["stimulus_id"]: r for r in reports}
+    corrected = []
+    for stim in catalog["stimuli"]:
+        measured = by_id.get(stim["stimulus_id"], {}).get("media_duration")
+        if measured is None or abs(stim["duration"] - measured) <= tolerance:
+            continue
+        stim.setdefault("sheet_duration", stim["duration"])
+        stim["duration"] = round(measured, 2)
+        corrected.append(stim["stimulus_id"])
+    if corrected:
+        catalog["version"] = catalog_version(catalog["stimuli"], catalog["affect_images"])
+    return corrected
+
+if __name__ == "__main__":
+    import argparse, sys
+    from config import PROJECT_DIR, CATALOG_FILE
+    from catalog import load_catalog, write_catalog
+
+    parser = argparse.ArgumentParser(description="Verify catalog media and their durations.")
+    parser.add_argument("--catalog", default=CATALOG_FILE)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed duration difference in seconds")
+    parser.add_argument("--decode", action="store_true", help="also fully decode the videos with ffmpeg")
+    parser.add_argument("--write", action="store_true", help="store the measured durations in the catalog")
+    parser.add_argument("--json", help="write the full report here")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog)
+    if catalog is None:
+        sys.exit(f"No catalog at {args.catalog}, build it with `python catalog.py`")
+    if args.decode and not shutil.which("ffmpeg"):
+        sys.exit("--decode needs ffmpeg on the PATH")
+
+    stimuli, images = verify_catalog(PROJECT_DIR, catalog, args.workers, args.tolerance, args.decode)
+    failed = 0
+    for report in stimuli:
+        for problem in report["problems"]:
+            print(f"[WARN] {report['stimulus_id']}: {problem}")
+        failed += bool(report["problems"])
+    for report in images:
+        if "error" in report:
+            print(f"[WARN] affect image {report['error']}: {report['path']}")
+            failed += 1
+    print(f"Checked {len(stimuli)} stimuli and {len(images)} affect images: {failed} with problems")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"stimuli": stimuli, "affect_images": images}, f, indent=2)
+
+    if args.write:
+        corrected = apply_durations(catalog, stimuli, args.tolerance)
+        if corrected:
+            write_catalog(catalog, args.catalog)
+            for stim in catalog["stimuli"]:
+                if stim["stimulus_id"] in corrected:
+                    print(f"  {stim['stimulus_id']}: {stim['sheet_duration']} -> {stim['duration']}")
+            print(f"Wrote {len(corrected)} corrected durations to {args.catalog}, version {catalog['version']}")
+        else:
+            print("No durations to correct")
+    sys.exit(1 if failed else 0)